@@ -6,17 +6,30 @@ Handles scan uploads from Pi agents.
 import logging
 import re
 import hashlib
-from datetime import datetime, time
-from typing import List, Optional, Sequence, TypeVar
+from datetime import datetime, time, timedelta
+from typing import Iterator, List, Mapping, Optional, Sequence, TypeVar
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy import insert
 
+from app.core.cache import invalidate_cache
+from app.core.compression import GzipRoute
 from app.core.db import get_db
-from app.core.excel import build_scanned_at, coerce_date, coerce_int, coerce_str, coerce_time, read_table_from_best_sheet
+from app.core.rollups import OccupancyDeltas, apply_daily_occupancy_deltas, refresh_bus_plant, refresh_daily_occupancy
+from app.core.excel import (
+    DateCoercer,
+    ExcelRow,
+    TimeCoercer,
+    build_scanned_at,
+    coerce_int,
+    coerce_str,
+    iter_chunks,
+    stream_table_from_best_sheet,
+    upload_format,
+)
 from app.core.security import validate_api_key
 from app.models import Bus, Employee, EmployeeMaster, Attendance, AttendanceShift, Van, UnknownAttendance, UnknownAttendanceShift
 from app.schemas.bus import (
@@ -36,7 +49,8 @@ from app.schemas.bus import (
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/bus", tags=["bus"])
+# GzipRoute lets Pi agents upload gzip-compressed scan batches
+router = APIRouter(prefix="/api/bus", tags=["bus"], route_class=GzipRoute)
 
 try:
     LOCAL_TZ = ZoneInfo("Asia/Kuala_Lumpur")
@@ -49,6 +63,9 @@ MORNING_END = time(10, 0)
 NIGHT_START = time(16, 0)
 NIGHT_END = time(21, 0)
 
+# Spreadsheet rows parsed and written per round of an upload; bounds peak memory
+UPLOAD_CHUNK_ROWS = 2000
+
 
 def get_or_create_bus(db: Session, bus_id: str) -> Bus:
     """Get existing bus or create a new one."""
@@ -113,13 +130,27 @@ def _canonical_van_code(value: str) -> Optional[str]:
     return cleaned if cleaned else None
 
 
-def _row_value(values: dict, *keys: str) -> Optional[object]:
+def _row_value(values: Mapping[str, object], *keys: str) -> Optional[object]:
     for key in keys:
         if key in values and values[key] is not None and str(values[key]).strip() != "":
             return values[key]
     return None
 
 
+def _unreadable_upload(file_format: str) -> HTTPException:
+    source = "workbook" if file_format == "xlsx" else "file"
+    return HTTPException(status_code=400, detail=f"Invalid .{file_format} file (unable to read {source})")
+
+
+def _guard_workbook_rows(rows: Iterator[ExcelRow], label: str, file_format: str) -> Iterator[ExcelRow]:
+    """Report workbook errors hit while streaming rows like errors on open."""
+    try:
+        yield from rows
+    except Exception:
+        logger.exception(f"Failed to parse {label} {file_format} upload")
+        raise _unreadable_upload(file_format)
+
+
 T = TypeVar("T")
 
 
@@ -128,6 +159,61 @@ def _chunked(values: Sequence[T], size: int = 1000):
         yield values[i : i + size]
 
 
+AttendanceKey = tuple[int, object, AttendanceShift]
+
+
+def _attendance_exists(db: Session, key: AttendanceKey) -> bool:
+    scanned_batch_id, scanned_on, shift = key
+    return (
+        db.query(Attendance.id)
+        .filter(Attendance.scanned_batch_id == scanned_batch_id)
+        .filter(Attendance.scanned_on == scanned_on)
+        .filter(Attendance.shift == shift)
+        .first()
+        is not None
+    )
+
+
+def _insert_attendance_rows(
+    db: Session, rows_by_key: dict[AttendanceKey, dict]
+) -> tuple[set[AttendanceKey], set[AttendanceKey]]:
+    """
+    Insert new attendance rows inside savepoints.
+
+    Returns (inserted, failed): the keys this call actually inserted, and the keys that
+    could not be stored. The whole batch is tried as one statement first. If it fails
+    (e.g. a concurrent upload stored the same batch/date/shift in between), only that
+    savepoint is rolled back and the rows are retried one savepoint each, so one bad row
+    costs one row instead of the batch. A conflicting row whose batch/date/shift already
+    exists is in neither set: it is stored, but not by this call.
+    """
+    if not rows_by_key:
+        return set(), set()
+
+    try:
+        with db.begin_nested():
+            db.execute(insert(Attendance), list(rows_by_key.values()))
+        return set(rows_by_key), set()
+    except SQLAlchemyError as e:
+        logger.info(f"Bulk attendance insert failed ({e.__class__.__name__}); retrying row by row")
+
+    inserted: set[AttendanceKey] = set()
+    failed: set[AttendanceKey] = set()
+    for key, row in rows_by_key.items():
+        try:
+            with db.begin_nested():
+                db.execute(insert(Attendance), [row])
+            inserted.add(key)
+        except IntegrityError:
+            if not _attendance_exists(db, key):
+                logger.warning(f"Could not store attendance for {key[0]} on {key[1]} shift={key[2]}")
+                failed.add(key)
+        except SQLAlchemyError as e:
+            logger.error(f"Error storing attendance for {key[0]} on {key[1]} shift={key[2]}: {e}")
+            failed.add(key)
+    return inserted, failed
+
+
 @router.get("/buses", response_model=List[BusInfo])
 def list_buses(db: Session = Depends(get_db)):
     """List all buses for admin/dashboard use."""
@@ -154,6 +240,7 @@ def create_or_update_bus(payload: BusCreate, db: Session = Depends(get_db)):
         )
         db.add(bus)
     db.commit()
+    invalidate_cache()
     db.refresh(bus)
     return bus
 
@@ -200,6 +287,7 @@ def create_or_update_van(payload: VanCreate, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=400, detail="Van code must be unique")
 
+    invalidate_cache()
     db.refresh(van)
     return van
 
@@ -268,6 +356,8 @@ def create_or_update_employee(payload: EmployeeCreate, db: Session = Depends(get
             raise HTTPException(status_code=400, detail="Van bus does not match employee bus")
 
     employee = db.query(Employee).filter(Employee.batch_id == payload.batch_id).first()
+    # The employee leaves the old bus's roster and joins the new one
+    affected_bus_ids = {bus_id for bus_id in (employee.bus_id if employee else None, payload.bus_id) if bus_id}
     if employee:
         employee.name = payload.name
         employee.bus_id = payload.bus_id
@@ -283,7 +373,10 @@ def create_or_update_employee(payload: EmployeeCreate, db: Session = Depends(get
         )
         db.add(employee)
 
+    db.flush()
+    refresh_bus_plant(db, bus_ids=affected_bus_ids)
     db.commit()
+    invalidate_cache(bus_ids=affected_bus_ids)
     db.refresh(employee)
     return employee
 
@@ -291,7 +384,7 @@ def create_or_update_employee(payload: EmployeeCreate, db: Session = Depends(get
 @router.post("/master-list/upload", response_model=MasterListUploadResponse, status_code=status.HTTP_201_CREATED)
 def upload_master_list(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """
-    Upload an employee master list Excel and upsert buses, vans, and employees.
+    Upload an employee master list (.xlsx, .csv or .tsv) and upsert buses, vans, and employees.
 
     Expected headers (case-insensitive):
     - PersonId, Name, Status, Terminate, Transport, Route, ...
@@ -300,13 +393,14 @@ def upload_master_list(file: UploadFile = File(...), db: Session = Depends(get_d
     - Route -> bus_id (must be <= 4 alphanumeric chars after normalization)
     - Transport -> van_code (optional)
     """
-    if not file.filename or not file.filename.lower().endswith(".xlsx"):
-        raise HTTPException(status_code=400, detail="Only .xlsx files are supported")
+    file_format = upload_format(file.filename)
+    if not file_format:
+        raise HTTPException(status_code=400, detail="Only .xlsx, .csv and .tsv files are supported")
 
-    xlsx_bytes = file.file.read()
+    file_bytes = file.file.read()
     try:
-        table = read_table_from_best_sheet(
-            xlsx_bytes,
+        table = stream_table_from_best_sheet(
+            file_bytes,
             must_include={"name", "route", "transport"},
             prefer_include={"personid", "sapid", "route", "transport", "datejoined", "status", "wdid"},
             sheet_name_exclude_prefixes=("note", "read", "instruction", "template"),
@@ -314,20 +408,21 @@ def upload_master_list(file: UploadFile = File(...), db: Session = Depends(get_d
             required_non_empty_in_sample={"name"},
             min_valid_sample_rows=1,
             sample_size=20,
+            file_format=file_format,
         )
     except Exception:
         logger.exception("Failed to parse master list workbook")
-        raise HTTPException(status_code=400, detail="Invalid .xlsx file (unable to read workbook)")
+        raise _unreadable_upload(file_format)
 
-    if not table or not table.rows:
-        raise HTTPException(
-            status_code=400,
-            detail="Could not find a worksheet with required columns (PersonId, Name, Route, Transport) and at least 1 valid data row",
-        )
-
-    rows = table.rows
+    no_rows_error = HTTPException(
+        status_code=400,
+        detail="Could not find a worksheet with required columns (PersonId, Name, Route, Transport) and at least 1 valid data row",
+    )
+    if not table:
+        raise no_rows_error
 
     row_errors: List[UploadRowError] = []
+    processed_rows = 0
     buses_upserted = 0
     vans_upserted = 0
     employees_upserted = 0
@@ -335,136 +430,97 @@ def upload_master_list(file: UploadFile = File(...), db: Session = Depends(get_d
     skipped_missing_personid = 0
     skipped_missing_name = 0
 
-    parsed_rows: list[dict] = []
-    master_rows_with_personid: list[dict] = []
-    master_rows_without_personid: list[dict] = []
-    bus_ids: set[str] = set()
-    van_codes: set[str] = set()
-    personids: set[int] = set()
+    # Per-upload state carried across chunks holds one entry per bus/van/employee, not per row
     bus_routes: dict[str, str] = {}
     van_assignments: dict[str, str] = {}
+    buses_by_id: dict[str, Bus] = {}
+    vans_by_code: dict[str, Van] = {}
+    created_vans: set[str] = set()
+    touched_buses: set[str] = set()
+    touched_vans: set[str] = set()
+    touched_employees: set[int] = set()
 
-    for row in rows:
-        personid = coerce_int(_row_value(row.values, "personid", "person_id", "batchid", "batch_id", "employeeid", "employee_id"))
-        name = coerce_str(_row_value(row.values, "name"))
-        date_joined = coerce_date(_row_value(row.values, "datejoined"))
-        sap_id = coerce_str(_row_value(row.values, "sapid"))
-
-        # Fallback: if no personid, try to use sap_id (for passport holders)
-        if not personid:
-            personid = coerce_int(sap_id)
-        status_text = coerce_str(_row_value(row.values, "status"))
-        wdid = coerce_str(_row_value(row.values, "wdid"))
-        transport_contractor = coerce_str(_row_value(row.values, "transportcontractor"))
-        address1 = coerce_str(_row_value(row.values, "address1"))
-        postcode = coerce_str(_row_value(row.values, "postcode"))
-        city = coerce_str(_row_value(row.values, "city"))
-        state = coerce_str(_row_value(row.values, "state"))
-        contact_no = coerce_str(_row_value(row.values, "contactno"))
-        pickup_point = coerce_str(_row_value(row.values, "pickuppoint"))
-        terminate_raw = _row_value(row.values, "terminate")
-        terminate_date = coerce_date(terminate_raw) or coerce_date(coerce_str(terminate_raw))
-        transport = coerce_str(_row_value(row.values, "transport"))
-        route_value = coerce_str(_row_value(row.values, "route"))
-        building_id = coerce_str(_row_value(row.values, "buildingid"))
-        nationality = coerce_str(_row_value(row.values, "nationality"))
-        day_type = coerce_str(_row_value(row.values, "daytype", "day_type"))
-
-        bus_id = _canonical_bus_id(route_value or "") if route_value else None
-        if not bus_id and transport and "own" in transport.lower():
-            bus_id = "OWN"
-        if not bus_id:
-            # Keep bus_id as None instead of assigning to UNKN
-            unassigned_rows += 1
-
-        van_code = _canonical_van_code(transport) if transport else None
-        if bus_id is None:
-            van_code = None
-        if van_code and van_code == bus_id:
-            van_code = None
-
-        active = True
-        if terminate_date or (terminate_raw is not None and str(terminate_raw).strip() != ""):
-            active = False
-        if status_text:
-            status_norm = status_text.strip().lower()
-            if "inactive" in status_norm or "terminate" in status_norm or "terminated" in status_norm:
+    # One coercer per column so each learns that column's date format
+    coerce_date_joined = DateCoercer()
+    coerce_terminate = DateCoercer()
+
+    # Rows are parsed and written in bounded chunks so peak memory stays flat for large files
+    for rows in iter_chunks(_guard_workbook_rows(table.rows, "master list", file_format), UPLOAD_CHUNK_ROWS):
+        processed_rows += len(rows)
+        parsed_rows: list[dict] = []
+        master_rows_with_personid: list[dict] = []
+        master_rows_without_personid: list[dict] = []
+        bus_ids: set[str] = set()
+        van_codes: set[str] = set()
+        personids: set[int] = set()
+
+        for row in rows:
+            personid = coerce_int(_row_value(row.values, "personid", "person_id", "batchid", "batch_id", "employeeid", "employee_id"))
+            name = coerce_str(_row_value(row.values, "name"))
+            date_joined = coerce_date_joined(_row_value(row.values, "datejoined"))
+            sap_id = coerce_str(_row_value(row.values, "sapid"))
+
+            # Fallback: if no personid, try to use sap_id (for passport holders)
+            if not personid:
+                personid = coerce_int(sap_id)
+            status_text = coerce_str(_row_value(row.values, "status"))
+            wdid = coerce_str(_row_value(row.values, "wdid"))
+            transport_contractor = coerce_str(_row_value(row.values, "transportcontractor"))
+            address1 = coerce_str(_row_value(row.values, "address1"))
+            postcode = coerce_str(_row_value(row.values, "postcode"))
+            city = coerce_str(_row_value(row.values, "city"))
+            state = coerce_str(_row_value(row.values, "state"))
+            contact_no = coerce_str(_row_value(row.values, "contactno"))
+            pickup_point = coerce_str(_row_value(row.values, "pickuppoint"))
+            terminate_raw = _row_value(row.values, "terminate")
+            terminate_date = coerce_terminate(terminate_raw) or coerce_terminate(coerce_str(terminate_raw))
+            transport = coerce_str(_row_value(row.values, "transport"))
+            route_value = coerce_str(_row_value(row.values, "route"))
+            building_id = coerce_str(_row_value(row.values, "buildingid"))
+            nationality = coerce_str(_row_value(row.values, "nationality"))
+            day_type = coerce_str(_row_value(row.values, "daytype", "day_type"))
+
+            bus_id = _canonical_bus_id(route_value or "") if route_value else None
+            if not bus_id and transport and "own" in transport.lower():
+                bus_id = "OWN"
+            if not bus_id:
+                # Keep bus_id as None instead of assigning to UNKN
+                unassigned_rows += 1
+
+            van_code = _canonical_van_code(transport) if transport else None
+            if bus_id is None:
+                van_code = None
+            if van_code and van_code == bus_id:
+                van_code = None
+
+            active = True
+            if terminate_date or (terminate_raw is not None and str(terminate_raw).strip() != ""):
                 active = False
-            elif status_norm in {"active", "current"}:
-                active = True
-
-        if personid:
-            personids.add(int(personid))
-
-        if bus_id:
-            bus_ids.add(bus_id)
-            if bus_id not in bus_routes and route_value:
-                bus_routes[bus_id] = route_value.strip()
-        if van_code:
-            van_codes.add(van_code)
-            existing_bus = van_assignments.get(van_code)
-            if existing_bus is None:
-                van_assignments[van_code] = bus_id
-            elif bus_id and existing_bus != bus_id:
-                van_assignments[van_code] = bus_id
-
-        master_base = {
-            "row_number": row.row_number,
-            "personid": int(personid) if personid else None,
-            "name": name,
-            "date_joined": date_joined,
-            "sap_id": sap_id,
-            "status_text": status_text,
-            "wdid": wdid,
-            "transport_contractor": transport_contractor,
-            "address1": address1,
-            "postcode": postcode,
-            "city": city,
-            "state": state,
-            "contact_no": contact_no,
-            "pickup_point": pickup_point,
-            "transport": transport,
-            "route_value": route_value,
-            "building_id": building_id,
-            "nationality": nationality,
-            "terminate_date": terminate_date,
-        }
-
-        if personid:
-            master_rows_with_personid.append(master_base)
-        else:
-            skipped_missing_personid += 1
-            stable = "|".join(
-                [
-                    str(row.row_number),
-                    name or "",
-                    sap_id or "",
-                    wdid or "",
-                    transport_contractor or "",
-                    pickup_point or "",
-                    transport or "",
-                    route_value or "",
-                    building_id or "",
-                    address1 or "",
-                    postcode or "",
-                    city or "",
-                    state or "",
-                    nationality or "",
-                ]
-            )
-            row_hash = hashlib.sha256(stable.encode("utf-8")).hexdigest()
-            master_rows_without_personid.append({**master_base, "row_hash": row_hash})
-
-        if not personid:
-            continue
-        if not name:
-            skipped_missing_name += 1
-            continue
-
-        parsed_rows.append(
-            {
+            if status_text:
+                status_norm = status_text.strip().lower()
+                if "inactive" in status_norm or "terminate" in status_norm or "terminated" in status_norm:
+                    active = False
+                elif status_norm in {"active", "current"}:
+                    active = True
+
+            if personid:
+                personids.add(int(personid))
+
+            if bus_id:
+                bus_ids.add(bus_id)
+                if bus_id not in bus_routes and route_value:
+                    bus_routes[bus_id] = route_value.strip()
+            if van_code:
+                van_codes.add(van_code)
+                existing_bus = van_assignments.get(van_code)
+                if existing_bus is None:
+                    van_assignments[van_code] = bus_id
+                elif bus_id and existing_bus != bus_id:
+                    van_assignments[van_code] = bus_id
+
+            master_base = {
                 "row_number": row.row_number,
-                "personid": int(personid),
+                "personid": int(personid) if personid else None,
                 "name": name,
                 "date_joined": date_joined,
                 "sap_id": sap_id,
@@ -482,203 +538,271 @@ def upload_master_list(file: UploadFile = File(...), db: Session = Depends(get_d
                 "building_id": building_id,
                 "nationality": nationality,
                 "terminate_date": terminate_date,
-                "bus_id": bus_id,
-                "van_code": van_code,
-                "active": active,
             }
-        )
-
-    buses_by_id: dict[str, Bus] = {}
-    vans_by_code: dict[str, Van] = {}
-    employees_by_personid: dict[int, Employee] = {}
-    masters_by_personid: dict[int, EmployeeMaster] = {}
-
-    bus_id_list = sorted(bus_ids)
-    van_code_list = sorted(van_codes)
-    personid_list = sorted(personids)
 
-    if bus_id_list:
-        for chunk in _chunked(bus_id_list):
-            for bus in db.query(Bus).filter(Bus.bus_id.in_(chunk)).all():
-                buses_by_id[bus.bus_id] = bus
+            if personid:
+                master_rows_with_personid.append(master_base)
+            else:
+                skipped_missing_personid += 1
+                stable = "|".join(
+                    [
+                        str(row.row_number),
+                        name or "",
+                        sap_id or "",
+                        wdid or "",
+                        transport_contractor or "",
+                        pickup_point or "",
+                        transport or "",
+                        route_value or "",
+                        building_id or "",
+                        address1 or "",
+                        postcode or "",
+                        city or "",
+                        state or "",
+                        nationality or "",
+                    ]
+                )
+                row_hash = hashlib.sha256(stable.encode("utf-8")).hexdigest()
+                master_rows_without_personid.append({**master_base, "row_hash": row_hash})
 
-    if van_code_list:
-        for chunk in _chunked(van_code_list):
-            for van in db.query(Van).filter(Van.van_code.in_(chunk)).all():
-                vans_by_code[van.van_code] = van
+            if not personid:
+                continue
+            if not name:
+                skipped_missing_name += 1
+                continue
 
-    if personid_list:
-        for chunk in _chunked(personid_list):
-            for emp in db.query(Employee).filter(Employee.batch_id.in_(chunk)).all():
-                employees_by_personid[int(emp.batch_id)] = emp
-            for master in db.query(EmployeeMaster).filter(EmployeeMaster.personid.in_(chunk)).all():
-                masters_by_personid[int(master.personid)] = master
+            parsed_rows.append(
+                {
+                    "row_number": row.row_number,
+                    "personid": int(personid),
+                    "name": name,
+                    "date_joined": date_joined,
+                    "sap_id": sap_id,
+                    "status_text": status_text,
+                    "wdid": wdid,
+                    "transport_contractor": transport_contractor,
+                    "address1": address1,
+                    "postcode": postcode,
+                    "city": city,
+                    "state": state,
+                    "contact_no": contact_no,
+                    "pickup_point": pickup_point,
+                    "transport": transport,
+                    "route_value": route_value,
+                    "building_id": building_id,
+                    "nationality": nationality,
+                    "terminate_date": terminate_date,
+                    "bus_id": bus_id,
+                    "van_code": van_code,
+                    "active": active,
+                }
+            )
 
-    touched_buses: set[str] = set()
-    touched_vans: set[str] = set()
-    touched_employees: set[int] = set()
+        employees_by_personid: dict[int, Employee] = {}
+        masters_by_personid: dict[int, EmployeeMaster] = {}
+
+        # Rows from earlier chunks were flushed, so lookups below also see them
+        bus_id_list = sorted(bid for bid in bus_ids if bid not in buses_by_id)
+        van_code_list = sorted(vcode for vcode in van_codes if vcode not in vans_by_code)
+        personid_list = sorted(personids)
+
+        if bus_id_list:
+            for chunk in _chunked(bus_id_list):
+                for bus in db.query(Bus).filter(Bus.bus_id.in_(chunk)).all():
+                    buses_by_id[bus.bus_id] = bus
+
+        if van_code_list:
+            for chunk in _chunked(van_code_list):
+                for van in db.query(Van).filter(Van.van_code.in_(chunk)).all():
+                    vans_by_code[van.van_code] = van
+
+        if personid_list:
+            for chunk in _chunked(personid_list):
+                for emp in db.query(Employee).filter(Employee.batch_id.in_(chunk)).all():
+                    employees_by_personid[int(emp.batch_id)] = emp
+                for master in db.query(EmployeeMaster).filter(EmployeeMaster.personid.in_(chunk)).all():
+                    masters_by_personid[int(master.personid)] = master
+
+        for bid in bus_id_list:
+            if bid in buses_by_id:
+                continue
+            buses_by_id[bid] = Bus(
+                bus_id=bid,
+                route=("Unassigned" if bid == "UNKN" else bus_routes.get(bid) or f"Route-{bid}"),
+                plate_number=None,
+                capacity=None if bid in {"OWN", "UNKN"} else 40,
+            )
+            db.add(buses_by_id[bid])
+            buses_upserted += 1
+            touched_buses.add(bid)
 
-    for bid in bus_id_list:
-        if bid in buses_by_id:
-            continue
-        buses_by_id[bid] = Bus(
-            bus_id=bid,
-            route=("Unassigned" if bid == "UNKN" else bus_routes.get(bid) or f"Route-{bid}"),
-            plate_number=None,
-            capacity=None if bid in {"OWN", "UNKN"} else 40,
-        )
-        db.add(buses_by_id[bid])
-        buses_upserted += 1
-        touched_buses.add(bid)
+        for vcode in van_code_list:
+            if vcode in vans_by_code:
+                continue
+            assigned_bus_id = van_assignments.get(vcode)
+            bus = buses_by_id.get(assigned_bus_id)
+            van_obj = Van(van_code=vcode, bus_id=assigned_bus_id, plate_number=None, driver_name=None, capacity=12, active=True)
+            if bus:
+                van_obj.bus = bus
+            db.add(van_obj)
+            vans_by_code[vcode] = van_obj
+            created_vans.add(vcode)
+            vans_upserted += 1
+            touched_vans.add(vcode)
+
+        # Upsert master rows with PersonId (unique index). Keep existing values when new values are missing.
+        for item in master_rows_with_personid:
+            if item["personid"] is None:
+                continue
+            personid = int(item["personid"])
 
-    for vcode in van_code_list:
-        if vcode in vans_by_code:
-            continue
-        assigned_bus_id = van_assignments.get(vcode)
-        bus = buses_by_id.get(assigned_bus_id)
-        van_obj = Van(van_code=vcode, bus_id=assigned_bus_id, plate_number=None, driver_name=None, capacity=12, active=True)
-        if bus:
-            van_obj.bus = bus
-        db.add(van_obj)
-        vans_by_code[vcode] = van_obj
-        vans_upserted += 1
-        touched_vans.add(vcode)
-
-    # Upsert master rows with PersonId (unique index). Keep existing values when new values are missing.
-    for item in master_rows_with_personid:
-        if item["personid"] is None:
-            continue
-        personid = int(item["personid"])
+            master = masters_by_personid.get(personid)
+            if not master:
+                master = EmployeeMaster(personid=personid)
+                db.add(master)
+                masters_by_personid[personid] = master
 
-        master = masters_by_personid.get(personid)
-        if not master:
-            master = EmployeeMaster(personid=personid)
+            if item["date_joined"] is not None:
+                master.date_joined = item["date_joined"]
+            if item["name"] is not None:
+                master.name = item["name"]
+            if item["sap_id"] is not None:
+                master.sap_id = item["sap_id"]
+            if item["status_text"] is not None:
+                master.status = item["status_text"]
+            if item["wdid"] is not None:
+                master.wdid = item["wdid"]
+            if item["transport_contractor"] is not None:
+                master.transport_contractor = item["transport_contractor"]
+            if item["address1"] is not None:
+                master.address1 = item["address1"]
+            if item["postcode"] is not None:
+                master.postcode = item["postcode"]
+            if item["city"] is not None:
+                master.city = item["city"]
+            if item["state"] is not None:
+                master.state = item["state"]
+            if item["contact_no"] is not None:
+                master.contact_no = item["contact_no"]
+            if item["pickup_point"] is not None:
+                master.pickup_point = item["pickup_point"]
+            if item["transport"] is not None:
+                master.transport = item["transport"]
+            if item["route_value"] is not None:
+                master.route = item["route_value"]
+            if item["building_id"] is not None:
+                master.building_id = item["building_id"]
+            if item["nationality"] is not None:
+                master.nationality = item["nationality"]
+            if item["terminate_date"] is not None:
+                master.terminate = item["terminate_date"]
+
+        # Insert master rows without PersonId for audit (not linked to employees).
+        for item in master_rows_without_personid:
+            master = EmployeeMaster(personid=None)
+            master.row_hash = item.get("row_hash")
+            master.date_joined = item.get("date_joined")
+            master.name = item.get("name")
+            master.sap_id = item.get("sap_id")
+            master.status = item.get("status_text")
+            master.wdid = item.get("wdid")
+            master.transport_contractor = item.get("transport_contractor")
+            master.address1 = item.get("address1")
+            master.postcode = item.get("postcode")
+            master.city = item.get("city")
+            master.state = item.get("state")
+            master.contact_no = item.get("contact_no")
+            master.pickup_point = item.get("pickup_point")
+            master.transport = item.get("transport")
+            master.route = item.get("route_value")
+            master.building_id = item.get("building_id")
+            master.nationality = item.get("nationality")
+            master.terminate = item.get("terminate_date")
             db.add(master)
-            masters_by_personid[personid] = master
-
-        if item["date_joined"] is not None:
-            master.date_joined = item["date_joined"]
-        if item["name"] is not None:
-            master.name = item["name"]
-        if item["sap_id"] is not None:
-            master.sap_id = item["sap_id"]
-        if item["status_text"] is not None:
-            master.status = item["status_text"]
-        if item["wdid"] is not None:
-            master.wdid = item["wdid"]
-        if item["transport_contractor"] is not None:
-            master.transport_contractor = item["transport_contractor"]
-        if item["address1"] is not None:
-            master.address1 = item["address1"]
-        if item["postcode"] is not None:
-            master.postcode = item["postcode"]
-        if item["city"] is not None:
-            master.city = item["city"]
-        if item["state"] is not None:
-            master.state = item["state"]
-        if item["contact_no"] is not None:
-            master.contact_no = item["contact_no"]
-        if item["pickup_point"] is not None:
-            master.pickup_point = item["pickup_point"]
-        if item["transport"] is not None:
-            master.transport = item["transport"]
-        if item["route_value"] is not None:
-            master.route = item["route_value"]
-        if item["building_id"] is not None:
-            master.building_id = item["building_id"]
-        if item["nationality"] is not None:
-            master.nationality = item["nationality"]
-        if item["terminate_date"] is not None:
-            master.terminate = item["terminate_date"]
-
-    # Insert master rows without PersonId for audit (not linked to employees).
-    for item in master_rows_without_personid:
-        master = EmployeeMaster(personid=None)
-        master.row_hash = item.get("row_hash")
-        master.date_joined = item.get("date_joined")
-        master.name = item.get("name")
-        master.sap_id = item.get("sap_id")
-        master.status = item.get("status_text")
-        master.wdid = item.get("wdid")
-        master.transport_contractor = item.get("transport_contractor")
-        master.address1 = item.get("address1")
-        master.postcode = item.get("postcode")
-        master.city = item.get("city")
-        master.state = item.get("state")
-        master.contact_no = item.get("contact_no")
-        master.pickup_point = item.get("pickup_point")
-        master.transport = item.get("transport")
-        master.route = item.get("route_value")
-        master.building_id = item.get("building_id")
-        master.nationality = item.get("nationality")
-        master.terminate = item.get("terminate_date")
-        db.add(master)
-
-    for item in parsed_rows:
-        personid = int(item["personid"])
-
-        bus_id = item["bus_id"]
-        bus = None
-        if bus_id:
-            bus = buses_by_id.get(bus_id)
-            if not bus:
-                bus = Bus(
-                    bus_id=bus_id,
-                    route=("Unassigned" if bus_id == "UNKN" else (item["route_value"] or f"Route-{bus_id}").strip()),
-                    plate_number=None,
-                    capacity=None if bus_id in {"OWN", "UNKN"} else 40,
-                )
-                db.add(bus)
-                buses_by_id[bus_id] = bus
-                buses_upserted += 1
-                touched_buses.add(bus_id)
-            else:
-                route_value = item["route_value"]
-                if bus_id not in touched_buses and route_value and bus.route != route_value.strip():
-                    bus.route = route_value.strip()
+
+        for item in parsed_rows:
+            personid = int(item["personid"])
+
+            bus_id = item["bus_id"]
+            bus = None
+            if bus_id:
+                bus = buses_by_id.get(bus_id)
+                if not bus:
+                    bus = Bus(
+                        bus_id=bus_id,
+                        route=("Unassigned" if bus_id == "UNKN" else (item["route_value"] or f"Route-{bus_id}").strip()),
+                        plate_number=None,
+                        capacity=None if bus_id in {"OWN", "UNKN"} else 40,
+                    )
+                    db.add(bus)
+                    buses_by_id[bus_id] = bus
                     buses_upserted += 1
                     touched_buses.add(bus_id)
-
-        van_obj: Optional[Van] = None
-        van_code = item["van_code"]
-        if van_code and bus_id:
-            van_obj = vans_by_code.get(van_code)
-            if not van_obj:
-                van_obj = Van(van_code=van_code, bus_id=bus_id, plate_number=None, driver_name=None, capacity=12, active=True)
-                van_obj.bus = bus
-                db.add(van_obj)
-                vans_by_code[van_code] = van_obj
-                vans_upserted += 1
-                touched_vans.add(van_code)
-            else:
-                if van_code not in touched_vans and van_obj.bus_id != bus_id:
-                    van_obj.bus_id = bus_id
+                else:
+                    route_value = item["route_value"]
+                    if bus_id not in touched_buses and route_value and bus.route != route_value.strip():
+                        bus.route = route_value.strip()
+                        buses_upserted += 1
+                        touched_buses.add(bus_id)
+
+            van_obj: Optional[Van] = None
+            van_code = item["van_code"]
+            if van_code and bus_id:
+                van_obj = vans_by_code.get(van_code)
+                if not van_obj:
+                    van_obj = Van(van_code=van_code, bus_id=bus_id, plate_number=None, driver_name=None, capacity=12, active=True)
                     van_obj.bus = bus
+                    db.add(van_obj)
+                    vans_by_code[van_code] = van_obj
                     vans_upserted += 1
                     touched_vans.add(van_code)
+                else:
+                    if van_code not in touched_vans and van_obj.bus_id != bus_id:
+                        van_obj.bus_id = bus_id
+                        van_obj.bus = bus
+                        vans_upserted += 1
+                        touched_vans.add(van_code)
 
-        employee = employees_by_personid.get(personid)
-        if not employee:
-            employee = Employee(batch_id=personid, name=item["name"], bus_id=bus_id, van_id=None, active=bool(item["active"]))
-            db.add(employee)
-            employees_by_personid[personid] = employee
-        else:
-            if item["name"] is not None:
-                employee.name = item["name"]
-            employee.bus_id = bus_id
-            employee.active = bool(item["active"])
+            employee = employees_by_personid.get(personid)
+            if not employee:
+                employee = Employee(batch_id=personid, name=item["name"], bus_id=bus_id, van_id=None, active=bool(item["active"]))
+                db.add(employee)
+                employees_by_personid[personid] = employee
+            else:
+                if item["name"] is not None:
+                    employee.name = item["name"]
+                employee.bus_id = bus_id
+                employee.active = bool(item["active"])
 
-        employee.bus = bus
-        employee.van = van_obj if van_obj else None
+            employee.bus = bus
+            employee.van = van_obj if van_obj else None
 
-        if personid not in touched_employees:
-            employees_upserted += 1
-            touched_employees.add(personid)
+            if personid not in touched_employees:
+                employees_upserted += 1
+                touched_employees.add(personid)
 
+        # Flushed objects drop out of the session's strong references
+        db.flush()
+
+    if processed_rows == 0:
+        raise no_rows_error
+
+    # A new van follows the last bus it is listed under anywhere in the file
+    for vcode in created_vans:
+        van_obj = vans_by_code[vcode]
+        assigned_bus_id = van_assignments.get(vcode)
+        if van_obj.bus_id != assigned_bus_id:
+            van_obj.bus_id = assigned_bus_id
+            van_obj.bus = buses_by_id.get(assigned_bus_id)
+
+    db.flush()
+    refresh_bus_plant(db)
     db.commit()
+    # Roster, routes and plants may all have changed
+    invalidate_cache()
 
     return MasterListUploadResponse(
-        processed_rows=len(rows),
+        processed_rows=processed_rows,
         selected_sheet=table.sheet_name,
         header_row_number=table.header_row_number,
         buses_upserted=buses_upserted,
@@ -694,14 +818,15 @@ def upload_master_list(file: UploadFile = File(...), db: Session = Depends(get_d
 @router.post("/attendance/upload", response_model=AttendanceUploadResponse, status_code=status.HTTP_201_CREATED)
 def upload_attendance(file: UploadFile = File(...), shift: Optional[str] = None, db: Session = Depends(get_db)):
     """
-    Upload an attendance Excel and create Attendance rows by matching PersonId against the master list.
+    Upload an attendance file (.xlsx, .csv or .tsv) and create Attendance rows by matching PersonId against the master list.
 
     - If PersonId matches an employee: status is recorded as "present"
     - If no match: status is recorded as "unknown_batch"
-    - Date is taken from the Excel per row
+    - Date is taken from the file per row
     """
-    if not file.filename or not file.filename.lower().endswith(".xlsx"):
-        raise HTTPException(status_code=400, detail="Only .xlsx files are supported")
+    file_format = upload_format(file.filename)
+    if not file_format:
+        raise HTTPException(status_code=400, detail="Only .xlsx, .csv and .tsv files are supported")
 
     shift_override: Optional[AttendanceShift] = None
     if shift is not None and shift != "":
@@ -710,10 +835,10 @@ def upload_attendance(file: UploadFile = File(...), shift: Optional[str] = None,
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid shift. Use morning, night, or unknown.")
 
-    xlsx_bytes = file.file.read()
+    file_bytes = file.file.read()
     try:
-        table = read_table_from_best_sheet(
-            xlsx_bytes,
+        table = stream_table_from_best_sheet(
+            file_bytes,
             must_include={"personid"},
             prefer_include={
                 "date",
@@ -735,155 +860,204 @@ def upload_attendance(file: UploadFile = File(...), shift: Optional[str] = None,
             required_non_empty_in_sample={"personid"},
             min_valid_sample_rows=1,
             sample_size=20,
+            file_format=file_format,
         )
     except Exception:
         logger.exception("Failed to parse attendance workbook")
-        raise HTTPException(status_code=400, detail="Invalid .xlsx file (unable to read workbook)")
-
-    if not table or not table.rows:
-        raise HTTPException(status_code=400, detail="Could not find a worksheet containing PersonId rows")
+        raise _unreadable_upload(file_format)
 
-    rows = table.rows
+    no_rows_error = HTTPException(status_code=400, detail="Could not find a worksheet containing PersonId rows")
+    if not table:
+        raise no_rows_error
 
     row_errors: List[UploadRowError] = []
+    processed_rows = 0
     attendance_inserted = 0
     duplicates_ignored = 0
     unknown_personids = 0
     offday_count = 0
     skipped_no_timein = 0
     skipped_missing_date = 0
+    unknown_attendance_inserted = 0
+    touched_dates: set = set()
+    touched_bus_ids: set[str] = set()
+    occupancy_deltas = OccupancyDeltas()
+
+    # One coercer per column so each learns that column's date/time format
+    coerce_scan_date = DateCoercer()
+    coerce_time_in = TimeCoercer()
+
+    # Rows are parsed and written in bounded chunks so peak memory stays flat for large files.
+    # Each chunk is flushed, so duplicate checks in later chunks see the rows already written.
+    for rows in iter_chunks(_guard_workbook_rows(table.rows, "attendance", file_format), UPLOAD_CHUNK_ROWS):
+        processed_rows += len(rows)
+        parsed_rows: list[dict] = []
+        personids: set[int] = set()
+        scanned_dates: set = set()
+        shifts: set[AttendanceShift] = set()
+
+        for row in rows:
+            personid = coerce_int(_row_value(row.values, "personid", "batchid", "batch_id"))
+            if not personid:
+                row_errors.append(UploadRowError(row_number=row.row_number, message="Missing PersonId"))
+                continue
 
-    parsed_rows: list[dict] = []
-    personids: set[int] = set()
-    scanned_dates: set = set()
-    shifts: set[AttendanceShift] = set()
-
-    for row in rows:
-        personid = coerce_int(_row_value(row.values, "personid", "batchid", "batch_id"))
-        if not personid:
-            row_errors.append(UploadRowError(row_number=row.row_number, message="Missing PersonId"))
-            continue
-
-        raw_date = _row_value(
-            row.values,
-            "date",
-            "infodate",
-            "attendancedate",
-            "attendanceon",
-            "scannedon",
-            "scandate",
-            "scan_date",
-        )
+            raw_date = _row_value(
+                row.values,
+                "date",
+                "infodate",
+                "attendancedate",
+                "attendanceon",
+                "scannedon",
+                "scandate",
+                "scan_date",
+            )
 
-        scanned_on = coerce_date(raw_date)
-        if not scanned_on:
-            skipped_missing_date += 1
-            continue
+            scanned_on = coerce_scan_date(raw_date)
+            if not scanned_on:
+                skipped_missing_date += 1
+                continue
 
-        # Read DayType to determine if employee should be working
-        day_type = coerce_str(_row_value(row.values, "daytype", "day_type"))
+            # Read DayType to determine if employee should be working
+            day_type = coerce_str(_row_value(row.values, "daytype", "day_type"))
 
-        # Skip if DayType is "Offday" - employee is not expected to work
-        if day_type and day_type.lower() == "offday":
-            continue
+            # Skip if DayType is "Offday" - employee is not expected to work
+            if day_type and day_type.lower() == "offday":
+                continue
 
-        # For workforce exports, treat rows with TimeIn as present; Offday/absence rows typically have no TimeIn.
-        time_in = coerce_time(_row_value(row.values, "timein"))
+            # For workforce exports, treat rows with TimeIn as present; Offday/absence rows typically have no TimeIn.
+            time_in = coerce_time_in(_row_value(row.values, "timein"))
 
-        # Capture route from attendance row (for unknown PersonId tracking)
-        route_raw = coerce_str(_row_value(row.values, "route"))
+            # Capture route from attendance row (for unknown PersonId tracking)
+            route_raw = coerce_str(_row_value(row.values, "route"))
 
-        shift_value: AttendanceShift = shift_override or AttendanceShift.unknown
-        scanned_at: datetime
-        is_offday = time_in is None
+            shift_value: AttendanceShift = shift_override or AttendanceShift.unknown
+            scanned_at: datetime
+            is_offday = time_in is None
 
-        if time_in is not None:
-            # Has TimeIn - determine shift from time
-            if shift_override is None:
-                local_dt = datetime.combine(scanned_on, time_in).replace(tzinfo=LOCAL_TZ)
-                shift_value = derive_shift(local_dt)
-                scanned_at = local_dt
+            if time_in is not None:
+                # Has TimeIn - determine shift from time
+                if shift_override is None:
+                    local_dt = datetime.combine(scanned_on, time_in).replace(tzinfo=LOCAL_TZ)
+                    shift_value = derive_shift(local_dt)
+                    scanned_at = local_dt
+                else:
+                    scanned_at = datetime.combine(scanned_on, time_in).replace(tzinfo=LOCAL_TZ)
             else:
-                scanned_at = datetime.combine(scanned_on, time_in).replace(tzinfo=LOCAL_TZ)
-        else:
-            # No TimeIn - offday/absent, use default time
-            if shift_override is not None:
-                shift_value = shift_override
-            # Use a default time for offday records
-            scanned_at = datetime.combine(scanned_on, time(0, 0)).replace(tzinfo=LOCAL_TZ)
-
-        parsed_rows.append(
-            {
-                "row_number": row.row_number,
-                "personid": int(personid),
-                "raw_date": raw_date,
-                "scanned_on": scanned_on,
-                "shift": shift_value,
-                "scanned_at": scanned_at,
-                "is_offday": is_offday,
-                "route_raw": route_raw,  # Track route for unknown PersonId handling
-            }
-        )
-        personids.add(int(personid))
-        scanned_dates.add(scanned_on)
-        shifts.add(shift_value)
+                # No TimeIn - offday/absent, use default time
+                if shift_override is not None:
+                    shift_value = shift_override
+                # Use a default time for offday records
+                scanned_at = datetime.combine(scanned_on, time(0, 0)).replace(tzinfo=LOCAL_TZ)
 
-    employees_by_personid: dict[int, Employee] = {}
-    personid_list = sorted(personids)
-    if personid_list:
-        for chunk in _chunked(personid_list):
-            for emp in db.query(Employee).filter(Employee.batch_id.in_(chunk)).all():
-                employees_by_personid[int(emp.batch_id)] = emp
-
-    # Track existing records in database and within this upload file
-    existing_keys: set[tuple[int, object, AttendanceShift]] = set()
-    if personid_list and scanned_dates and shifts:
-        for chunk in _chunked(personid_list):
-            for scanned_batch_id, scanned_on, shift_val in (
-                db.query(Attendance.scanned_batch_id, Attendance.scanned_on, Attendance.shift)
-                .filter(Attendance.scanned_batch_id.in_(chunk))
-                .filter(Attendance.scanned_on.in_(list(scanned_dates)))
-                .filter(Attendance.shift.in_(list(shifts)))
-                .all()
-            ):
-                existing_keys.add((int(scanned_batch_id), scanned_on, shift_val))
-
-    # Also check for existing unknown attendance records to avoid duplicates
-    existing_unknown_keys: set[tuple[int, object, AttendanceShift]] = set()
-    if personid_list and scanned_dates and shifts:
-        for chunk in _chunked(personid_list):
-            for scanned_batch_id, scanned_on, shift_val in (
-                db.query(UnknownAttendance.scanned_batch_id, UnknownAttendance.scanned_on, UnknownAttendance.shift)
-                .filter(UnknownAttendance.scanned_batch_id.in_(chunk))
-                .filter(UnknownAttendance.scanned_on.in_(list(scanned_dates)))
-                .filter(UnknownAttendance.shift.in_(list(shifts)))
-                .all()
-            ):
-                existing_unknown_keys.add((int(scanned_batch_id), scanned_on, shift_val))
-
-    unknown_attendance_inserted = 0
+            parsed_rows.append(
+                {
+                    "row_number": row.row_number,
+                    "personid": int(personid),
+                    "raw_date": raw_date,
+                    "scanned_on": scanned_on,
+                    "shift": shift_value,
+                    "scanned_at": scanned_at,
+                    "is_offday": is_offday,
+                    "route_raw": route_raw,  # Track route for unknown PersonId handling
+                }
+            )
+            personids.add(int(personid))
+            scanned_dates.add(scanned_on)
+            shifts.add(shift_value)
+
+        employees_by_personid: dict[int, Employee] = {}
+        personid_list = sorted(personids)
+        if personid_list:
+            for chunk in _chunked(personid_list):
+                for emp in db.query(Employee).filter(Employee.batch_id.in_(chunk)).all():
+                    employees_by_personid[int(emp.batch_id)] = emp
+
+        # Track existing records in database and within this upload file
+        existing_keys: set[tuple[int, object, AttendanceShift]] = set()
+        if personid_list and scanned_dates and shifts:
+            for chunk in _chunked(personid_list):
+                for scanned_batch_id, scanned_on, shift_val in (
+                    db.query(Attendance.scanned_batch_id, Attendance.scanned_on, Attendance.shift)
+                    .filter(Attendance.scanned_batch_id.in_(chunk))
+                    .filter(Attendance.scanned_on.in_(list(scanned_dates)))
+                    .filter(Attendance.shift.in_(list(shifts)))
+                    .all()
+                ):
+                    existing_keys.add((int(scanned_batch_id), scanned_on, shift_val))
+
+        # Also check for existing unknown attendance records to avoid duplicates
+        existing_unknown_keys: set[tuple[int, object, AttendanceShift]] = set()
+        if personid_list and scanned_dates and shifts:
+            for chunk in _chunked(personid_list):
+                for scanned_batch_id, scanned_on, shift_val in (
+                    db.query(UnknownAttendance.scanned_batch_id, UnknownAttendance.scanned_on, UnknownAttendance.shift)
+                    .filter(UnknownAttendance.scanned_batch_id.in_(chunk))
+                    .filter(UnknownAttendance.scanned_on.in_(list(scanned_dates)))
+                    .filter(UnknownAttendance.shift.in_(list(shifts)))
+                    .all()
+                ):
+                    existing_unknown_keys.add((int(scanned_batch_id), scanned_on, shift_val))
+
+        for item in parsed_rows:
+            personid = item["personid"]
+            scanned_on = item["scanned_on"]
+            shift_value = item["shift"]
+
+            key = (personid, scanned_on, shift_value)
+            if key in existing_keys:
+                duplicates_ignored += 1
+                continue
 
-    for item in parsed_rows:
-        personid = item["personid"]
-        scanned_on = item["scanned_on"]
-        shift_value = item["shift"]
+            employee = employees_by_personid.get(personid)
 
-        key = (personid, scanned_on, shift_value)
-        if key in existing_keys:
-            duplicates_ignored += 1
-            continue
+            # Handle unknown PersonId - save to unknown_attendances table
+            if not employee:
+                unknown_personids += 1
+                # Check if already exists in unknown_attendances
+                if key in existing_unknown_keys:
+                    continue
+                # Save to unknown_attendances table with route info
+                route_raw = item.get("route_raw")
+                bus_id_from_route = _canonical_bus_id(route_raw) if route_raw else None
+
+                raw_date = item["raw_date"]
+                scanned_at = item.get("scanned_at")
+                if scanned_at is None:
+                    if isinstance(raw_date, datetime):
+                        scanned_at = raw_date.replace(tzinfo=LOCAL_TZ) if raw_date.tzinfo is None else raw_date.astimezone(LOCAL_TZ)
+                    else:
+                        scanned_at = build_scanned_at(scanned_on, shift_value.value).replace(tzinfo=LOCAL_TZ)
+
+                unknown_attendance = UnknownAttendance(
+                    scanned_batch_id=personid,
+                    route_raw=route_raw,
+                    bus_id=bus_id_from_route,
+                    shift=UnknownAttendanceShift(shift_value.value),
+                    scanned_at=scanned_at,
+                    scanned_on=scanned_on,
+                    source="manual_upload",
+                )
+                db.add(unknown_attendance)
+                occupancy_deltas.add_unknown(scanned_on, shift_value, bus_id_from_route, route_raw)
+                unknown_attendance_inserted += 1
+                touched_dates.add(scanned_on)
+                if bus_id_from_route:
+                    touched_bus_ids.add(bus_id_from_route)
+                existing_unknown_keys.add(key)
+                continue
 
-        employee = employees_by_personid.get(personid)
+            status_value: str
+            employee_id: Optional[int] = None
+            bus_id: Optional[str] = None
+            van_id: Optional[int] = None
+            is_offday = item.get("is_offday", False)
 
-        # Handle unknown PersonId - save to unknown_attendances table
-        if not employee:
-            unknown_personids += 1
-            # Check if already exists in unknown_attendances
-            if key in existing_unknown_keys:
-                continue
-            # Save to unknown_attendances table with route info
-            route_raw = item.get("route_raw")
-            bus_id_from_route = _canonical_bus_id(route_raw) if route_raw else None
+            employee_id = employee.id
+            bus_id = employee.bus_id
+            van_id = employee.van_id
+            # Set status based on whether it's offday
+            status_value = "offday" if is_offday else "present"
 
             raw_date = item["raw_date"]
             scanned_at = item.get("scanned_at")
@@ -893,61 +1067,38 @@ def upload_attendance(file: UploadFile = File(...), shift: Optional[str] = None,
                 else:
                     scanned_at = build_scanned_at(scanned_on, shift_value.value).replace(tzinfo=LOCAL_TZ)
 
-            unknown_attendance = UnknownAttendance(
+            attendance = Attendance(
                 scanned_batch_id=personid,
-                route_raw=route_raw,
-                bus_id=bus_id_from_route,
-                shift=UnknownAttendanceShift(shift_value.value),
+                employee_id=employee_id,
+                bus_id=bus_id,
+                van_id=van_id,
+                shift=shift_value,
+                status=status_value,
                 scanned_at=scanned_at,
                 scanned_on=scanned_on,
                 source="manual_upload",
             )
-            db.add(unknown_attendance)
-            unknown_attendance_inserted += 1
-            existing_unknown_keys.add(key)
-            continue
+            db.add(attendance)
+            occupancy_deltas.add_attendance(scanned_on, shift_value, bus_id, van_id, status_value)
+            attendance_inserted += 1
+            touched_dates.add(scanned_on)
+            if bus_id:
+                touched_bus_ids.add(bus_id)
+            if is_offday:
+                offday_count += 1
+            existing_keys.add(key)
 
-        status_value: str
-        employee_id: Optional[int] = None
-        bus_id: Optional[str] = None
-        van_id: Optional[int] = None
-        is_offday = item.get("is_offday", False)
-
-        employee_id = employee.id
-        bus_id = employee.bus_id
-        van_id = employee.van_id
-        # Set status based on whether it's offday
-        status_value = "offday" if is_offday else "present"
-
-        raw_date = item["raw_date"]
-        scanned_at = item.get("scanned_at")
-        if scanned_at is None:
-            if isinstance(raw_date, datetime):
-                scanned_at = raw_date.replace(tzinfo=LOCAL_TZ) if raw_date.tzinfo is None else raw_date.astimezone(LOCAL_TZ)
-            else:
-                scanned_at = build_scanned_at(scanned_on, shift_value.value).replace(tzinfo=LOCAL_TZ)
+        db.flush()
 
-        attendance = Attendance(
-            scanned_batch_id=personid,
-            employee_id=employee_id,
-            bus_id=bus_id,
-            van_id=van_id,
-            shift=shift_value,
-            status=status_value,
-            scanned_at=scanned_at,
-            scanned_on=scanned_on,
-            source="manual_upload",
-        )
-        db.add(attendance)
-        attendance_inserted += 1
-        if is_offday:
-            offday_count += 1
-        existing_keys.add(key)
+    if processed_rows == 0:
+        raise no_rows_error
 
+    apply_daily_occupancy_deltas(db, occupancy_deltas)
     db.commit()
+    invalidate_cache(dates=touched_dates, bus_ids=touched_bus_ids)
 
     return AttendanceUploadResponse(
-        processed_rows=len(rows),
+        processed_rows=processed_rows,
         selected_sheet=table.sheet_name,
         header_row_number=table.header_row_number,
         attendance_inserted=attendance_inserted,
@@ -996,7 +1147,10 @@ def delete_attendance_by_date(
         Attendance.scanned_on <= end_date
     ).delete(synchronize_session=False)
 
+    deleted_dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    refresh_daily_occupancy(db, deleted_dates)
     db.commit()
+    invalidate_cache(dates=deleted_dates)
 
     return {
         "deleted_count": count,
@@ -1014,13 +1168,14 @@ def upload_scans(
     """
     Upload scan records from an entry scanner (factory gate).
 
-    Flow per scan:
+    The batch is ingested set-based rather than scan by scan:
     - Authenticate via API key (label is informational)
-    - Parse scan time, derive shift from Kuala Lumpur local time
-    - Find employee by batch_id, attach bus/van from assignment, set status
-    - Insert attendance (dedupe per batch_id + date + shift)
+    - Parse every scan time, derive shift from Kuala Lumpur local time
+    - Resolve employees for the whole batch, attach bus/van from assignment, set status
+    - Dedupe per batch_id + date + shift within the batch and against existing rows
+      with a single chunked lookup
+    - Insert all new attendance rows in one statement
     """
-    success_ids: List[int] = []
     batch_ids = list({scan.batch_id for scan in request.scans})
     employees_by_personid: dict[int, Employee] = {}
 
@@ -1029,86 +1184,89 @@ def upload_scans(
             for emp in db.query(Employee).filter(Employee.batch_id.in_(chunk)).all():
                 employees_by_personid[int(emp.batch_id)] = emp
 
+    # Normalize the whole batch in memory, keeping the first scan per batch/date/shift.
+    # accepted keeps (scan id, attendance key) in upload order; unknown employees have no key.
+    accepted: list[tuple[int, Optional[AttendanceKey]]] = []
+    pending_rows: dict[AttendanceKey, dict] = {}
     for scan in request.scans:
         try:
-            # Parse scan time
-            try:
-                parsed = datetime.fromisoformat(scan.scan_time)
-            except ValueError:
-                logger.warning(f"Invalid scan_time format: {scan.scan_time}")
-                continue
-
-            # Normalize to KL timezone
-            if parsed.tzinfo is None:
-                local_dt = parsed.replace(tzinfo=LOCAL_TZ)
-            else:
-                local_dt = parsed.astimezone(LOCAL_TZ)
+            parsed = datetime.fromisoformat(scan.scan_time)
+        except ValueError:
+            logger.warning(f"Invalid scan_time format: {scan.scan_time}")
+            continue
 
-            shift = derive_shift(local_dt)
-            scanned_on = local_dt.date()
+        # Normalize to KL timezone
+        if parsed.tzinfo is None:
+            local_dt = parsed.replace(tzinfo=LOCAL_TZ)
+        else:
+            local_dt = parsed.astimezone(LOCAL_TZ)
 
-            employee = employees_by_personid.get(int(scan.batch_id))
+        shift = derive_shift(local_dt)
+        scanned_on = local_dt.date()
 
-            # Skip if employee not found - no unknown_batch records
-            if not employee:
-                logger.warning(f"Skipping scan for unknown batch_id: {scan.batch_id}")
-                success_ids.append(scan.id)
-                continue
+        employee = employees_by_personid.get(int(scan.batch_id))
 
-            status: str
-            bus_id: Optional[str] = None
-            van_id: Optional[int] = None
-            employee_id: Optional[int] = None
+        # Skip if employee not found - no unknown_batch records
+        if not employee:
+            logger.warning(f"Skipping scan for unknown batch_id: {scan.batch_id}")
+            accepted.append((scan.id, None))
+            continue
 
-            employee_id = employee.id
-            bus_id = employee.bus_id
-            van_id = employee.van_id
-            status = "present" if shift != AttendanceShift.unknown else "unknown_shift"
-
-            # Prevent duplicate per batch/date/shift
-            exists = db.query(Attendance.id).filter(
-                and_(
-                    Attendance.scanned_batch_id == scan.batch_id,
-                    Attendance.scanned_on == scanned_on,
-                    Attendance.shift == shift,
-                )
-            ).first()
-            if exists:
-                success_ids.append(scan.id)
-                continue
+        key = (int(scan.batch_id), scanned_on, shift)
+        accepted.append((scan.id, key))
+        if key in pending_rows:
+            continue
 
-            attendance = Attendance(
-                scanned_batch_id=scan.batch_id,
-                employee_id=employee_id,
-                bus_id=bus_id,
-                van_id=van_id,
-                shift=shift,
-                status=status,
-                scanned_at=local_dt,
-                scanned_on=scanned_on,
-                source="pi_agent",
-            )
-            db.add(attendance)
-            db.flush()
+        pending_rows[key] = {
+            "scanned_batch_id": int(scan.batch_id),
+            "employee_id": employee.id,
+            "bus_id": employee.bus_id,
+            "van_id": employee.van_id,
+            "shift": shift,
+            "status": "present" if shift != AttendanceShift.unknown else "unknown_shift",
+            "scanned_at": local_dt,
+            "scanned_on": scanned_on,
+            "source": "pi_agent",
+        }
 
-            success_ids.append(scan.id)
-            logger.debug(f"Recorded attendance for {scan.batch_id} on {scanned_on} shift={shift}")
+    # Prevent duplicate per batch/date/shift with one set-based lookup
+    if pending_rows:
+        pending_batch_ids = sorted({key[0] for key in pending_rows})
+        pending_dates = list({key[1] for key in pending_rows})
+        pending_shifts = list({key[2] for key in pending_rows})
+        for chunk in _chunked(pending_batch_ids):
+            for scanned_batch_id, scanned_on, shift_val in (
+                db.query(Attendance.scanned_batch_id, Attendance.scanned_on, Attendance.shift)
+                .filter(Attendance.scanned_batch_id.in_(chunk))
+                .filter(Attendance.scanned_on.in_(pending_dates))
+                .filter(Attendance.shift.in_(pending_shifts))
+                .all()
+            ):
+                pending_rows.pop((int(scanned_batch_id), scanned_on, shift_val), None)
 
-        except IntegrityError:
-            db.rollback()
-            success_ids.append(scan.id)
-        except Exception as e:
-            logger.error(f"Error processing scan {scan.id}: {e}")
-            db.rollback()
+    inserted_keys, failed_keys = _insert_attendance_rows(db, pending_rows)
+    # Rows another upload stored first are acknowledged to the agent but already counted in the rollup
+    inserted_rows = [row for key, row in pending_rows.items() if key in inserted_keys]
+    inserted_dates = {row["scanned_on"] for row in inserted_rows}
+    occupancy_deltas = OccupancyDeltas()
+    for row in inserted_rows:
+        occupancy_deltas.add_attendance(row["scanned_on"], row["shift"], row["bus_id"], row["van_id"], row["status"])
 
     # Commit all changes
     try:
+        apply_daily_occupancy_deltas(db, occupancy_deltas)
         db.commit()
     except Exception as e:
         logger.error(f"Error committing scans: {e}")
         db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
 
-    logger.info(f"Processed {len(success_ids)} of {len(request.scans)} scans")
+    if inserted_rows:
+        invalidate_cache(dates=inserted_dates, bus_ids={row["bus_id"] for row in inserted_rows if row["bus_id"]})
+
+    # Only report scans whose attendance row is actually stored, so the agent retries the rest
+    success_ids: List[int] = [scan_id for scan_id, key in accepted if key is None or key not in failed_keys]
+    inserted = len(inserted_rows)
+    logger.info(f"Processed {len(success_ids)} of {len(request.scans)} scans ({inserted} new attendance rows)")
 
     return UploadScansResponse(success_ids=success_ids)
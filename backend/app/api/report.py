@@ -3,20 +3,24 @@ Report API endpoints.
 Provides headcount and attendance detail for the dashboard.
 """
 
+import base64
 import csv
 import io
+import json
 import logging
-from datetime import datetime, date as date_type
-from typing import Optional, List
+from datetime import datetime, date as date_type, timedelta
+from typing import Any, Callable, Iterator, Optional, List
 
 from fastapi import APIRouter, Depends, Query, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case, or_
+from sqlalchemy import and_, func, case, or_
 
-from app.core.db import get_db
-from app.core.cache import ttl_cache
-from app.models import Attendance, AttendanceShift, Bus, Employee, EmployeeMaster, Van, UnknownAttendance
+from app.core.db import SessionLocal, get_db
+from app.core.cache import CacheScope, cache_stats, ttl_cache
+from app.core.config import get_settings
+from app.core.export import columnar_available, pa, stream_columnar
+from app.models import Attendance, AttendanceShift, Bus, BusPlant, DailyOccupancy, Employee, EmployeeMaster, Van, UnknownAttendance
 from app.schemas.report import (
     HeadcountRow,
     HeadcountResponse,
@@ -27,12 +31,32 @@ from app.schemas.report import (
     OccupancyResponse,
     BusDetailResponse,
     BusRosterEntry,
+    TrendPoint,
+    TrendSummary,
+    TrendResponse,
 )
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/report", tags=["report"])
 
+# Cached reports are invalidated by writes, so they can live for a long time
+REPORT_CACHE_TTL_SECONDS = get_settings().report_cache_ttl_seconds
+REPORT_CACHE_STALE_SECONDS = get_settings().report_cache_stale_seconds
+
+# Rows fetched per server-side cursor batch and written per CSV chunk
+EXPORT_CHUNK_ROWS = 1000
+# Rows per Arrow record batch / Parquet row group in columnar exports
+EXPORT_COLUMNAR_BATCH_ROWS = 20000
+MAX_EXPORT_DAYS = 366
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
 
 def parse_bus_ids(bus_id: Optional[str]) -> list[str]:
     """Accept comma-separated bus ids, e.g. 'A01,A02'. Empty entries are ignored."""
@@ -82,7 +106,61 @@ def validate_shifts(value: Optional[str]) -> List[AttendanceShift]:
     return result
 
 
-def _query_headcount_rows(
+def _report_cache_scope(params: dict) -> Optional[CacheScope]:
+    """Cache scope (date range, bus_ids) of a report request, for write-driven invalidation."""
+    try:
+        target_date = parse_date(params.get("date"))
+        target_from = target_date or parse_date(params.get("date_from"))
+        target_to = target_date or parse_date(params.get("date_to"))
+    except HTTPException:
+        return None
+    if params.get("include_previous") and target_from and target_to:
+        # /trend also reads the preceding period of equal length
+        target_from -= (target_to - target_from) + timedelta(days=1)
+    bus_ids = parse_bus_ids(params.get("bus_id"))
+    return CacheScope(date_from=target_from, date_to=target_to, bus_ids=frozenset(bus_ids) if bus_ids else None)
+
+
+def _report_cache_params(
+    multi_value: tuple = (),
+    upper: tuple = (),
+    lower: tuple = (),
+    ignore: tuple = (),
+):
+    """
+    Build a cache key normalizer for a report endpoint.
+
+    'date' is folded into date_from/date_to, comma-separated 'multi_value'
+    filters become sorted de-duplicated lists, and case-insensitive filters are
+    folded to 'upper' or 'lower' case, so equivalent requests share one entry.
+    """
+    def normalize(params: dict) -> dict:
+        result = {k: v for k, v in params.items() if k not in ignore and v not in (None, "")}
+        single_date = result.pop("date", None)
+        if single_date:
+            result["date_from"] = result["date_to"] = single_date
+        for name, value in list(result.items()):
+            if not isinstance(value, str):
+                continue
+            if name in upper:
+                value = value.upper()
+            elif name in lower:
+                value = value.lower()
+            result[name] = sorted(set(parse_comma_list(value))) if name in multi_value else value.strip()
+        return result
+    return normalize
+
+
+# Per-endpoint cache key normalizers (see _report_cache_params)
+_HEADCOUNT_CACHE_PARAMS = _report_cache_params(multi_value=("bus_id",), lower=("route",))
+_OCCUPANCY_CACHE_PARAMS = _report_cache_params(
+    multi_value=("shift", "bus_id", "route", "plant"), upper=("plant",), lower=("route",)
+)
+_BUS_DETAIL_CACHE_PARAMS = _report_cache_params()
+_SUMMARY_CACHE_PARAMS = _report_cache_params(lower=("route",), ignore=("direction",))
+
+
+def _headcount_query(
     date: Optional[str] = Query(None, description="Filter by date (YYYY-MM-DD)"),
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
@@ -90,45 +168,55 @@ def _query_headcount_rows(
     bus_id: Optional[str] = Query(None, description="Filter by bus ID (comma-separated supported)"),
     route: Optional[str] = Query(None, description="Filter by route (substring match)"),
     db: Session = Depends(get_db),
-) -> List[HeadcountRow]:
-    """Shared query for headcount rows (JSON and CSV)."""
+):
+    """Shared headcount query (JSON and CSV), read from the daily_occupancy rollup."""
     target_date = parse_date(date)
     target_from = parse_date(date_from)
     target_to = parse_date(date_to)
     target_shift = validate_shift(shift)
     bus_ids = parse_bus_ids(bus_id)
 
-    present_case = case((Attendance.status == "present", 1), else_=0)
-    unknown_batch_case = case((Attendance.status == "unknown_batch", 1), else_=0)
-    unknown_shift_case = case((Attendance.status == "unknown_shift", 1), else_=0)
-
     query = db.query(
-        Attendance.scanned_on.label("scanned_on"),
-        Attendance.shift.label("shift"),
-        Attendance.bus_id.label("bus_id"),
+        DailyOccupancy.scanned_on.label("scanned_on"),
+        DailyOccupancy.shift.label("shift"),
+        DailyOccupancy.bus_id.label("bus_id"),
         Bus.route.label("route"),
-        func.sum(present_case).label("present"),
-        func.sum(unknown_batch_case).label("unknown_batch"),
-        func.sum(unknown_shift_case).label("unknown_shift"),
-        func.count(Attendance.id).label("total"),
-    ).join(Bus, Attendance.bus_id == Bus.bus_id, isouter=True)
+        DailyOccupancy.total_present.label("present"),
+        DailyOccupancy.unknown_batch.label("unknown_batch"),
+        DailyOccupancy.unknown_shift.label("unknown_shift"),
+        DailyOccupancy.total_scans.label("total"),
+    ).join(Bus, DailyOccupancy.bus_id == Bus.bus_id, isouter=True)
+    # Rows holding only unknown_attendances are not part of headcount
+    query = query.filter(DailyOccupancy.total_scans > 0)
 
     if target_date:
-        query = query.filter(Attendance.scanned_on == target_date)
+        query = query.filter(DailyOccupancy.scanned_on == target_date)
     else:
         if target_from:
-            query = query.filter(Attendance.scanned_on >= target_from)
+            query = query.filter(DailyOccupancy.scanned_on >= target_from)
         if target_to:
-            query = query.filter(Attendance.scanned_on <= target_to)
+            query = query.filter(DailyOccupancy.scanned_on <= target_to)
     if target_shift:
-        query = query.filter(Attendance.shift == target_shift)
+        query = query.filter(DailyOccupancy.shift == target_shift)
     if bus_ids:
-        query = query.filter(Attendance.bus_id.in_(bus_ids))
+        query = query.filter(DailyOccupancy.bus_id.in_(bus_ids))
     if route:
-        query = query.filter(or_(Bus.route.ilike(f"%{route}%"), Attendance.bus_id.ilike(f"%{route}%")))
+        query = query.filter(or_(Bus.route.ilike(f"%{route}%"), DailyOccupancy.bus_id.ilike(f"%{route}%")))
 
-    query = query.group_by(Attendance.scanned_on, Attendance.shift, Attendance.bus_id, Bus.route)
-    query = query.order_by(Attendance.scanned_on.desc(), Attendance.shift, Attendance.bus_id)
+    return query.order_by(DailyOccupancy.scanned_on.desc(), DailyOccupancy.shift, DailyOccupancy.bus_id)
+
+
+def _query_headcount_rows(
+    date: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    shift: Optional[str] = None,
+    bus_id: Optional[str] = None,
+    route: Optional[str] = None,
+    db: Session = Depends(get_db),
+) -> List[HeadcountRow]:
+    """Headcount rows as response models for the JSON endpoint."""
+    query = _headcount_query(date=date, date_from=date_from, date_to=date_to, shift=shift, bus_id=bus_id, route=route, db=db)
 
     rows: List[HeadcountRow] = []
     for row in query.all():
@@ -148,6 +236,12 @@ def _query_headcount_rows(
 
 
 @router.get("/headcount", response_model=HeadcountResponse)
+@ttl_cache(
+    ttl_seconds=REPORT_CACHE_TTL_SECONDS,
+    stale_seconds=REPORT_CACHE_STALE_SECONDS,
+    scope=_report_cache_scope,
+    key_params=_HEADCOUNT_CACHE_PARAMS,
+)
 def headcount(
     date: Optional[str] = Query(None, description="Filter by date (YYYY-MM-DD)"),
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
@@ -173,23 +267,68 @@ def headcount_export(
     db: Session = Depends(get_db),
 ):
     """Export headcount aggregates as CSV using the same filters as the JSON endpoint."""
-    rows = _query_headcount_rows(date=date, date_from=date_from, date_to=date_to, shift=shift, bus_id=bus_id, route=route, db=db)
-
-    buffer = io.StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow(["date", "shift", "bus_id", "route", "present", "unknown_batch", "unknown_shift", "total"])
-    for row in rows:
-        writer.writerow([row.date, row.shift, row.bus_id, row.route or "", row.present, row.unknown_batch, row.unknown_shift, row.total])
+    query = _headcount_query(date=date, date_from=date_from, date_to=date_to, shift=shift, bus_id=bus_id, route=route, db=db)
+
+    def to_csv_row(row) -> list:
+        return [
+            row.scanned_on.isoformat(),
+            _shift_value(row.shift),
+            row.bus_id or "",
+            row.route or "",
+            int(row.present or 0),
+            int(row.unknown_batch or 0),
+            int(row.unknown_shift or 0),
+            int(row.total or 0),
+        ]
 
     filename = _build_filename(prefix="headcount", date=date, date_from=date_from, date_to=date_to, shift=shift, bus_id=bus_id, route=route)
-    buffer.seek(0)
     return StreamingResponse(
-        iter([buffer.getvalue()]),
+        _stream_csv(
+            query.statement,
+            ["date", "shift", "bus_id", "route", "present", "unknown_batch", "unknown_shift", "total"],
+            to_csv_row,
+        ),
         media_type="text/csv",
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
+def _shift_value(shift) -> str:
+    return shift.value if isinstance(shift, AttendanceShift) else str(shift)
+
+
+def _stream_csv(statement, header: list[str], to_csv_row: Callable[[Any], list]) -> Iterator[str]:
+    """
+    Stream the rows of a select statement as CSV text chunks.
+
+    Runs on its own session because the request session is closed before a
+    streaming response finishes; rows are written out every EXPORT_CHUNK_ROWS rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+
+    for partition in _iter_partitions(statement, EXPORT_CHUNK_ROWS):
+        for row in partition:
+            writer.writerow(to_csv_row(row))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _iter_partitions(statement, size: int) -> Iterator[list]:
+    """Fetch rows of a select statement through a server-side cursor, `size` rows at a time."""
+    db = SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(stream_results=True, yield_per=size))
+        for partition in result.partitions():
+            yield partition
+    finally:
+        db.close()
+
+
 def _build_filename(
     prefix: str,
     date: Optional[str],
@@ -198,6 +337,8 @@ def _build_filename(
     shift: Optional[str],
     bus_id: Optional[str],
     route: Optional[str] = None,
+    plant: Optional[str] = None,
+    extension: str = "csv",
 ) -> str:
     """Create a descriptive filename for exports."""
     parts = [prefix]
@@ -214,15 +355,17 @@ def _build_filename(
         parts.append(f"bus-{bus_id}")
     if route:
         parts.append(f"route-{route}")
-    return "_".join(parts) + ".csv"
+    if plant:
+        parts.append(f"plant-{plant}")
+    return "_".join(parts) + f".{extension}"
 
 
-def _query_attendance_records(
+def _attendance_query(
     date: str = Query(..., description="Date to filter (YYYY-MM-DD)"),
     shift: Optional[str] = Query(None, description="Shift filter (morning/night/unknown)"),
     bus_id: Optional[str] = Query(None, description="Bus filter"),
     db: Session = Depends(get_db),
-) -> List[AttendanceRecord]:
+):
     """Shared query for attendance records (JSON and CSV)."""
     target_date = parse_date(date)
     if not target_date:
@@ -246,11 +389,21 @@ def _query_attendance_records(
     if bus_id:
         query = query.filter(Attendance.bus_id == bus_id)
 
-    query = query.order_by(Attendance.scanned_at.desc())
+    return query.order_by(Attendance.scanned_at.desc())
+
+
+def _query_attendance_records(
+    date: str,
+    shift: Optional[str] = None,
+    bus_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+) -> List[AttendanceRecord]:
+    """Attendance records as response models for the JSON endpoint."""
+    query = _attendance_query(date=date, shift=shift, bus_id=bus_id, db=db)
 
     records: List[AttendanceRecord] = []
     for row in query.all():
-        shift_value = row.shift.value if isinstance(row.shift, AttendanceShift) else str(row.shift)
+        shift_value = _shift_value(row.shift)
         records.append(
             AttendanceRecord(
                 scanned_at=row.scanned_at.isoformat() if row.scanned_at else "",
@@ -286,56 +439,174 @@ def attendance_export(
     db: Session = Depends(get_db),
 ):
     """Export attendance detail as CSV using the same filters as the JSON endpoint."""
-    records = _query_attendance_records(date=date, shift=shift, bus_id=bus_id, db=db)
-
-    buffer = io.StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow(["scanned_at", "batch_id", "employee_name", "bus_id", "van_id", "shift", "status", "source"])
-    for record in records:
-        writer.writerow([
-            record.scanned_at,
-            record.batch_id,
-            record.employee_name or "",
-            record.bus_id or "",
-            record.van_id if record.van_id is not None else "",
-            record.shift,
-            record.status,
-            record.source or "",
-        ])
+    query = _attendance_query(date=date, shift=shift, bus_id=bus_id, db=db)
+
+    def to_csv_row(row) -> list:
+        return [
+            row.scanned_at.isoformat() if row.scanned_at else "",
+            row.scanned_batch_id,
+            row.employee_name or "",
+            row.bus_id or "",
+            row.van_id if row.van_id is not None else "",
+            _shift_value(row.shift),
+            row.status,
+            row.source or "",
+        ]
 
     filename = _build_filename(prefix="attendance", date=date, date_from=None, date_to=None, shift=shift, bus_id=bus_id)
-    buffer.seek(0)
     return StreamingResponse(
-        iter([buffer.getvalue()]),
+        _stream_csv(
+            query.statement,
+            ["scanned_at", "batch_id", "employee_name", "bus_id", "van_id", "shift", "status", "source"],
+            to_csv_row,
+        ),
         media_type="text/csv",
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
-@router.get("/occupancy", response_model=OccupancyResponse)
-@ttl_cache(ttl_seconds=60)
-def occupancy(
-    date: Optional[str] = Query(None, description="Filter by date (YYYY-MM-DD)"),
-    date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
-    date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+@router.get("/attendance/export/range")
+def attendance_range_export(
+    date_from: str = Query(..., description="Start date (YYYY-MM-DD)"),
+    date_to: str = Query(..., description="End date (YYYY-MM-DD)"),
     shift: Optional[str] = Query(None, description="Filter by shift (comma-separated: morning,night)"),
     bus_id: Optional[str] = Query(None, description="Filter by bus ID (comma-separated supported)"),
-    route: Optional[str] = Query(None, description="Filter by route (comma-separated supported)"),
     plant: Optional[str] = Query(None, description="Filter by plant/building_id (comma-separated: P1,P2,BK)"),
+    format: str = Query("csv", description="Output format (csv/parquet/arrow)"),
     db: Session = Depends(get_db),
 ):
     """
-    Return per-bus capacity vs actual occupancy, including a bus-vs-van breakdown.
-    Supports multi-select filters for shift, bus_id, route, and plant.
+    Export raw attendance records for a date range as CSV, Parquet or an Arrow IPC stream.
+    Rows are read through a server-side cursor and encoded batch by batch.
     """
-    target_date = parse_date(date)
     target_from = parse_date(date_from)
     target_to = parse_date(date_to)
+    if target_to < target_from:
+        raise HTTPException(status_code=400, detail="date_to must be on or after date_from")
+    if (target_to - target_from).days + 1 > MAX_EXPORT_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range cannot exceed {MAX_EXPORT_DAYS} days")
+
+    export_format = format.strip().lower()
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format: {format}. Must be one of: {', '.join(EXPORT_FORMATS)}")
+    if export_format != "csv" and not columnar_available():
+        raise HTTPException(status_code=400, detail="Parquet/Arrow export requires pyarrow on the server")
+
     target_shifts = validate_shifts(shift)
-    bus_ids = parse_bus_ids(bus_id)
-    routes = parse_comma_list(route)
+    requested_bus_ids = parse_bus_ids(bus_id)
     plants = parse_comma_list(plant)
+    bus_ids, allowed_bus_ids, _, _ = _resolve_bus_scope(db, requested_bus_ids, [], plants)
+
+    query = db.query(
+        Attendance.scanned_on,
+        Attendance.scanned_at,
+        Attendance.scanned_batch_id,
+        Employee.name.label("employee_name"),
+        Attendance.bus_id,
+        Attendance.van_id,
+        BusPlant.building_id.label("plant"),
+        Attendance.shift,
+        Attendance.status,
+        Attendance.source,
+    ).join(Employee, Attendance.employee_id == Employee.id, isouter=True)
+    query = query.join(BusPlant, Attendance.bus_id == BusPlant.bus_id, isouter=True)
+
+    query = query.filter(Attendance.scanned_on >= target_from, Attendance.scanned_on <= target_to)
+    if target_shifts:
+        query = query.filter(Attendance.shift.in_(target_shifts))
+    if requested_bus_ids:
+        # May be empty when the plant filter excludes every requested bus
+        query = query.filter(Attendance.bus_id.in_(bus_ids))
+    elif allowed_bus_ids is not None:
+        query = query.filter(Attendance.bus_id.in_(allowed_bus_ids))
+    query = query.order_by(Attendance.scanned_on, Attendance.scanned_at, Attendance.id)
+
+    media_type, extension = EXPORT_FORMATS[export_format]
+    filename = _build_filename(
+        prefix="attendance",
+        date=None,
+        date_from=date_from,
+        date_to=date_to,
+        shift=shift,
+        bus_id=bus_id,
+        plant=plant,
+        extension=extension,
+    )
 
+    if export_format == "csv":
+        def to_csv_row(row) -> list:
+            return [
+                row.scanned_on.isoformat(),
+                row.scanned_at.isoformat() if row.scanned_at else "",
+                row.scanned_batch_id,
+                row.employee_name or "",
+                row.bus_id or "",
+                row.van_id if row.van_id is not None else "",
+                row.plant or "",
+                _shift_value(row.shift),
+                row.status,
+                row.source or "",
+            ]
+
+        content = _stream_csv(
+            query.statement,
+            ["scanned_on", "scanned_at", "batch_id", "employee_name", "bus_id", "van_id", "plant", "shift", "status", "source"],
+            to_csv_row,
+        )
+    else:
+        columns = [
+            ("scanned_on", pa.date32()),
+            ("scanned_at", pa.timestamp("us", tz="UTC")),
+            ("batch_id", pa.int64()),
+            ("employee_name", pa.string()),
+            ("bus_id", pa.string()),
+            ("van_id", pa.int32()),
+            ("plant", pa.string()),
+            ("shift", pa.string()),
+            ("status", pa.string()),
+            ("source", pa.string()),
+        ]
+        batches = (
+            [
+                (
+                    row.scanned_on,
+                    row.scanned_at,
+                    row.scanned_batch_id,
+                    row.employee_name,
+                    row.bus_id,
+                    row.van_id,
+                    row.plant,
+                    _shift_value(row.shift),
+                    row.status,
+                    row.source,
+                )
+                for row in partition
+            ]
+            for partition in _iter_partitions(query.statement, EXPORT_COLUMNAR_BATCH_ROWS)
+        )
+        content = stream_columnar(export_format, columns, batches)
+
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _resolve_bus_scope(
+    db: Session,
+    bus_ids: List[str],
+    routes: List[str],
+    plants: List[str],
+):
+    """
+    Apply bus/route/plant filters to the set of buses a report covers.
+
+    Returns (bus_ids, allowed_bus_ids, bus_meta, building_by_bus): the explicit
+    bus_ids narrowed by plant, the allowed bus set implied by route/plant
+    filters (None when unrestricted), per-bus route/capacity metadata, and the
+    dominant building_id of each bus.
+    """
     # Query bus metadata
     bus_rows_query = db.query(Bus.bus_id, Bus.route, func.coalesce(Bus.capacity, 0))
     if bus_ids:
@@ -347,37 +618,13 @@ def occupancy(
     bus_meta = {r[0]: {"route": r[1], "bus_capacity": int(r[2] or 0)} for r in bus_rows}
     allowed_bus_ids = set(bus_meta.keys()) if (routes and not bus_ids) else None
 
-    # Query building_id for each bus from employee_master (most common building_id)
-    building_query = (
-        db.query(
-            Employee.bus_id,
-            EmployeeMaster.building_id,
-            func.count(Employee.id).label("cnt")
-        )
-        .join(EmployeeMaster, Employee.batch_id == EmployeeMaster.personid, isouter=True)
-        .filter(Employee.active.is_(True))
-        .group_by(Employee.bus_id, EmployeeMaster.building_id)
-    )
+    # Most common building_id for each bus, precomputed on master list/employee changes
+    building_query = db.query(BusPlant.bus_id, BusPlant.building_id)
     if bus_ids:
-        building_query = building_query.filter(Employee.bus_id.in_(bus_ids))
+        building_query = building_query.filter(BusPlant.bus_id.in_(bus_ids))
     elif allowed_bus_ids is not None:
-        building_query = building_query.filter(Employee.bus_id.in_(allowed_bus_ids))
-
-    building_rows = building_query.all()
-    # Get the most common building_id for each bus
-    bus_building_counts: dict = {}
-    for bid, bld_id, cnt in building_rows:
-        if bid not in bus_building_counts:
-            bus_building_counts[bid] = {}
-        if bld_id:
-            bus_building_counts[bid][bld_id] = bus_building_counts[bid].get(bld_id, 0) + cnt
-
-    building_by_bus = {}
-    for bid, counts in bus_building_counts.items():
-        if counts:
-            building_by_bus[bid] = max(counts.keys(), key=lambda k: counts[k])
-        else:
-            building_by_bus[bid] = None
+        building_query = building_query.filter(BusPlant.bus_id.in_(allowed_bus_ids))
+    building_by_bus = {bid: bld_id for bid, bld_id in building_query.all()}
 
     # Filter by plant if specified
     if plants:
@@ -395,6 +642,40 @@ def occupancy(
         else:
             allowed_bus_ids = filtered_bus_ids
 
+    return bus_ids, allowed_bus_ids, bus_meta, building_by_bus
+
+
+@router.get("/occupancy", response_model=OccupancyResponse)
+@ttl_cache(
+    ttl_seconds=REPORT_CACHE_TTL_SECONDS,
+    stale_seconds=REPORT_CACHE_STALE_SECONDS,
+    scope=_report_cache_scope,
+    key_params=_OCCUPANCY_CACHE_PARAMS,
+)
+def occupancy(
+    date: Optional[str] = Query(None, description="Filter by date (YYYY-MM-DD)"),
+    date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    shift: Optional[str] = Query(None, description="Filter by shift (comma-separated: morning,night)"),
+    bus_id: Optional[str] = Query(None, description="Filter by bus ID (comma-separated supported)"),
+    route: Optional[str] = Query(None, description="Filter by route (comma-separated supported)"),
+    plant: Optional[str] = Query(None, description="Filter by plant/building_id (comma-separated: P1,P2,BK)"),
+    db: Session = Depends(get_db),
+):
+    """
+    Return per-bus capacity vs actual occupancy, including a bus-vs-van breakdown.
+    Supports multi-select filters for shift, bus_id, route, and plant.
+    """
+    target_date = parse_date(date)
+    target_from = parse_date(date_from)
+    target_to = parse_date(date_to)
+    target_shifts = validate_shifts(shift)
+    bus_ids = parse_bus_ids(bus_id)
+    routes = parse_comma_list(route)
+    plants = parse_comma_list(plant)
+
+    bus_ids, allowed_bus_ids, bus_meta, building_by_bus = _resolve_bus_scope(db, bus_ids, routes, plants)
+
     # Query van metadata
     van_meta_query = db.query(
         Van.bus_id,
@@ -409,10 +690,6 @@ def occupancy(
     van_capacity = {r[0]: int(r[2] or 0) for r in van_meta_rows}
     van_count = {r[0]: int(r[1] or 0) for r in van_meta_rows}
 
-    present_case = case((Attendance.status == "present", 1), else_=0)
-    bus_present_case = case((Attendance.status == "present", case((Attendance.van_id.is_(None), 1), else_=0)), else_=0)
-    van_present_case = case((Attendance.status == "present", case((Attendance.van_id.is_not(None), 1), else_=0)), else_=0)
-
     # Calculate number of days in range for averaging
     num_days = 1
     if target_date:
@@ -420,105 +697,64 @@ def occupancy(
     elif target_from and target_to:
         num_days = max(1, (target_to - target_from).days + 1)
 
+    # Known and unknown (not in master list) attendance from the daily rollup
     attendance_query = db.query(
-        Attendance.bus_id,
-        func.sum(bus_present_case).label("bus_present"),
-        func.sum(van_present_case).label("van_present"),
-        func.sum(present_case).label("total_present"),
+        DailyOccupancy.bus_id,
+        func.sum(DailyOccupancy.bus_present).label("bus_present"),
+        func.sum(DailyOccupancy.van_present).label("van_present"),
+        func.sum(DailyOccupancy.total_present).label("total_present"),
+        func.sum(DailyOccupancy.unknown_present).label("unknown_present"),
+        func.max(DailyOccupancy.unknown_route).label("unknown_route"),
     ).filter(
-        Attendance.bus_id.is_not(None),
-        Attendance.bus_id != 'OWN'
+        DailyOccupancy.bus_id.is_not(None),
+        DailyOccupancy.bus_id != 'OWN'
     )
 
     if target_date:
-        attendance_query = attendance_query.filter(Attendance.scanned_on == target_date)
+        attendance_query = attendance_query.filter(DailyOccupancy.scanned_on == target_date)
     else:
         if target_from:
-            attendance_query = attendance_query.filter(Attendance.scanned_on >= target_from)
+            attendance_query = attendance_query.filter(DailyOccupancy.scanned_on >= target_from)
         if target_to:
-            attendance_query = attendance_query.filter(Attendance.scanned_on <= target_to)
+            attendance_query = attendance_query.filter(DailyOccupancy.scanned_on <= target_to)
     if target_shifts:
-        attendance_query = attendance_query.filter(Attendance.shift.in_(target_shifts))
+        attendance_query = attendance_query.filter(DailyOccupancy.shift.in_(target_shifts))
     if bus_ids:
-        attendance_query = attendance_query.filter(Attendance.bus_id.in_(bus_ids))
+        attendance_query = attendance_query.filter(DailyOccupancy.bus_id.in_(bus_ids))
     elif allowed_bus_ids is not None:
-        attendance_query = attendance_query.filter(Attendance.bus_id.in_(allowed_bus_ids))
+        attendance_query = attendance_query.filter(DailyOccupancy.bus_id.in_(allowed_bus_ids))
 
-    attendance_query = attendance_query.group_by(Attendance.bus_id)
-    attendance_rows = attendance_query.all()
+    attendance_query = attendance_query.group_by(DailyOccupancy.bus_id)
 
     # Calculate daily averages when spanning multiple days
-    attendance_by_bus = {
-        r[0] or "": {
-            "bus_present": round(int(r[1] or 0) / num_days),
-            "van_present": round(int(r[2] or 0) / num_days),
-            "total_present": round(int(r[3] or 0) / num_days),
-            "bus_present_sum": int(r[1] or 0),
-            "van_present_sum": int(r[2] or 0),
-            "total_present_sum": int(r[3] or 0),
+    attendance_by_bus = {}
+    for bid, bus_present, van_present, total_present, unknown_present, unknown_route in attendance_query.all():
+        if not bid:
+            continue
+        unknown_present = int(unknown_present or 0)
+        # Unknown attendance rides the bus (no van assignment)
+        bus_present_sum = int(bus_present or 0) + unknown_present
+        van_present_sum = int(van_present or 0)
+        total_present_sum = int(total_present or 0) + unknown_present
+        unknown_avg = round(unknown_present / num_days)
+        attendance_by_bus[bid] = {
+            "bus_present": round(int(bus_present or 0) / num_days) + unknown_avg,
+            "van_present": round(van_present_sum / num_days),
+            "total_present": round(int(total_present or 0) / num_days) + unknown_avg,
+            "bus_present_sum": bus_present_sum,
+            "van_present_sum": van_present_sum,
+            "total_present_sum": total_present_sum,
         }
-        for r in attendance_rows
-        if r[0]
-    }
-
-    # Query unknown_attendances for routes not in master list
-    unknown_query = db.query(
-        UnknownAttendance.bus_id,
-        UnknownAttendance.route_raw,
-        func.count(UnknownAttendance.id).label("total_present"),
-    ).filter(
-        UnknownAttendance.bus_id.is_not(None),
-        UnknownAttendance.bus_id != 'OWN'
-    )
 
-    if target_date:
-        unknown_query = unknown_query.filter(UnknownAttendance.scanned_on == target_date)
-    else:
-        if target_from:
-            unknown_query = unknown_query.filter(UnknownAttendance.scanned_on >= target_from)
-        if target_to:
-            unknown_query = unknown_query.filter(UnknownAttendance.scanned_on <= target_to)
-    if target_shifts:
-        unknown_query = unknown_query.filter(UnknownAttendance.shift.in_(target_shifts))
-    if bus_ids:
-        unknown_query = unknown_query.filter(UnknownAttendance.bus_id.in_(bus_ids))
-    elif allowed_bus_ids is not None:
-        unknown_query = unknown_query.filter(UnknownAttendance.bus_id.in_(allowed_bus_ids))
-
-    unknown_query = unknown_query.group_by(UnknownAttendance.bus_id, UnknownAttendance.route_raw)
-    unknown_rows = unknown_query.all()
-
-    # Add unknown attendance to attendance_by_bus and bus_meta
-    for bid, route_raw, total_present_count in unknown_rows:
-        if bid:
-            avg_present = round(int(total_present_count or 0) / num_days)
-
-            # Only mark as UNKNOWN if bus_id is NOT in buses table
-            if bid not in bus_meta:
-                # This bus_id doesn't exist in buses table - it's truly unknown
-                bus_meta[bid] = {
-                    "route": route_raw or f"Route {bid}",
-                    "bus_capacity": 40  # Default capacity for unknown buses
-                }
-                # Set building_id to "UNKNOWN" so frontend can identify it
-                building_by_bus[bid] = "UNKNOWN"
-
-            if bid in attendance_by_bus:
-                # Add to existing bus attendance
-                attendance_by_bus[bid]["total_present"] += avg_present
-                attendance_by_bus[bid]["total_present_sum"] += int(total_present_count or 0)
-                attendance_by_bus[bid]["bus_present"] += avg_present
-                attendance_by_bus[bid]["bus_present_sum"] += int(total_present_count or 0)
-            else:
-                # Create new entry for unknown bus
-                attendance_by_bus[bid] = {
-                    "bus_present": avg_present,
-                    "van_present": 0,
-                    "total_present": avg_present,
-                    "bus_present_sum": int(total_present_count or 0),
-                    "van_present_sum": 0,
-                    "total_present_sum": int(total_present_count or 0),
-                }
+        # Only mark as UNKNOWN if bus_id is NOT in buses table
+        if unknown_present and bid not in bus_meta:
+            # This bus_id doesn't exist in buses table - it's truly unknown
+            bus_meta[bid] = {
+                "route": unknown_route or f"Route {bid}",
+                "bus_capacity": 40  # Default capacity for unknown buses
+            }
+            # Set building_id to "UNKNOWN" so frontend can identify it
+            building_by_bus[bid] = "UNKNOWN"
 
     roster_query = db.query(
         Employee.bus_id,
@@ -638,7 +874,134 @@ def occupancy(
     )
 
 
+# Longest range (in days after date_from) a trend request may span
+MAX_TREND_DAYS = 90
+
+
+def _attendance_rate(present: int, roster: int) -> float:
+    return (present / roster) * 100 if roster > 0 else 0.0
+
+
+@router.get("/trend", response_model=TrendResponse, response_model_exclude_none=True)
+@ttl_cache(
+    ttl_seconds=REPORT_CACHE_TTL_SECONDS,
+    stale_seconds=REPORT_CACHE_STALE_SECONDS,
+    scope=_report_cache_scope,
+    key_params=_OCCUPANCY_CACHE_PARAMS,
+)
+def trend(
+    date_from: str = Query(..., description="Start date (YYYY-MM-DD)"),
+    date_to: str = Query(..., description="End date (YYYY-MM-DD)"),
+    shift: Optional[str] = Query(None, description="Filter by shift (comma-separated: morning,night)"),
+    bus_id: Optional[str] = Query(None, description="Filter by bus ID (comma-separated supported)"),
+    route: Optional[str] = Query(None, description="Filter by route (comma-separated supported)"),
+    plant: Optional[str] = Query(None, description="Filter by plant/building_id (comma-separated: P1,P2,BK)"),
+    include_previous: bool = Query(False, description="Also return the preceding period of equal length"),
+    db: Session = Depends(get_db),
+):
+    """
+    Return per-day roster, present count and attendance rate for a date range.
+    Uses the same filters and totals as /occupancy, but computes every day
+    (and the optional previous period) from one grouped rollup query.
+    """
+    target_from = parse_date(date_from)
+    target_to = parse_date(date_to)
+    if target_to < target_from:
+        raise HTTPException(status_code=400, detail="date_to must be on or after date_from")
+    if (target_to - target_from).days > MAX_TREND_DAYS:
+        raise HTTPException(status_code=400, detail=f"Trend analysis limited to {MAX_TREND_DAYS} days")
+
+    target_shifts = validate_shifts(shift)
+    bus_ids, allowed_bus_ids, _, _ = _resolve_bus_scope(
+        db, parse_bus_ids(bus_id), parse_comma_list(route), parse_comma_list(plant)
+    )
+
+    period_days = (target_to - target_from).days + 1
+    prev_to = target_from - timedelta(days=1)
+    prev_from = target_from - timedelta(days=period_days)
+    query_from = prev_from if include_previous else target_from
+
+    # Roster is the current active roster, as in /occupancy
+    roster_query = db.query(func.count(Employee.id)).filter(
+        Employee.active.is_(True),
+        Employee.bus_id.is_not(None),
+        Employee.bus_id != 'OWN'
+    )
+    if bus_ids:
+        roster_query = roster_query.filter(Employee.bus_id.in_(bus_ids))
+    elif allowed_bus_ids is not None:
+        roster_query = roster_query.filter(Employee.bus_id.in_(allowed_bus_ids))
+    roster = int(roster_query.scalar() or 0)
+
+    present_query = db.query(
+        DailyOccupancy.scanned_on,
+        func.sum(DailyOccupancy.total_present + DailyOccupancy.unknown_present).label("total_present"),
+    ).filter(
+        DailyOccupancy.bus_id.is_not(None),
+        DailyOccupancy.bus_id != 'OWN',
+        DailyOccupancy.scanned_on >= query_from,
+        DailyOccupancy.scanned_on <= target_to,
+    )
+    if target_shifts:
+        present_query = present_query.filter(DailyOccupancy.shift.in_(target_shifts))
+    if bus_ids:
+        present_query = present_query.filter(DailyOccupancy.bus_id.in_(bus_ids))
+    elif allowed_bus_ids is not None:
+        present_query = present_query.filter(DailyOccupancy.bus_id.in_(allowed_bus_ids))
+
+    present_by_day = {
+        day: int(count or 0)
+        for day, count in present_query.group_by(DailyOccupancy.scanned_on).all()
+    }
+
+    def build_points(start: date_type, days: int) -> List[TrendPoint]:
+        points = []
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            present = present_by_day.get(day, 0)
+            points.append(TrendPoint(
+                date=day.isoformat(),
+                roster=roster,
+                present=present,
+                attendance_rate=_attendance_rate(present, roster),
+            ))
+        return points
+
+    daily = build_points(target_from, period_days)
+    total_roster = sum(p.roster for p in daily)
+    total_present = sum(p.present for p in daily)
+    avg_rate = _attendance_rate(total_present, total_roster)
+
+    previous = None
+    prev_avg_rate = None
+    rate_change = None
+    if include_previous:
+        previous = build_points(prev_from, period_days)
+        prev_avg_rate = _attendance_rate(sum(p.present for p in previous), sum(p.roster for p in previous))
+        rate_change = avg_rate - prev_avg_rate
+
+    return TrendResponse(
+        daily=daily,
+        previous=previous,
+        summary=TrendSummary(
+            avg_attendance_rate=avg_rate,
+            total_roster=total_roster,
+            total_present=total_present,
+            date_from=target_from.isoformat(),
+            date_to=target_to.isoformat(),
+            prev_avg_attendance_rate=prev_avg_rate,
+            attendance_rate_change=rate_change,
+        ),
+    )
+
+
 @router.get("/bus-detail", response_model=BusDetailResponse)
+@ttl_cache(
+    ttl_seconds=REPORT_CACHE_TTL_SECONDS,
+    stale_seconds=REPORT_CACHE_STALE_SECONDS,
+    scope=_report_cache_scope,
+    key_params=_BUS_DETAIL_CACHE_PARAMS,
+)
 def bus_detail(
     date: Optional[str] = Query(None, description="Filter by date (YYYY-MM-DD)"),
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
@@ -806,6 +1169,12 @@ def bus_detail(
 
 
 @router.get("/summary", response_model=SummaryResponse)
+@ttl_cache(
+    ttl_seconds=REPORT_CACHE_TTL_SECONDS,
+    stale_seconds=REPORT_CACHE_STALE_SECONDS,
+    scope=_report_cache_scope,
+    key_params=_SUMMARY_CACHE_PARAMS,
+)
 def get_summary(
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
@@ -820,27 +1189,25 @@ def get_summary(
     from_date = parse_date(date_from)
     to_date = parse_date(date_to)
 
-    present_case = case((Attendance.status == "present", 1), else_=0)
-
     query = db.query(
-        Attendance.scanned_on.label("scanned_on"),
-        Attendance.shift.label("shift"),
-        Attendance.bus_id.label("bus_id"),
+        DailyOccupancy.scanned_on.label("scanned_on"),
+        DailyOccupancy.shift.label("shift"),
+        DailyOccupancy.bus_id.label("bus_id"),
         Bus.route.label("route"),
         Bus.capacity.label("capacity"),
-        func.sum(present_case).label("present"),
-    ).join(Bus, Attendance.bus_id == Bus.bus_id, isouter=True)
+        DailyOccupancy.total_present.label("present"),
+    ).join(Bus, DailyOccupancy.bus_id == Bus.bus_id, isouter=True)
+    query = query.filter(DailyOccupancy.total_scans > 0)
 
     if from_date:
-        query = query.filter(Attendance.scanned_on >= from_date)
+        query = query.filter(DailyOccupancy.scanned_on >= from_date)
     if to_date:
-        query = query.filter(Attendance.scanned_on <= to_date)
+        query = query.filter(DailyOccupancy.scanned_on <= to_date)
     if route:
         query = query.filter(Bus.route.ilike(f"%{route}%"))
     # direction is ignored (no trips concept)
 
-    query = query.group_by(Attendance.scanned_on, Attendance.shift, Attendance.bus_id, Bus.route, Bus.capacity)
-    query = query.order_by(Attendance.scanned_on.desc(), Attendance.bus_id)
+    query = query.order_by(DailyOccupancy.scanned_on.desc(), DailyOccupancy.bus_id)
 
     trips: List[TripSummary] = []
     total_passengers = 0
@@ -882,6 +1249,11 @@ def get_summary(
 
 
 @router.get("/occupancy/filters")
+@ttl_cache(
+    ttl_seconds=REPORT_CACHE_TTL_SECONDS,
+    stale_seconds=REPORT_CACHE_STALE_SECONDS,
+    scope=_report_cache_scope,
+)
 def get_filter_options(db: Session = Depends(get_db)):
     """
     Return available filter options for bus_ids, routes, plants, and shifts.
@@ -893,12 +1265,12 @@ def get_filter_options(db: Session = Depends(get_db)):
     # Get all routes
     routes = [r[0] for r in db.query(Bus.route).distinct().order_by(Bus.route).all() if r[0]]
 
-    # Get all plants (building_ids) from employee_master
+    # Get all plants (building_ids) that some bus is mapped to
     building_ids = [
-        r[0] for r in db.query(EmployeeMaster.building_id)
+        r[0] for r in db.query(BusPlant.building_id)
         .distinct()
-        .filter(EmployeeMaster.building_id.isnot(None))
-        .order_by(EmployeeMaster.building_id)
+        .filter(BusPlant.building_id.isnot(None))
+        .order_by(BusPlant.building_id)
         .all()
         if r[0]
     ]
@@ -925,6 +1297,42 @@ def get_filter_options(db: Session = Depends(get_db)):
     }
 
 
+@router.get("/cache/stats")
+def get_cache_stats():
+    """Return report cache size and hit/miss/eviction counters."""
+    return cache_stats()
+
+
+COUNT_MODES = ("exact", "estimate", "none")
+
+
+def _encode_unknown_cursor(record: UnknownAttendance) -> str:
+    """Opaque continuation token holding the (scanned_on, scanned_batch_id, id) of the last row."""
+    payload = json.dumps([record.scanned_on.isoformat(), record.scanned_batch_id, record.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _decode_unknown_cursor(cursor: str) -> tuple[date_type, int, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        scanned_on, batch_id, record_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return date_type.fromisoformat(scanned_on), int(batch_id), int(record_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _estimate_count(db: Session, query) -> Optional[int]:
+    """Planner row estimate for a query (Postgres only); None when unavailable."""
+    connection = db.connection()
+    if connection.dialect.name != "postgresql":
+        return None
+    compiled = query.statement.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
 @router.get("/unknown-attendances")
 def get_unknown_attendances(
     date_from: Optional[str] = None,
@@ -932,13 +1340,21 @@ def get_unknown_attendances(
     bus_id: Optional[str] = None,
     shift: Optional[str] = None,
     limit: int = Query(default=100, ge=1, le=1000),
-    offset: int = Query(default=0, ge=0),
+    offset: int = Query(default=0, ge=0, description="Row offset (ignored when cursor is given)"),
+    cursor: Optional[str] = Query(None, description="Continuation token from a previous page's next_cursor"),
+    count: str = Query("exact", description="Total count mode (exact/estimate/none)"),
     db: Session = Depends(get_db),
 ):
     """
     Query unknown attendance records - PersonIds that appeared in attendance
     but were not found in the master list.
 
+    Pages are ordered by (scanned_on desc, scanned_batch_id, id). Pass the
+    returned next_cursor back as `cursor` for keyset pagination, which stays
+    fast on deep pages; `offset` is still accepted for existing clients.
+    `count=estimate` uses the Postgres planner estimate instead of a full
+    count, and `count=none` skips it.
+
     Returns records with:
     - scanned_batch_id: The PersonId from attendance file
     - route_raw: The original route string from attendance file
@@ -946,6 +1362,10 @@ def get_unknown_attendances(
     - shift: morning/night/unknown
     - scanned_on: The date
     """
+    count_mode = count.strip().lower()
+    if count_mode not in COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid count: {count}. Must be one of: {', '.join(COUNT_MODES)}")
+
     query = db.query(UnknownAttendance)
 
     # Date filters
@@ -976,21 +1396,50 @@ def get_unknown_attendances(
             query = query.filter(UnknownAttendance.shift.in_(shifts_list))
 
     # Get total count
-    total_count = query.count()
+    total_count = None
+    if count_mode == "estimate":
+        total_count = _estimate_count(db, query)
+        if total_count is None:
+            count_mode = "exact"
+    if count_mode == "exact":
+        total_count = query.count()
 
     # Get paginated results
-    records = (
-        query
-        .order_by(UnknownAttendance.scanned_on.desc(), UnknownAttendance.scanned_batch_id)
-        .offset(offset)
-        .limit(limit)
-        .all()
+    page_query = query.order_by(
+        UnknownAttendance.scanned_on.desc(),
+        UnknownAttendance.scanned_batch_id,
+        UnknownAttendance.id,
     )
+    if cursor:
+        cursor_on, cursor_batch_id, cursor_id = _decode_unknown_cursor(cursor)
+        page_query = page_query.filter(
+            or_(
+                UnknownAttendance.scanned_on < cursor_on,
+                and_(
+                    UnknownAttendance.scanned_on == cursor_on,
+                    or_(
+                        UnknownAttendance.scanned_batch_id > cursor_batch_id,
+                        and_(UnknownAttendance.scanned_batch_id == cursor_batch_id, UnknownAttendance.id > cursor_id),
+                    ),
+                ),
+            )
+        )
+    else:
+        page_query = page_query.offset(offset)
+
+    # One extra row tells whether another page follows
+    records = page_query.limit(limit + 1).all()
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        next_cursor = _encode_unknown_cursor(records[-1])
 
     return {
         "total_count": total_count,
+        "count_mode": count_mode,
         "limit": limit,
-        "offset": offset,
+        "offset": 0 if cursor else offset,
+        "next_cursor": next_cursor,
         "records": [
             {
                 "id": r.id,
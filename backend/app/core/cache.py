@@ -2,61 +2,632 @@ import time
 import functools
 import hashlib
 import json
-from typing import Dict, Any, Tuple
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable, Dict, Any, FrozenSet, Iterable, Iterator, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Expired entries are swept at most this often (seconds), on the next write
+SWEEP_INTERVAL_SECONDS = 30
+
+# A shared-cache hit rewrites last_access only when it is older than this (seconds),
+# so reads stay read-only; LRU order is accurate to this granularity
+ACCESS_TOUCH_SECONDS = 60
+
+# Shared cache file used when CACHE_SQLITE_PATH is empty: backend/data, owned by the app
+DEFAULT_SQLITE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "data",
+    "report_cache.db",
+)
+
+
+@dataclass(frozen=True)
+class CacheScope:
+    """
+    The slice of data a cached result depends on, used for invalidation.
+    None means unbounded: an open date range or every bus.
+    """
+
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    bus_ids: Optional[FrozenSet[str]] = None
+
+    def matches(self, dates: Optional[FrozenSet[date]], bus_ids: Optional[FrozenSet[str]]) -> bool:
+        if dates is not None and not any(
+            (self.date_from is None or d >= self.date_from) and (self.date_to is None or d <= self.date_to)
+            for d in dates
+        ):
+            return False
+        if bus_ids is not None and self.bus_ids is not None and not (self.bus_ids & bus_ids):
+            return False
+        return True
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "date_from": self.date_from.isoformat() if self.date_from else None,
+            "date_to": self.date_to.isoformat() if self.date_to else None,
+            "bus_ids": sorted(self.bus_ids) if self.bus_ids is not None else None,
+        })
+
+    @classmethod
+    def from_json(cls, text: str) -> "CacheScope":
+        data = json.loads(text)
+        return cls(
+            date_from=date.fromisoformat(data["date_from"]) if data["date_from"] else None,
+            date_to=date.fromisoformat(data["date_to"]) if data["date_to"] else None,
+            bus_ids=frozenset(data["bus_ids"]) if data["bus_ids"] is not None else None,
+        )
+
+
+def _estimate_size(value: Any) -> int:
+    """Approximate memory footprint of a cached value in bytes."""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class TTLCache:
+    """
+    In-process, thread-safe LRU cache whose entries also expire after a TTL.
+
+    Bounded by entry count and by approximate total size in bytes; the least
+    recently used entries are evicted first. Expired entries are dropped when
+    read and by an amortized sweep on writes.
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes  # 0 disables the size limit
+        # {cache_key: (result, expiry_timestamp, size_bytes, scope)}, oldest first
+        self._entries: "OrderedDict[str, Tuple[Any, float, int, Optional[CacheScope]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._last_sweep = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        # Bumped by invalidate/clear so in-flight computations don't store stale results
+        self._generation = 0
+
+    def _remove(self, key: str) -> None:
+        _, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _sweep(self, now: float) -> None:
+        expired = [key for key, (_, expiry, _, _) in self._entries.items() if expiry <= now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        self._last_sweep = now
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (hit, value) for a key, refreshing its LRU position on a hit."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, expiry, _, _ = entry
+                if now < expiry:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, result
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl_seconds: float,
+        scope: Optional[CacheScope] = None,
+        generation: Optional[int] = None,
+    ) -> None:
+        """
+        Store a value. With 'generation', nothing is stored if invalidate/clear
+        ran since that generation was read; the check and the store are atomic.
+        """
+        size = _estimate_size(value)
+        now = time.monotonic()
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if now - self._last_sweep >= SWEEP_INTERVAL_SECONDS:
+                self._sweep(now)
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes and size > self.max_bytes:
+                return  # Never cache a single value larger than the whole budget
+            self._entries[key] = (value, now + ttl_seconds, size, scope)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(
+        self,
+        dates: Optional[Iterable[date]] = None,
+        bus_ids: Optional[Iterable[str]] = None,
+    ) -> int:
+        """
+        Drop entries whose scope overlaps the given dates and bus_ids.
+        Entries cached without a scope are always dropped. Returns the count.
+        """
+        date_set = frozenset(dates) if dates is not None else None
+        bus_set = frozenset(bus_ids) if bus_ids is not None else None
+        with self._lock:
+            stale = [
+                key for key, (_, _, _, scope) in self._entries.items()
+                if scope is None or scope.matches(date_set, bus_set)
+            ]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+            self._generation += 1
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._generation += 1
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+def _json_default(value: Any) -> Any:
+    # Report payloads are Pydantic response models; FastAPI re-validates the plain
+    # dicts read back from the cache against the endpoint's response_model
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _secure_cache_file(path: str) -> None:
+    """
+    Create the cache file readable by this user only, and refuse a file (or
+    SQLite sidecar) that another user created first.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600)
+    os.close(fd)
+    if not hasattr(os, "getuid"):
+        return  # No POSIX ownership to check (Windows)
+    for candidate in (path, f"{path}-wal", f"{path}-shm"):
+        try:
+            info = os.lstat(candidate)
+        except FileNotFoundError:
+            continue
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"Cache file {candidate} is owned by another user")
+        if info.st_mode & 0o077:
+            os.chmod(candidate, 0o600)
+
+
+class SQLiteCache:
+    """
+    Cache shared by all worker processes through a local SQLite file.
+
+    Same interface and TTL/LRU/invalidation semantics as TTLCache; values and
+    scopes are stored as JSON. Eviction/invalidation counters and the generation
+    live in the file; hit/miss/expiration counters are per process, so a cache
+    hit does not write unless the entry's last_access is ACCESS_TOUCH_SECONDS old.
+    """
+
+    _COUNTERS = ("evictions", "invalidations", "generation")
+
+    def __init__(self, path: str, max_entries: int = 512, max_bytes: int = 0, touch_seconds: float = ACCESS_TOUCH_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes  # 0 disables the size limit
+        self.touch_seconds = touch_seconds
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+        _secure_cache_file(path)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key         TEXT PRIMARY KEY,
+                value       TEXT NOT NULL,
+                scope       TEXT,
+                size        INTEGER NOT NULL,
+                expires_at  REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_last_access ON cache_entries(last_access)")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO cache_counters (name, value) VALUES (?, 0)",
+            [(name,) for name in self._COUNTERS],
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; every statement is its own short transaction
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _bump(self, conn: sqlite3.Connection, name: str, amount: int = 1) -> None:
+        if amount:
+            conn.execute("UPDATE cache_counters SET value = value + ? WHERE name = ?", (amount, name))
+
+    def _count(self, stat: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            setattr(self, stat, getattr(self, stat) + amount)
+
+    @contextmanager
+    def _write_transaction(self) -> Iterator[sqlite3.Connection]:
+        """Hold the file's write lock so generation checks and writes are atomic across workers."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _delete(self, conn: sqlite3.Connection, keys: list) -> None:
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            conn.execute(f"DELETE FROM cache_entries WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute("SELECT value, expires_at, last_access FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            if now < row[1]:
+                try:
+                    value = json.loads(row[0])
+                except (TypeError, ValueError):
+                    # Written by an older, pickle-based version; treat as a miss
+                    conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                else:
+                    if now - row[2] >= self.touch_seconds:
+                        conn.execute("UPDATE cache_entries SET last_access = ? WHERE key = ?", (now, key))
+                    self._count("hits")
+                    return True, value
+            else:
+                conn.execute("DELETE FROM cache_entries WHERE key = ? AND expires_at <= ?", (key, now))
+                self._count("expirations")
+        self._count("misses")
+        return False, None
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl_seconds: float,
+        scope: Optional[CacheScope] = None,
+        generation: Optional[int] = None,
+    ) -> None:
+        blob = json.dumps(value, default=_json_default, separators=(",", ":"))
+        if self.max_bytes and len(blob) > self.max_bytes:
+            return  # Never cache a single value larger than the whole budget
+        now = time.time()
+        with self._write_transaction() as conn:
+            if generation is not None and generation != self._generation(conn):
+                return
+            if now - self._last_sweep >= SWEEP_INTERVAL_SECONDS:
+                self._last_sweep = now
+                expired = conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,)).rowcount
+                self._count("expirations", expired)
+
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, scope, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, scope.to_json() if scope is not None else None, len(blob), now + ttl_seconds, now),
+            )
+
+            # Evict least recently used entries beyond the entry/byte budget
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+            if count > self.max_entries or (self.max_bytes and total > self.max_bytes):
+                victims = []
+                for victim_key, size in conn.execute("SELECT key, size FROM cache_entries ORDER BY last_access ASC"):
+                    if count <= self.max_entries and not (self.max_bytes and total > self.max_bytes):
+                        break
+                    victims.append(victim_key)
+                    count -= 1
+                    total -= size
+                self._delete(conn, victims)
+                self._bump(conn, "evictions", len(victims))
+
+    def invalidate(
+        self,
+        dates: Optional[Iterable[date]] = None,
+        bus_ids: Optional[Iterable[str]] = None,
+    ) -> int:
+        date_set = frozenset(dates) if dates is not None else None
+        bus_set = frozenset(bus_ids) if bus_ids is not None else None
+        with self._write_transaction() as conn:
+            stale = []
+            for key, scope_json in conn.execute("SELECT key, scope FROM cache_entries").fetchall():
+                try:
+                    scope = CacheScope.from_json(scope_json) if scope_json is not None else None
+                except (TypeError, ValueError, KeyError):
+                    scope = None
+                if scope is None or scope.matches(date_set, bus_set):
+                    stale.append(key)
+            self._delete(conn, stale)
+            self._bump(conn, "invalidations", len(stale))
+            self._bump(conn, "generation")
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._write_transaction() as conn:
+            conn.execute("DELETE FROM cache_entries")
+            self._bump(conn, "generation")
+
+    def _generation(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM cache_counters WHERE name = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def generation(self) -> int:
+        return self._generation(self._connection())
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+        counters = dict(conn.execute("SELECT name, value FROM cache_counters").fetchall())
+        with self._stats_lock:
+            hits, misses, expirations = self.hits, self.misses, self.expirations
+        lookups = hits + misses
+        return {
+            "backend": "sqlite",
+            "entries": entries,
+            "bytes": total,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "evictions": counters["evictions"],
+            "expirations": expirations,
+            "invalidations": counters["invalidations"],
+        }
+
+
+def _create_cache():
+    """Build the cache backend selected by the CACHE_BACKEND setting."""
+    settings = get_settings()
+    backend = settings.cache_backend.strip().lower()
+    if backend == "sqlite":
+        path = settings.cache_sqlite_path or DEFAULT_SQLITE_PATH
+        try:
+            return SQLiteCache(path, max_entries=settings.cache_max_entries, max_bytes=settings.cache_max_bytes)
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Shared cache at {path} unavailable, using in-process cache: {e}")
+    elif backend != "memory":
+        logger.warning(f"Unknown cache backend '{settings.cache_backend}', using in-process cache")
+    return TTLCache(max_entries=settings.cache_max_entries, max_bytes=settings.cache_max_bytes)
+
+
+# Global cache storage shared by all ttl_cache-decorated functions
+_CACHE = _create_cache()
+
+# Per-key locks so concurrent misses for one key run the function once (per process)
+_flight_guard = threading.Lock()
+_flights: Dict[str, list] = {}  # {cache_key: [lock, waiter_count]}
+_flight_stats = {"coalesced": 0, "stale_served": 0, "refresh_errors": 0}  # Guarded by _flight_guard
+
+# Background threads refreshing stale entries, so no request pays for the recompute
+REFRESH_WORKERS = 2
+_refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+
+
+def _count(stat: str) -> None:
+    with _flight_guard:
+        _flight_stats[stat] += 1
+
+
+def _acquire_flight(key: str, blocking: bool = True) -> Optional[list]:
+    """Take the computation lock for a key; None if non-blocking and busy."""
+    with _flight_guard:
+        flight = _flights.setdefault(key, [threading.Lock(), 0])
+        flight[1] += 1
+    if flight[0].acquire(blocking):
+        return flight
+    _leave_flight(key, flight)
+    return None
+
+
+def _leave_flight(key: str, flight: list, release: bool = False) -> None:
+    # The lock may be released by another thread than the one that acquired it
+    if release:
+        flight[0].release()
+    with _flight_guard:
+        flight[1] -= 1
+        if flight[1] == 0:
+            _flights.pop(key, None)
+
+
+@contextmanager
+def _single_flight(key: str) -> Iterator[None]:
+    """Hold the computation lock for a key, waiting for any in-flight holder."""
+    flight = _acquire_flight(key)
+    try:
+        yield
+    finally:
+        _leave_flight(key, flight, release=True)
+
+# Longer canonical keys are hashed to keep the cache table compact
+MAX_RAW_KEY_LENGTH = 256
+
+
+def _canonical_value(value: Any) -> Any:
+    """JSON-serializable, order-independent form of a key component."""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sorted((_canonical_value(v) for v in value), key=repr)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
 
-# Global cache storage: {cache_key: (result, expiry_timestamp)}
-_CACHE: Dict[str, Tuple[Any, float]] = {}
 
 def generate_cache_key(func_name: str, *args, **kwargs) -> str:
-    """Generate a consistent cache key from function arguments."""
-    # Create a sorted list of kwargs for consistency
-    key_parts = [func_name]
+    """
+    Generate a consistent cache key from function arguments.
+
+    Keyword arguments are sorted by name, None values are dropped (same as
+    not passing them) and collections are sorted, so equivalent calls share
+    a key. The readable JSON key is used as-is unless it is unusually long;
+    JSON escaping keeps values containing separators from colliding.
+    """
+    key_parts: list = [func_name]
 
     # Add args to key
     for arg in args:
-        key_parts.append(str(arg))
+        key_parts.append(_canonical_value(arg))
 
     # Add kwargs to key (sorted by key name)
     for k, v in sorted(kwargs.items()):
-        # Skip 'db' session objects or other unhashable types if possible
-        # This is a naive check; in FastAPI, 'db' is usually a dependency.
+        # Skip 'db' session objects; in FastAPI, 'db' is usually a dependency.
         # We assume service functions won't cache on 'db' object identity but on query params.
-        if k == 'db':
+        if k == 'db' or v is None:
             continue
-        key_parts.append(f"{k}:{v}")
+        key_parts.append([k, _canonical_value(v)])
 
-    # Hash the key string for compact storage
-    key_str = "|".join(key_parts)
-    return hashlib.md5(key_str.encode()).hexdigest()
+    key_str = json.dumps(key_parts, separators=(",", ":"))
+    if len(key_str) <= MAX_RAW_KEY_LENGTH:
+        return key_str
+    return f"{func_name}:{hashlib.blake2b(key_str.encode(), digest_size=16).hexdigest()}"
 
-def ttl_cache(ttl_seconds: int = 60):
+def ttl_cache(
+    ttl_seconds: int = 60,
+    scope: Optional[Callable[[Dict[str, Any]], Optional[CacheScope]]] = None,
+    stale_seconds: int = 0,
+    key_params: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+):
     """
     Decorator to cache function results for a specific TTL.
     Ignores the 'db' argument in cache key generation.
+    'scope' maps the call's kwargs to the CacheScope that invalidate() matches
+    against; results cached without a scope are dropped by every invalidation.
+    'key_params' rewrites the kwargs into a canonical form before the key is
+    built, so equivalent requests (e.g. reordered filters) share an entry.
+
+    Concurrent misses for the same key are coalesced: one caller computes and
+    the others wait for its result. With 'stale_seconds', a result past its
+    TTL is still served for that long while a background thread refreshes it
+    (with its own database session when the function takes 'db').
+    Invalidated results are dropped outright and never served stale.
     """
     def decorator(func):
+        def compute(key: str, args, kwargs):
+            generation = _CACHE.generation()
+            result = func(*args, **kwargs)
+            # Store in cache (may evict least recently used entries); the backend
+            # skips it if a write invalidated the cache while we were computing
+            _CACHE.set(
+                key,
+                (result, time.time() + ttl_seconds),
+                ttl_seconds + stale_seconds,
+                scope(kwargs) if scope else None,
+                generation=generation,
+            )
+            return result
+
+        def refresh(key: str, flight: list, args, kwargs):
+            session = None
+            try:
+                if "db" in kwargs:
+                    # The request's session is closed once its response is sent
+                    session = SessionLocal()
+                    kwargs = {**kwargs, "db": session}
+                compute(key, args, kwargs)
+            except Exception as e:
+                _count("refresh_errors")
+                logger.error(f"Background refresh of {func.__name__} failed: {e}")
+            finally:
+                if session is not None:
+                    session.close()
+                _leave_flight(key, flight, release=True)
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            # Prune expired entries periodically (naive approach: check on write)
-            # A background task would be better, but overkill for this.
-
-            key = generate_cache_key(func.__name__, *args, **kwargs)
-            now = time.time()
+            params = {k: v for k, v in kwargs.items() if k != 'db'}
+            if key_params:
+                params = key_params(params)
+            key = generate_cache_key(func.__name__, *args, **params)
 
             # Check cache hit
-            if key in _CACHE:
-                result, expiry = _CACHE[key]
-                if now < expiry:
+            hit, cached = _CACHE.get(key)
+            if hit:
+                result, fresh_until = cached
+                if time.time() < fresh_until:
                     return result
-                else:
-                    del _CACHE[key]
+                # Stale: serve the old value and refresh once in the background
+                flight = _acquire_flight(key, blocking=False)
+                if flight is not None:
+                    try:
+                        _refresh_executor.submit(refresh, key, flight, args, kwargs)
+                    except RuntimeError:
+                        _leave_flight(key, flight, release=True)  # Executor shut down at exit
+                _count("stale_served")
+                return result
 
-            # Cache miss - execute function
-            result = func(*args, **kwargs)
-
-            # Store in cache
-            _CACHE[key] = (result, now + ttl_seconds)
-            return result
+            # Cache miss - wait for any in-flight computation of the same key
+            with _single_flight(key):
+                hit, cached = _CACHE.get(key)
+                if hit and time.time() < cached[1]:
+                    _count("coalesced")
+                    return cached[0]
+                return compute(key, args, kwargs)
 
         return wrapper
     return decorator
@@ -64,3 +635,20 @@ def ttl_cache(ttl_seconds: int = 60):
 def clear_cache():
     """Clear all cached entries."""
     _CACHE.clear()
+
+def invalidate_cache(dates: Optional[Iterable[date]] = None, bus_ids: Optional[Iterable[str]] = None) -> int:
+    """
+    Drop cached results affected by a write to the given scanned_on dates and
+    bus_ids. None means every date / every bus.
+    """
+    return _CACHE.invalidate(dates=dates, bus_ids=bus_ids)
+
+def cache_stats() -> Dict[str, Any]:
+    """
+    Return size and hit/miss/eviction counters for the shared cache, plus
+    this process's coalesced-miss, stale-served and failed-refresh counts.
+    """
+    stats = _CACHE.stats()
+    with _flight_guard:
+        stats.update(_flight_stats)
+    return stats
@@ -0,0 +1,54 @@
+"""
+Request body decompression for agent uploads.
+Lets Pi agents send gzip-compressed JSON (Content-Encoding: gzip).
+"""
+
+import zlib
+from typing import Callable
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.routing import APIRoute
+
+# Upper bound on the decompressed body to guard against compression bombs
+MAX_DECOMPRESSED_BYTES = 20 * 1024 * 1024
+
+
+def decompress_gzip(body: bytes, max_size: int = MAX_DECOMPRESSED_BYTES) -> bytes:
+    """Decompress a gzip body, rejecting corrupt or oversized payloads."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, max_size)
+    except zlib.error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid gzip request body")
+    if decompressor.unconsumed_tail:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Decompressed request body too large",
+        )
+    # A truncated stream decompresses without error; trailing bytes are not part of it
+    if not decompressor.eof or decompressor.unused_data:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid gzip request body")
+    return data
+
+
+class GzipRequest(Request):
+    """Request whose body is transparently gunzipped."""
+
+    async def body(self) -> bytes:
+        if not hasattr(self, "_decompressed_body"):
+            self._decompressed_body = decompress_gzip(await super().body())
+        return self._decompressed_body
+
+
+class GzipRoute(APIRoute):
+    """API route that accepts `Content-Encoding: gzip` request bodies."""
+
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            if request.headers.get("content-encoding", "").strip().lower() == "gzip":
+                request = GzipRequest(request.scope, request.receive)
+            return await original_route_handler(request)
+
+        return route_handler
@@ -23,6 +23,22 @@ class Settings(BaseSettings):
     app_name: str = "Bus Optimizer API"
     debug: bool = False
     
+    # Report cache limits; 0 bytes disables the size limit
+    cache_max_entries: int = 512
+    cache_max_bytes: int = 64 * 1024 * 1024
+    
+    # "sqlite" shares cached reports across uvicorn workers through a local file;
+    # "memory" keeps a separate cache per process. Empty path uses backend/data/report_cache.db.
+    cache_backend: str = "sqlite"
+    cache_sqlite_path: str = ""
+    report_cache_ttl_seconds: int = 3600
+    # Expired reports are served for this long while one request refreshes them
+    report_cache_stale_seconds: int = 300
+    
+    # Spreadsheet parser for uploads: "auto" uses python-calamine when installed,
+    # otherwise openpyxl; "openpyxl" or "calamine" forces one
+    excel_reader: str = "auto"
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -1,17 +1,44 @@
 """
 Excel parsing helpers used by upload endpoints.
+Workbooks are read with python-calamine when it is installed (and allowed by
+the EXCEL_READER setting), otherwise with openpyxl in read-only mode.
+CSV/TSV uploads are read as a single sheet with the stdlib csv module.
 """
 
 from __future__ import annotations
 
+import codecs
+import csv
+import functools
+import logging
 from dataclasses import dataclass
 from datetime import date, datetime, time
-from io import BytesIO
-from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+from io import BytesIO, TextIOWrapper
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Sequence, Tuple, TypeVar
 
 from openpyxl import load_workbook
 import re
 
+from app.core.config import get_settings
+
+try:
+    from python_calamine import CalamineWorkbook, SheetTypeEnum
+except ImportError:  # pragma: no cover - optional dependency
+    CalamineWorkbook = None
+    SheetTypeEnum = None
+
+logger = logging.getLogger(__name__)
+
+# Leading rows of each sheet searched for the header row
+HEADER_SCAN_ROWS = 50
+
+# Upload file extension -> format understood by stream_table_from_best_sheet
+UPLOAD_FORMATS = {".xlsx": "xlsx", ".csv": "csv", ".tsv": "tsv"}
+
+# Bytes of a CSV upload inspected to detect its delimiter and encoding
+CSV_SNIFF_BYTES = 64 * 1024
+
 
 def _normalize_header(value: Any) -> str:
     if value is None:
@@ -29,10 +56,37 @@ def _canonical_header(value: Any) -> str:
     return normalized.replace(" ", "").replace("_", "").replace("-", "")
 
 
+class RowView(Mapping[str, Any]):
+    """
+    Read-only header -> value view over one raw row tuple.
+
+    Rows share a single header index, so no per-row dict is built.
+    """
+
+    __slots__ = ("_row", "_index")
+
+    def __init__(self, row: Sequence[Any], index: Dict[str, int]):
+        self._row = row
+        self._index = index
+
+    def __getitem__(self, key: str) -> Any:
+        col_index = self._index[key]
+        return self._row[col_index] if col_index < len(self._row) else None
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
 @dataclass(frozen=True)
 class ExcelRow:
     row_number: int
-    values: Dict[str, Any]
+    values: Mapping[str, Any]
 
 
 @dataclass(frozen=True)
@@ -43,16 +97,204 @@ class ExcelTable:
     rows: list[ExcelRow]
 
 
+@dataclass(frozen=True)
+class ExcelStream:
+    """Best-matching sheet whose data rows are read lazily, one at a time."""
+
+    sheet_name: str
+    header_row_number: int
+    headers: Sequence[str]
+    rows: Iterator[ExcelRow]
+
+
+T = TypeVar("T")
+
+
+def iter_chunks(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Group an iterable into lists of at most `size` items."""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _OpenpyxlReader:
+    """Workbook reader backed by openpyxl in read-only mode."""
+
+    name = "openpyxl"
+
+    def __init__(self, xlsx_bytes: bytes):
+        self._wb = load_workbook(filename=BytesIO(xlsx_bytes), read_only=True, data_only=True)
+
+    def sheets(self) -> Iterator[Tuple[str, Iterator[Sequence[Any]]]]:
+        for ws in self._wb.worksheets:
+            yield ws.title, ws.iter_rows(values_only=True)
+
+    def close(self) -> None:
+        self._wb.close()
+
+
+def _calamine_value(value: Any) -> Any:
+    # Match openpyxl's values: None for empty cells, int for whole numbers, datetime for dates
+    value_type = type(value)
+    if value_type is str:
+        return value if value else None
+    if value_type is float:
+        return int(value) if value.is_integer() else value
+    if value_type is date:
+        return datetime.combine(value, time())
+    return value
+
+
+class _CalamineReader:
+    """Workbook reader backed by python-calamine (Rust), yielding openpyxl-compatible rows."""
+
+    name = "calamine"
+
+    def __init__(self, xlsx_bytes: bytes):
+        self._wb = CalamineWorkbook.from_filelike(BytesIO(xlsx_bytes))
+
+    def sheets(self) -> Iterator[Tuple[str, Iterator[Sequence[Any]]]]:
+        for metadata in self._wb.sheets_metadata:
+            if metadata.typ != SheetTypeEnum.WorkSheet:
+                continue
+            yield metadata.name, self._iter_rows(metadata.name)
+
+    def _iter_rows(self, sheet_name: str) -> Iterator[Sequence[Any]]:
+        sheet = self._wb.get_sheet_by_name(sheet_name)
+        # Rows start at row 1 but at the first used column; pad them back to column A
+        leading = (None,) * (sheet.start[1] if sheet.start else 0)
+        for row in sheet.iter_rows():
+            yield leading + tuple(_calamine_value(value) for value in row)
+
+    def close(self) -> None:
+        self._wb.close()
+
+
+class _CsvReader:
+    """Reader exposing a CSV/TSV file as one sheet of string cells, decoded as it streams."""
+
+    name = "csv"
+
+    def __init__(self, data: bytes, file_format: str):
+        self._data = data
+        self._sheet_name = file_format.upper()
+        self._delimiter = "\t" if file_format == "tsv" else _sniff_delimiter(data[:CSV_SNIFF_BYTES])
+        self._stream: Optional[TextIOWrapper] = None
+
+    def sheets(self) -> Iterator[Tuple[str, Iterator[Sequence[Any]]]]:
+        yield self._sheet_name, self._iter_rows()
+
+    def _iter_rows(self) -> Iterator[Sequence[Any]]:
+        encoding = "utf-8-sig" if _is_utf8(self._data) else "cp1252"
+        self._stream = TextIOWrapper(BytesIO(self._data), encoding=encoding, errors="replace", newline="")
+        for row in csv.reader(self._stream, delimiter=self._delimiter):
+            # Empty fields match empty spreadsheet cells
+            yield tuple(value if value else None for value in row)
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+
+
+def _is_utf8(data: bytes) -> bool:
+    """
+    Check the first CSV_SNIFF_BYTES only; a character cut at the end of that
+    prefix still counts as UTF-8. Bad bytes further in decode as U+FFFD.
+    """
+    sample = data[:CSV_SNIFF_BYTES]
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=len(sample) == len(data))
+    except UnicodeDecodeError:
+        # Legacy Windows exports
+        return False
+    return True
+
+
+def _sniff_delimiter(sample: bytes) -> str:
+    text = sample.decode("utf-8", errors="ignore")
+    # Drop a possibly truncated last line
+    if "\n" in text:
+        text = text[: text.rfind("\n")]
+    try:
+        return csv.Sniffer().sniff(text, delimiters=",;\t").delimiter
+    except csv.Error:
+        return ","
+
+
+def upload_format(filename: Optional[str]) -> Optional[str]:
+    """Return the upload format ("xlsx", "csv" or "tsv") for a filename, or None if unsupported."""
+    if not filename:
+        return None
+    lowered = filename.lower()
+    for extension, file_format in UPLOAD_FORMATS.items():
+        if lowered.endswith(extension):
+            return file_format
+    return None
+
+
+def _open_workbook(data: bytes, file_format: str = "xlsx"):
+    """Open an upload with the CSV reader or the workbook reader selected by EXCEL_READER."""
+    if file_format in ("csv", "tsv"):
+        return _CsvReader(data, file_format)
+    choice = get_settings().excel_reader.strip().lower()
+    if choice not in ("auto", "openpyxl", "calamine"):
+        logger.warning(f"Unknown excel reader '{choice}', using auto")
+        choice = "auto"
+    if choice != "openpyxl" and CalamineWorkbook is not None:
+        return _CalamineReader(data)
+    if choice == "calamine":
+        logger.warning("python-calamine is not installed; reading workbook with openpyxl")
+    return _OpenpyxlReader(data)
+
+
+class _SheetScanner:
+    """
+    A single streaming pass over a worksheet.
+
+    Leading rows read for header detection and sampling are buffered, and data rows
+    are then served from that buffer followed by the rest of the same pass, so the
+    sheet XML is parsed only once.
+    """
+
+    def __init__(self, rows: Iterator[Sequence[Any]]):
+        self._rows = rows
+        self._buffer: list[Sequence[Any]] = []
+
+    def leading_rows(self, count: int) -> list[Sequence[Any]]:
+        """Return the first `count` rows (fewer if the sheet is shorter)."""
+        while len(self._buffer) < count:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer.append(row)
+        return self._buffer[:count]
+
+    def rows_from(self, row_number: int) -> Iterator[Tuple[int, Sequence[Any]]]:
+        """Yield (row_number, row) pairs starting at the 1-based `row_number`."""
+        for row_idx in range(row_number, len(self._buffer) + 1):
+            yield row_idx, self._buffer[row_idx - 1]
+        next_row = len(self._buffer) + 1
+        if row_number > next_row:
+            # Skip unread rows between the buffer and the requested start
+            for _row in islice(self._rows, row_number - next_row):
+                pass
+            next_row = row_number
+        yield from enumerate(self._rows, start=next_row)
+
+
 def _find_header_row(
-    ws,
+    rows: Sequence[Sequence[Any]],
     must_include: set[str],
     prefer_include: set[str],
-    max_scan_rows: int = 50,
+    max_scan_rows: int = HEADER_SCAN_ROWS,
     min_prefer_matches: int = 0,
 ) -> Optional[Tuple[int, Sequence[str], int]]:
     best: Optional[Tuple[int, Sequence[str], int]] = None
 
-    for row_idx, row in enumerate(ws.iter_rows(min_row=1, max_row=max_scan_rows, values_only=True), start=1):
+    for row_idx, row in enumerate(rows[:max_scan_rows], start=1):
         if not row:
             continue
         headers = [_canonical_header(cell) for cell in row]
@@ -79,13 +321,13 @@ def _is_non_empty(value: Any) -> bool:
     return True
 
 
-def _count_valid_sample_rows(ws, header_row_idx: int, headers: Sequence[str], required_non_empty: set[str], sample_size: int) -> int:
+def _count_valid_sample_rows(sample_rows: Iterable[Sequence[Any]], headers: Sequence[str], required_non_empty: set[str]) -> int:
     required_indices = [idx for idx, header in enumerate(headers) if header in required_non_empty]
     if not required_indices:
         return 0
 
     count = 0
-    for row in ws.iter_rows(min_row=header_row_idx + 1, max_row=header_row_idx + sample_size, values_only=True):
+    for row in sample_rows:
         if not row:
             continue
         if all(v is None or str(v).strip() == "" for v in row):
@@ -95,7 +337,23 @@ def _count_valid_sample_rows(ws, header_row_idx: int, headers: Sequence[str], re
     return count
 
 
-def read_rows_from_best_sheet(
+def _header_index(headers: Sequence[str]) -> Dict[str, int]:
+    # Later columns win when a header repeats, matching the previous per-row dicts
+    return {header: col_index for col_index, header in enumerate(headers) if header}
+
+
+def _iter_data_rows(reader, scanner: _SheetScanner, header_row_idx: int, headers: Sequence[str]) -> Iterator[ExcelRow]:
+    index = _header_index(headers)
+    try:
+        for row_idx, row in scanner.rows_from(header_row_idx + 1):
+            if not row or all(v is None or str(v).strip() == "" for v in row):
+                continue
+            yield ExcelRow(row_number=row_idx, values=RowView(row, index))
+    finally:
+        reader.close()
+
+
+def stream_table_from_best_sheet(
     xlsx_bytes: bytes,
     must_include: set[str],
     prefer_include: Optional[set[str]] = None,
@@ -104,30 +362,35 @@ def read_rows_from_best_sheet(
     required_non_empty_in_sample: Optional[set[str]] = None,
     min_valid_sample_rows: int = 1,
     sample_size: int = 15,
-) -> list[ExcelRow]:
+    file_format: str = "xlsx",
+) -> Optional[ExcelStream]:
     """
-    Read rows from the best-matching worksheet in an XLSX.
+    Select the best-matching worksheet in an XLSX (or the single sheet of a CSV/TSV
+    when `file_format` says so) and stream its data rows.
 
     The selected sheet is the one that contains a header row matching `must_include`
     (case-insensitive after canonicalization), scoring higher for additional matches
-    in `prefer_include`.
+    in `prefer_include`. Each sheet is parsed in a single pass: the leading rows used
+    for header detection and sampling are buffered, and the chosen sheet's data rows
+    are then yielded lazily from the same pass as `ExcelRow`s whose values map
+    headers onto the raw row tuple.
     """
+    reader = _open_workbook(xlsx_bytes, file_format)
     prefer_include = prefer_include or set()
     sheet_name_exclude_prefixes = sheet_name_exclude_prefixes or ("note",)
 
-    wb = load_workbook(filename=BytesIO(xlsx_bytes), read_only=True, data_only=True)
-
     best_sheet = None
+    best_scanner = None
     best_header = None
-    best_sample_valid = 0
 
-    for ws in wb.worksheets:
-        title = (ws.title or "").strip().lower()
+    for sheet_name, sheet_rows in reader.sheets():
+        title = (sheet_name or "").strip().lower()
         if any(title.startswith(prefix) for prefix in sheet_name_exclude_prefixes):
             continue
 
+        scanner = _SheetScanner(sheet_rows)
         header = _find_header_row(
-            ws,
+            scanner.leading_rows(HEADER_SCAN_ROWS),
             must_include=must_include,
             prefer_include=prefer_include,
             min_prefer_matches=min_prefer_matches,
@@ -136,38 +399,34 @@ def read_rows_from_best_sheet(
             continue
 
         header_row_idx, headers, score = header
-        required_non_empty_in_sample = required_non_empty_in_sample or set()
-        sample_valid = _count_valid_sample_rows(ws, header_row_idx, headers, required_non_empty_in_sample, sample_size) if required_non_empty_in_sample else sample_size
-
+        if required_non_empty_in_sample:
+            sample_rows = scanner.leading_rows(header_row_idx + sample_size)[header_row_idx:]
+            sample_valid = _count_valid_sample_rows(sample_rows, headers, required_non_empty_in_sample)
+        else:
+            sample_valid = sample_size
         if required_non_empty_in_sample and sample_valid < min_valid_sample_rows:
             continue
 
         score_with_sample = score + (sample_valid * 100)
         if best_header is None or score_with_sample > best_header[2]:
-            best_sheet = ws
+            best_sheet = sheet_name
+            best_scanner = scanner
             best_header = (header_row_idx, headers, score_with_sample)
-            best_sample_valid = sample_valid
 
-    if best_sheet is None or best_header is None:
-        return []
+    if best_sheet is None or best_scanner is None or best_header is None:
+        reader.close()
+        return None
 
     header_row_idx, headers, _score = best_header
-    rows: list[ExcelRow] = []
-    for row_idx, row in enumerate(best_sheet.iter_rows(min_row=header_row_idx + 1, values_only=True), start=header_row_idx + 1):
-        if not row or all(v is None or str(v).strip() == "" for v in row):
-            continue
-        values: Dict[str, Any] = {}
-        for col_index, header in enumerate(headers):
-            if not header:
-                continue
-            cell_value = row[col_index] if col_index < len(row) else None
-            values[header] = cell_value
-        rows.append(ExcelRow(row_number=row_idx, values=values))
-
-    return rows
+    return ExcelStream(
+        sheet_name=best_sheet,
+        header_row_number=header_row_idx,
+        headers=headers,
+        rows=_iter_data_rows(reader, best_scanner, header_row_idx, headers),
+    )
 
 
-def read_table_from_best_sheet(
+def read_rows_from_best_sheet(
     xlsx_bytes: bytes,
     must_include: set[str],
     prefer_include: Optional[set[str]] = None,
@@ -176,55 +435,53 @@ def read_table_from_best_sheet(
     required_non_empty_in_sample: Optional[set[str]] = None,
     min_valid_sample_rows: int = 1,
     sample_size: int = 15,
-) -> Optional[ExcelTable]:
-    wb = load_workbook(filename=BytesIO(xlsx_bytes), read_only=True, data_only=True)
-    prefer_include = prefer_include or set()
-    sheet_name_exclude_prefixes = sheet_name_exclude_prefixes or ("note",)
-
-    best_sheet = None
-    best_header = None
-
-    for ws in wb.worksheets:
-        title = (ws.title or "").strip().lower()
-        if any(title.startswith(prefix) for prefix in sheet_name_exclude_prefixes):
-            continue
-
-        header = _find_header_row(
-            ws,
-            must_include=must_include,
-            prefer_include=prefer_include,
-            min_prefer_matches=min_prefer_matches,
-        )
-        if header is None:
-            continue
+) -> list[ExcelRow]:
+    """
+    Read rows from the best-matching worksheet in an XLSX.
 
-        header_row_idx, headers, score = header
-        sample_valid = _count_valid_sample_rows(ws, header_row_idx, headers, required_non_empty_in_sample or set(), sample_size) if required_non_empty_in_sample else sample_size
-        if required_non_empty_in_sample and sample_valid < min_valid_sample_rows:
-            continue
+    Materializes `stream_table_from_best_sheet`; prefer the stream for large files.
+    """
+    stream = stream_table_from_best_sheet(
+        xlsx_bytes,
+        must_include=must_include,
+        prefer_include=prefer_include,
+        sheet_name_exclude_prefixes=sheet_name_exclude_prefixes,
+        min_prefer_matches=min_prefer_matches,
+        required_non_empty_in_sample=required_non_empty_in_sample,
+        min_valid_sample_rows=min_valid_sample_rows,
+        sample_size=sample_size,
+    )
+    return list(stream.rows) if stream else []
 
-        score_with_sample = score + (sample_valid * 100)
-        if best_header is None or score_with_sample > best_header[2]:
-            best_sheet = ws
-            best_header = (header_row_idx, headers, score_with_sample)
 
-    if best_sheet is None or best_header is None:
+def read_table_from_best_sheet(
+    xlsx_bytes: bytes,
+    must_include: set[str],
+    prefer_include: Optional[set[str]] = None,
+    sheet_name_exclude_prefixes: Optional[Sequence[str]] = None,
+    min_prefer_matches: int = 0,
+    required_non_empty_in_sample: Optional[set[str]] = None,
+    min_valid_sample_rows: int = 1,
+    sample_size: int = 15,
+) -> Optional[ExcelTable]:
+    stream = stream_table_from_best_sheet(
+        xlsx_bytes,
+        must_include=must_include,
+        prefer_include=prefer_include,
+        sheet_name_exclude_prefixes=sheet_name_exclude_prefixes,
+        min_prefer_matches=min_prefer_matches,
+        required_non_empty_in_sample=required_non_empty_in_sample,
+        min_valid_sample_rows=min_valid_sample_rows,
+        sample_size=sample_size,
+    )
+    if stream is None:
         return None
-
-    header_row_idx, headers, _score = best_header
-    rows: list[ExcelRow] = []
-    for row_idx, row in enumerate(best_sheet.iter_rows(min_row=header_row_idx + 1, values_only=True), start=header_row_idx + 1):
-        if not row or all(v is None or str(v).strip() == "" for v in row):
-            continue
-        values: Dict[str, Any] = {}
-        for col_index, header in enumerate(headers):
-            if not header:
-                continue
-            cell_value = row[col_index] if col_index < len(row) else None
-            values[header] = cell_value
-        rows.append(ExcelRow(row_number=row_idx, values=values))
-
-    return ExcelTable(sheet_name=best_sheet.title, header_row_number=header_row_idx, headers=headers, rows=rows)
+    return ExcelTable(
+        sheet_name=stream.sheet_name,
+        header_row_number=stream.header_row_number,
+        headers=stream.headers,
+        rows=list(stream.rows),
+    )
 
 
 def read_first_sheet_rows(xlsx_bytes: bytes) -> Iterable[ExcelRow]:
@@ -265,45 +522,135 @@ def coerce_int(value: Any) -> Optional[int]:
         return None
 
 
-def coerce_date(value: Any) -> Optional[date]:
-    if value is None:
-        return None
-    if isinstance(value, datetime):
-        return value.date()
-    if isinstance(value, date):
-        return value
-    text = str(value).strip()
-    if not text:
-        return None
-    # Common exports include weekday prefixes/suffixes, e.g. "12/01/2026 (Mon)" or "Tue-24/12/2024".
-    text = re.sub(r"\s*\(.*\)\s*$", "", text)
-    text = re.sub(r"^[A-Za-z]{3,9}-", "", text)
-    text = text.strip()
-    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y", "%Y/%m/%d"):
+# Common exports include weekday prefixes/suffixes, e.g. "12/01/2026 (Mon)" or "Tue-24/12/2024".
+_DATE_SUFFIX_RE = re.compile(r"\s*\(.*\)\s*$")
+_DATE_WEEKDAY_PREFIX_RE = re.compile(r"^[A-Za-z]{3,9}-")
+_FORMAT_DIRECTIVE_RE = re.compile(r"%[A-Za-z]")
+
+# Tried in priority order; the last two cover date-time text, which CSV exports
+# write where a workbook has a date cell
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y", "%Y/%m/%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M")
+TIME_FORMATS = ("%I:%M %p", "%I:%M%p", "%I:%M:%S %p", "%I:%M:%S%p", "%H:%M", "%H:%M:%S")
+
+# Distinct text values remembered per coercer before its cache is reset
+COERCE_CACHE_SIZE = 4096
+
+
+def _clean_date_text(text: str) -> str:
+    text = _DATE_SUFFIX_RE.sub("", text)
+    text = _DATE_WEEKDAY_PREFIX_RE.sub("", text)
+    return text.strip()
+
+
+@functools.lru_cache(maxsize=None)
+def _learned_orders(formats: Tuple[str, ...]) -> Mapping[str, Tuple[str, ...]]:
+    """
+    Try order for each format once it has matched: higher-priority formats with
+    the same literal separators stay ahead of it. Read-only, shared by all learners.
+    """
+    orders = {}
+    for winner in formats:
+        shape = _FORMAT_DIRECTIVE_RE.sub("%", winner)
+        ahead = [fmt for fmt in formats[: formats.index(winner)] if _FORMAT_DIRECTIVE_RE.sub("%", fmt) == shape]
+        orders[winner] = tuple(ahead + [winner] + [fmt for fmt in formats if fmt != winner and fmt not in ahead])
+    return orders
+
+
+class _FormatLearner:
+    """
+    Parses text against strptime formats in priority order, caching results per
+    distinct text and trying the most recent winning format first.
+
+    Two formats can only match the same text when their literal separators agree
+    (e.g. "%d/%m/%Y" and "%m/%d/%Y"), so higher-priority formats with the same
+    separators stay ahead of the learned one and results never change.
+
+    Not thread-safe: each coercer owns one learner, used by one request.
+    """
+
+    def __init__(self, formats: Sequence[str], prepare, convert):
+        self._formats = tuple(formats)
+        self._orders = _learned_orders(self._formats)
+        self._learned: Optional[str] = None
+        self._order = self._formats
+        self._prepare = prepare
+        self._convert = convert
+        self._cache: Dict[str, Any] = {}
+
+    def parse(self, text: str) -> Any:
         try:
-            return datetime.strptime(text, fmt).date()
-        except ValueError:
-            continue
-    return None
+            return self._cache[text]
+        except KeyError:
+            pass
+
+        prepared = self._prepare(text)
+        result = None
+        for fmt in self._order:
+            try:
+                parsed = datetime.strptime(prepared, fmt)
+            except ValueError:
+                continue
+            result = self._convert(parsed)
+            if fmt != self._learned:
+                self._learned = fmt
+                self._order = self._orders[fmt]
+            break
+
+        if len(self._cache) >= COERCE_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[text] = result
+        return result
+
+
+class DateCoercer:
+    """
+    Date coercion for one column: repeated text values are parsed once and the
+    column's date format is learned after the first hit. Results match `coerce_date`.
+    """
+
+    def __init__(self):
+        self._learner = _FormatLearner(DATE_FORMATS, _clean_date_text, datetime.date)
+
+    def __call__(self, value: Any) -> Optional[date]:
+        if value is None:
+            return None
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        text = str(value).strip()
+        if not text:
+            return None
+        return self._learner.parse(text)
+
+
+class TimeCoercer:
+    """Time coercion for one column, cached and format-learning like `DateCoercer`."""
+
+    def __init__(self):
+        self._learner = _FormatLearner(TIME_FORMATS, str.upper, datetime.time)
+
+    def __call__(self, value: Any) -> Optional[time]:
+        if value is None:
+            return None
+        if isinstance(value, datetime):
+            return value.time()
+        if isinstance(value, time):
+            return value
+        text = str(value).strip()
+        if not text or text == ".":
+            return None
+        return self._learner.parse(text)
+
+
+def coerce_date(value: Any) -> Optional[date]:
+    """One-off coercion with no shared state; use a DateCoercer per column for bulk rows."""
+    return DateCoercer()(value)
 
 
 def coerce_time(value: Any) -> Optional[time]:
-    if value is None:
-        return None
-    if isinstance(value, datetime):
-        return value.time()
-    if isinstance(value, time):
-        return value
-    text = str(value).strip()
-    if not text or text == ".":
-        return None
-    text = text.upper()
-    for fmt in ("%I:%M %p", "%I:%M%p", "%I:%M:%S %p", "%I:%M:%S%p", "%H:%M", "%H:%M:%S"):
-        try:
-            return datetime.strptime(text, fmt).time()
-        except ValueError:
-            continue
-    return None
+    """One-off coercion with no shared state; use a TimeCoercer per column for bulk rows."""
+    return TimeCoercer()(value)
 
 
 def build_scanned_at(scanned_on: date, shift: str) -> datetime:
@@ -0,0 +1,88 @@
+"""
+Streamed columnar exports (Apache Arrow IPC stream and Parquet).
+pyarrow is optional; without it only CSV exports are available.
+"""
+
+from typing import Iterable, Iterator, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+
+def columnar_available() -> bool:
+    """Whether pyarrow is installed and Parquet/Arrow exports can be produced."""
+    return pa is not None
+
+
+class _ChunkSink:
+    """Write-only file object whose buffered bytes are drained after each batch."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_columnar(
+    fmt: str,
+    columns: Sequence[tuple[str, "pa.DataType"]],
+    batches: Iterable[Sequence[tuple]],
+) -> Iterator[bytes]:
+    """
+    Encode row batches as a Parquet file or an Arrow IPC stream, yielding bytes
+    as each batch is written. Each row batch becomes one record batch (Arrow)
+    or one row group (Parquet), so memory stays bounded by the batch size.
+    """
+    if fmt not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unsupported columnar format: {fmt}")
+    if pa is None:
+        raise RuntimeError("pyarrow is required for Parquet/Arrow exports")
+
+    schema = pa.schema([pa.field(name, data_type) for name, data_type in columns])
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    try:
+        for rows in batches:
+            values = list(zip(*rows))
+            record_batch = pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(values, schema)],
+                schema=schema,
+            )
+            writer.write_batch(record_batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+
+    yield sink.drain()
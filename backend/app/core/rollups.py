@@ -0,0 +1,336 @@
+"""
+Maintained report rollups.
+Keeps daily_occupancy in step with attendances and unknown_attendances,
+and bus_plant in step with employees and employee_master.
+"""
+
+import logging
+from datetime import date
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import String, case, func, insert, literal, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import Attendance, AttendanceShift, BusPlant, DailyOccupancy, Employee, EmployeeMaster, UnknownAttendance
+
+logger = logging.getLogger(__name__)
+
+# Dates recomputed per round trip
+REFRESH_CHUNK_SIZE = 100
+
+# Postgres advisory lock namespace for per-date rollup locks: full-day
+# recomputes take them exclusively, delta upserts take them shared
+ROLLUP_LOCK_KEY = 4_201_001
+
+# Per-date lock for delta writes to rows without a bus, which the
+# (scanned_on, shift, bus_id) unique constraint cannot arbitrate
+UNASSIGNED_BUS_LOCK_KEY = 4_201_002
+
+COUNTER_COLUMNS = (
+    "bus_present",
+    "van_present",
+    "total_present",
+    "unknown_batch",
+    "unknown_shift",
+    "total_scans",
+    "unknown_present",
+)
+
+# Dialects whose insert() supports ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def _empty_counts() -> dict:
+    return {
+        "bus_present": 0,
+        "van_present": 0,
+        "total_present": 0,
+        "unknown_batch": 0,
+        "unknown_shift": 0,
+        "total_scans": 0,
+        "unknown_present": 0,
+        "unknown_route": None,
+    }
+
+
+def _shift_key(shift: Any) -> AttendanceShift:
+    # unknown_attendance_shift and attendance_shift share the same values
+    return AttendanceShift(shift.value if hasattr(shift, "value") else shift)
+
+
+def _lock_dates(db: Session, namespace: int, dates: Iterable[date], shared: bool = False) -> None:
+    """Take per-date Postgres advisory locks in date order, so lockers never deadlock."""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    function = "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+    for day in sorted(set(dates)):
+        db.execute(text(f"SELECT {function}(:namespace, :day)"), {"namespace": namespace, "day": day.toordinal()})
+
+
+def _refresh_chunk(db: Session, dates: list[date]) -> None:
+    present_case = case((Attendance.status == "present", 1), else_=0)
+    bus_present_case = case((Attendance.status == "present", case((Attendance.van_id.is_(None), 1), else_=0)), else_=0)
+    van_present_case = case((Attendance.status == "present", case((Attendance.van_id.is_not(None), 1), else_=0)), else_=0)
+    unknown_batch_case = case((Attendance.status == "unknown_batch", 1), else_=0)
+    unknown_shift_case = case((Attendance.status == "unknown_shift", 1), else_=0)
+
+    counts_by_key: dict[tuple, dict] = {}
+
+    attendance_rows = (
+        db.query(
+            Attendance.scanned_on,
+            Attendance.shift,
+            Attendance.bus_id,
+            func.sum(bus_present_case),
+            func.sum(van_present_case),
+            func.sum(present_case),
+            func.sum(unknown_batch_case),
+            func.sum(unknown_shift_case),
+            func.count(Attendance.id),
+        )
+        .filter(Attendance.scanned_on.in_(dates))
+        .group_by(Attendance.scanned_on, Attendance.shift, Attendance.bus_id)
+        .all()
+    )
+    for scanned_on, shift, bus_id, bus_present, van_present, total_present, unknown_batch, unknown_shift, total in attendance_rows:
+        counts = counts_by_key.setdefault((scanned_on, AttendanceShift(shift), bus_id), _empty_counts())
+        counts["bus_present"] = int(bus_present or 0)
+        counts["van_present"] = int(van_present or 0)
+        counts["total_present"] = int(total_present or 0)
+        counts["unknown_batch"] = int(unknown_batch or 0)
+        counts["unknown_shift"] = int(unknown_shift or 0)
+        counts["total_scans"] = int(total or 0)
+
+    unknown_rows = (
+        db.query(
+            UnknownAttendance.scanned_on,
+            UnknownAttendance.shift,
+            UnknownAttendance.bus_id,
+            func.count(UnknownAttendance.id),
+            func.max(UnknownAttendance.route_raw),
+        )
+        .filter(UnknownAttendance.scanned_on.in_(dates))
+        .group_by(UnknownAttendance.scanned_on, UnknownAttendance.shift, UnknownAttendance.bus_id)
+        .all()
+    )
+    for scanned_on, shift, bus_id, total, route_raw in unknown_rows:
+        counts = counts_by_key.setdefault((scanned_on, _shift_key(shift), bus_id), _empty_counts())
+        counts["unknown_present"] = int(total or 0)
+        counts["unknown_route"] = route_raw
+
+    db.query(DailyOccupancy).filter(DailyOccupancy.scanned_on.in_(dates)).delete(synchronize_session=False)
+    if counts_by_key:
+        db.execute(
+            insert(DailyOccupancy),
+            [
+                {"scanned_on": scanned_on, "shift": shift, "bus_id": bus_id, **counts}
+                for (scanned_on, shift, bus_id), counts in counts_by_key.items()
+            ],
+        )
+
+
+def refresh_daily_occupancy(db: Session, dates: Iterable[date]) -> None:
+    """
+    Recompute daily_occupancy rows for the given scanned_on dates.
+
+    Used after deletes and for backfill; inserts go through
+    apply_daily_occupancy_deltas instead. Runs inside the caller's transaction;
+    the caller commits together with the attendance writes so the rollup never
+    drifts from the raw tables.
+    """
+    unique_dates = sorted({d for d in dates if d is not None})
+    if not unique_dates:
+        return
+
+    # Delta upserts or another recompute of the same date would otherwise be lost or double-counted
+    _lock_dates(db, ROLLUP_LOCK_KEY, unique_dates)
+
+    for i in range(0, len(unique_dates), REFRESH_CHUNK_SIZE):
+        _refresh_chunk(db, unique_dates[i:i + REFRESH_CHUNK_SIZE])
+
+
+class OccupancyDeltas:
+    """Per-key daily_occupancy increments for newly inserted attendance rows."""
+
+    def __init__(self) -> None:
+        self._counts: dict[tuple, dict] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._counts)
+
+    @property
+    def dates(self) -> set[date]:
+        return {scanned_on for scanned_on, _shift, _bus_id in self._counts}
+
+    def _key_counts(self, scanned_on: date, shift: Any, bus_id: Optional[str]) -> dict:
+        return self._counts.setdefault((scanned_on, _shift_key(shift), bus_id), _empty_counts())
+
+    def add_attendance(self, scanned_on: date, shift: Any, bus_id: Optional[str], van_id: Optional[int], status: str) -> None:
+        counts = self._key_counts(scanned_on, shift, bus_id)
+        if status == "present":
+            counts["total_present"] += 1
+            counts["bus_present" if van_id is None else "van_present"] += 1
+        elif status == "unknown_batch":
+            counts["unknown_batch"] += 1
+        elif status == "unknown_shift":
+            counts["unknown_shift"] += 1
+        counts["total_scans"] += 1
+
+    def add_unknown(self, scanned_on: date, shift: Any, bus_id: Optional[str], route_raw: Optional[str]) -> None:
+        counts = self._key_counts(scanned_on, shift, bus_id)
+        counts["unknown_present"] += 1
+        if route_raw is not None and (counts["unknown_route"] is None or route_raw > counts["unknown_route"]):
+            counts["unknown_route"] = route_raw
+
+    def rows(self) -> list[dict]:
+        return [
+            {"scanned_on": scanned_on, "shift": shift, "bus_id": bus_id, **counts}
+            for (scanned_on, shift, bus_id), counts in self._counts.items()
+        ]
+
+
+def _later_route(current, incoming):
+    # Keeps max(route_raw) like the full recompute; NULL on either side keeps the other
+    return case(
+        (incoming.is_(None), current),
+        (current.is_(None), incoming),
+        (incoming > current, incoming),
+        else_=current,
+    )
+
+
+def _delta_assignments(incoming) -> dict:
+    assignments = {name: getattr(DailyOccupancy, name) + incoming[name] for name in COUNTER_COLUMNS}
+    assignments["unknown_route"] = _later_route(DailyOccupancy.unknown_route, incoming["unknown_route"])
+    return assignments
+
+
+def apply_daily_occupancy_deltas(db: Session, deltas: OccupancyDeltas) -> None:
+    """
+    Add the counts of newly inserted attendance rows to daily_occupancy.
+
+    Each (scanned_on, shift, bus_id) row is upserted with
+    INSERT ... ON CONFLICT DO UPDATE, so concurrent uploads only contend on the
+    rows they share instead of re-aggregating whole days. Runs inside the
+    caller's transaction, like refresh_daily_occupancy.
+    """
+    if not deltas:
+        return
+
+    dialect = db.get_bind().dialect.name
+    if dialect not in _UPSERT_INSERTS:
+        refresh_daily_occupancy(db, deltas.dates)
+        return
+
+    # Shared, so uploads of the same day do not wait on each other, only on recomputes
+    _lock_dates(db, ROLLUP_LOCK_KEY, deltas.dates, shared=True)
+
+    rows = deltas.rows()
+    keyed_rows = [row for row in rows if row["bus_id"] is not None]
+    unassigned_rows = [row for row in rows if row["bus_id"] is None]
+
+    if keyed_rows:
+        statement = _UPSERT_INSERTS[dialect](DailyOccupancy)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=["scanned_on", "shift", "bus_id"],
+                set_=_delta_assignments(statement.excluded),
+            ),
+            keyed_rows,
+        )
+
+    # NULL bus_id never conflicts, so those rows are matched explicitly under a per-date lock
+    _lock_dates(db, UNASSIGNED_BUS_LOCK_KEY, {row["scanned_on"] for row in unassigned_rows})
+    for row in unassigned_rows:
+        incoming = {name: literal(row[name]) for name in COUNTER_COLUMNS}
+        incoming["unknown_route"] = literal(row["unknown_route"], String(200))
+        result = db.execute(
+            update(DailyOccupancy)
+            .where(DailyOccupancy.scanned_on == row["scanned_on"])
+            .where(DailyOccupancy.shift == row["shift"])
+            .where(DailyOccupancy.bus_id.is_(None))
+            .values(_delta_assignments(incoming))
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.execute(insert(DailyOccupancy), [row])
+
+
+def backfill_daily_occupancy(db: Session) -> None:
+    """Populate daily_occupancy from existing attendance history if it is empty."""
+    if db.query(DailyOccupancy.id).first() is not None:
+        return
+
+    dates = {row[0] for row in db.query(Attendance.scanned_on).distinct().all()}
+    dates |= {row[0] for row in db.query(UnknownAttendance.scanned_on).distinct().all()}
+    if not dates:
+        return
+
+    refresh_daily_occupancy(db, dates)
+    db.commit()
+    logger.info(f"Backfilled daily occupancy rollup for {len(dates)} days")
+
+
+def refresh_bus_plant(db: Session, bus_ids: Optional[Iterable[str]] = None) -> None:
+    """
+    Recompute the dominant plant of each bus from its active employees.
+
+    Only the given bus_ids are recomputed when provided (e.g. the old and new
+    bus of an edited employee); None rebuilds every bus. Runs inside the
+    caller's transaction, after master list or employee changes.
+    """
+    query = (
+        db.query(
+            Employee.bus_id,
+            EmployeeMaster.building_id,
+            func.count(Employee.id).label("cnt")
+        )
+        .join(EmployeeMaster, Employee.batch_id == EmployeeMaster.personid, isouter=True)
+        .filter(Employee.active.is_(True))
+        .filter(Employee.bus_id.is_not(None))
+    )
+    scoped_bus_ids = None
+    if bus_ids is not None:
+        scoped_bus_ids = sorted({bus_id for bus_id in bus_ids if bus_id})
+        if not scoped_bus_ids:
+            return
+        query = query.filter(Employee.bus_id.in_(scoped_bus_ids))
+    rows = query.group_by(Employee.bus_id, EmployeeMaster.building_id).all()
+
+    counts_by_bus: dict[str, dict[str, int]] = {}
+    for bus_id, building_id, cnt in rows:
+        counts = counts_by_bus.setdefault(bus_id, {})
+        if building_id:
+            counts[building_id] = counts.get(building_id, 0) + int(cnt or 0)
+
+    # Most common building_id per bus; ties go to the smallest id so the result is stable
+    mapping = [
+        {
+            "bus_id": bus_id,
+            "building_id": min(counts, key=lambda k: (-counts[k], k)) if counts else None,
+        }
+        for bus_id, counts in counts_by_bus.items()
+    ]
+
+    stale = db.query(BusPlant)
+    if scoped_bus_ids is not None:
+        stale = stale.filter(BusPlant.bus_id.in_(scoped_bus_ids))
+    stale.delete(synchronize_session=False)
+    if mapping:
+        db.execute(insert(BusPlant), mapping)
+
+
+def backfill_bus_plant(db: Session) -> None:
+    """Populate bus_plant from the current roster if it is empty."""
+    if db.query(BusPlant.bus_id).first() is not None:
+        return
+    if db.query(Employee.id).first() is None:
+        return
+
+    refresh_bus_plant(db)
+    db.commit()
+    logger.info("Backfilled bus plant mapping")
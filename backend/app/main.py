@@ -11,7 +11,9 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api import bus_router, report_router
 from app.core.config import get_settings
-from app.core.db import create_tables
+from app.core.cache import clear_cache
+from app.core.db import SessionLocal, create_tables
+from app.core.rollups import backfill_bus_plant, backfill_daily_occupancy
 
 # Configure logging
 logging.basicConfig(
@@ -36,6 +38,20 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Failed to create tables: {e}")
     
+    # Build the rollups from existing data on first start after upgrade
+    try:
+        db = SessionLocal()
+        try:
+            backfill_daily_occupancy(db)
+            backfill_bus_plant(db)
+        finally:
+            db.close()
+    except Exception as e:
+        logger.error(f"Failed to backfill rollups: {e}")
+    
+    # Cached reports may predate changes made while the API was down
+    clear_cache()
+    
     yield
     
     # Shutdown
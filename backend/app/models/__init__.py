@@ -6,6 +6,8 @@ from app.models.employee import Employee
 from app.models.attendance import Attendance, AttendanceShift
 from app.models.employee_master import EmployeeMaster
 from app.models.unknown_attendance import UnknownAttendance, UnknownAttendanceShift
+from app.models.daily_occupancy import DailyOccupancy
+from app.models.bus_plant import BusPlant
 
 __all__ = [
     "Bus",
@@ -16,4 +18,6 @@ __all__ = [
     "AttendanceShift",
     "UnknownAttendance",
     "UnknownAttendanceShift",
+    "DailyOccupancy",
+    "BusPlant",
 ]
@@ -0,0 +1,24 @@
+"""
+Bus to plant mapping model.
+"""
+
+from sqlalchemy import Column, String
+
+from app.core.db import Base
+
+
+class BusPlant(Base):
+    """
+    Dominant plant (employee_master.building_id) of each bus's active riders.
+
+    Recomputed by app.core.rollups after master list uploads and employee
+    edits. building_id is NULL for buses whose riders have no building_id.
+    """
+
+    __tablename__ = "bus_plant"
+
+    bus_id = Column(String(10), primary_key=True)
+    building_id = Column(String(50), nullable=True)
+
+    def __repr__(self):
+        return f"<BusPlant {self.bus_id} plant={self.building_id}>"
@@ -0,0 +1,47 @@
+"""
+Daily occupancy rollup model.
+"""
+
+from sqlalchemy import Column, Integer, BigInteger, String, Enum, Date, UniqueConstraint
+
+from app.core.db import Base
+from app.models.attendance import AttendanceShift
+
+
+class DailyOccupancy(Base):
+    """
+    Pre-aggregated attendance counts per scanned_on/shift/bus_id.
+
+    Maintained by app.core.rollups: inserts add per-key deltas, deletes
+    rebuild the affected dates, so report endpoints can read a handful of
+    rows instead of re-aggregating the raw tables.
+    """
+
+    __tablename__ = "daily_occupancy"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    scanned_on = Column(Date, nullable=False)
+    shift = Column(
+        Enum(AttendanceShift, name="attendance_shift", create_type=False),
+        nullable=False,
+    )
+    bus_id = Column(String(10), nullable=True)
+
+    # From attendances
+    bus_present = Column(Integer, nullable=False, default=0)
+    van_present = Column(Integer, nullable=False, default=0)
+    total_present = Column(Integer, nullable=False, default=0)
+    unknown_batch = Column(Integer, nullable=False, default=0)
+    unknown_shift = Column(Integer, nullable=False, default=0)
+    total_scans = Column(Integer, nullable=False, default=0)
+
+    # From unknown_attendances
+    unknown_present = Column(Integer, nullable=False, default=0)
+    unknown_route = Column(String(200), nullable=True)  # route_raw seen for unknown scans
+
+    __table_args__ = (
+        UniqueConstraint("scanned_on", "shift", "bus_id", name="uq_daily_occupancy_date_shift_bus"),
+    )
+
+    def __repr__(self):
+        return f"<DailyOccupancy {self.scanned_on} {self.shift} bus={self.bus_id}>"
@@ -2,7 +2,7 @@
 Unknown attendance model for tracking attendance records that don't match master list.
 """
 
-from sqlalchemy import Column, Integer, BigInteger, String, Enum, Date, DateTime, text, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, Enum, Date, DateTime, Index, text, UniqueConstraint
 from enum import Enum as PyEnum
 
 from app.core.db import Base
@@ -46,6 +46,8 @@ class UnknownAttendance(Base):
 
     __table_args__ = (
         UniqueConstraint("scanned_batch_id", "scanned_on", "shift", name="uq_unknown_attendance_batch_date_shift"),
+        # Matches the keyset ordering of /api/report/unknown-attendances
+        Index("idx_unknown_attendances_keyset", scanned_on.desc(), scanned_batch_id, id),
     )
 
     def __repr__(self):
@@ -84,6 +84,29 @@ class OccupancyResponse(BaseModel):
     total_roster: int
 
 
+class TrendPoint(BaseModel):
+    date: str  # YYYY-MM-DD
+    roster: int
+    present: int
+    attendance_rate: float  # percentage
+
+
+class TrendSummary(BaseModel):
+    avg_attendance_rate: float
+    total_roster: int
+    total_present: int
+    date_from: str
+    date_to: str
+    prev_avg_attendance_rate: Optional[float] = None
+    attendance_rate_change: Optional[float] = None  # percentage points
+
+
+class TrendResponse(BaseModel):
+    daily: List[TrendPoint] = []
+    previous: Optional[List[TrendPoint]] = None
+    summary: TrendSummary
+
+
 class BusRosterEntry(BaseModel):
     personid: int
     name: Optional[str] = None
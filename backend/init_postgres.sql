@@ -13,6 +13,8 @@ SET TIME ZONE 'Asia/Kuala_Lumpur';
 -- ------------------------------------------------------------
 -- Clean existing objects for repeatable runs (drops data)
 -- ------------------------------------------------------------
+DROP TABLE IF EXISTS bus_plant CASCADE;
+DROP TABLE IF EXISTS daily_occupancy CASCADE;
 DROP TABLE IF EXISTS unknown_attendances CASCADE;
 DROP TABLE IF EXISTS attendances CASCADE;
 DROP TABLE IF EXISTS employee_master CASCADE;
@@ -158,6 +160,38 @@ CREATE TABLE unknown_attendances (
 CREATE UNIQUE INDEX uq_unknown_attendance_batch_date_shift ON unknown_attendances (scanned_batch_id, scanned_on, shift);
 CREATE INDEX idx_unknown_attendances_bus_id ON unknown_attendances (bus_id);
 CREATE INDEX idx_unknown_attendances_scanned_on ON unknown_attendances (scanned_on);
+CREATE INDEX idx_unknown_attendances_keyset ON unknown_attendances (scanned_on DESC, scanned_batch_id, id);
+
+-- ------------------------------------------------------------
+-- Table: daily_occupancy
+-- Rollup of attendances/unknown_attendances per (date, shift, bus),
+-- incremented by the API on inserts and rebuilt per date on deletes.
+-- ------------------------------------------------------------
+CREATE TABLE daily_occupancy (
+    id              BIGSERIAL PRIMARY KEY,
+    scanned_on      DATE NOT NULL,
+    shift           attendance_shift NOT NULL,
+    bus_id          VARCHAR(10),
+    bus_present     INTEGER NOT NULL DEFAULT 0,
+    van_present     INTEGER NOT NULL DEFAULT 0,
+    total_present   INTEGER NOT NULL DEFAULT 0,
+    unknown_batch   INTEGER NOT NULL DEFAULT 0,
+    unknown_shift   INTEGER NOT NULL DEFAULT 0,
+    total_scans     INTEGER NOT NULL DEFAULT 0,
+    unknown_present INTEGER NOT NULL DEFAULT 0,
+    unknown_route   VARCHAR(200),
+    CONSTRAINT uq_daily_occupancy_date_shift_bus UNIQUE (scanned_on, shift, bus_id)
+);
+
+-- ------------------------------------------------------------
+-- Table: bus_plant
+-- Dominant plant (building_id) per bus, recomputed by the API
+-- after master list uploads and employee edits.
+-- ------------------------------------------------------------
+CREATE TABLE bus_plant (
+    bus_id      VARCHAR(10) PRIMARY KEY,
+    building_id VARCHAR(50)
+);
 
 -- ------------------------------------------------------------
 -- Minimal seed (optional)
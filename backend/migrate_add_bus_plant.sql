@@ -0,0 +1,17 @@
+-- Migration: Add bus_plant mapping table
+-- Purpose: Store the dominant plant (building_id) of each bus so occupancy
+-- reports no longer aggregate employees x employee_master per request.
+-- The API recomputes it after master list uploads and employee edits, and
+-- backfills it on startup when it is empty.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS bus_plant (
+    bus_id      VARCHAR(10) PRIMARY KEY,
+    building_id VARCHAR(50)
+);
+
+COMMIT;
+
+-- Verification
+SELECT 'bus_plant table created successfully' as status;
@@ -0,0 +1,33 @@
+-- Migration: Add daily_occupancy rollup table
+-- Purpose: Pre-aggregated attendance counts per date/shift/bus for report endpoints.
+-- The API adds per-key deltas on attendance inserts, rebuilds affected dates
+-- on deletes and backfills the table from history on startup when it is empty.
+-- Safe to re-run on databases created with the earlier non-unique index.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS daily_occupancy (
+    id              BIGSERIAL PRIMARY KEY,
+    scanned_on      DATE NOT NULL,
+    shift           attendance_shift NOT NULL,
+    bus_id          VARCHAR(10),
+    bus_present     INTEGER NOT NULL DEFAULT 0,
+    van_present     INTEGER NOT NULL DEFAULT 0,
+    total_present   INTEGER NOT NULL DEFAULT 0,
+    unknown_batch   INTEGER NOT NULL DEFAULT 0,
+    unknown_shift   INTEGER NOT NULL DEFAULT 0,
+    total_scans     INTEGER NOT NULL DEFAULT 0,
+    unknown_present INTEGER NOT NULL DEFAULT 0,
+    unknown_route   VARCHAR(200)
+);
+
+-- One row per key, so deltas can be applied with INSERT ... ON CONFLICT DO UPDATE
+DROP INDEX IF EXISTS idx_daily_occupancy_date_shift_bus;
+ALTER TABLE daily_occupancy DROP CONSTRAINT IF EXISTS uq_daily_occupancy_date_shift_bus;
+ALTER TABLE daily_occupancy ADD CONSTRAINT uq_daily_occupancy_date_shift_bus
+    UNIQUE (scanned_on, shift, bus_id);
+
+COMMIT;
+
+-- Verification
+SELECT 'daily_occupancy table created successfully' as status;
@@ -0,0 +1,14 @@
+-- Migration: Add keyset index on unknown_attendances
+-- Purpose: Back the keyset (cursor) pagination of /api/report/unknown-attendances,
+-- which orders by (scanned_on DESC, scanned_batch_id, id), so deep pages are
+-- read straight off the index instead of scanning and discarding OFFSET rows.
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_unknown_attendances_keyset
+    ON unknown_attendances (scanned_on DESC, scanned_batch_id, id);
+
+COMMIT;
+
+-- Verification
+SELECT 'idx_unknown_attendances_keyset created successfully' as status;
@@ -0,0 +1,85 @@
+"""
+Shared test setup.
+Keeps the report cache in-process so importing the app does not create the
+shared SQLite cache file, and points the API at a throwaway SQLite database.
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault("CACHE_BACKEND", "memory")
+_DB_DIR = tempfile.mkdtemp(prefix="bus-optimizer-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}")
+
+import pytest
+from sqlalchemy import Integer
+
+
+def _adapt_metadata_for_sqlite(metadata) -> None:
+    """
+    Make the Postgres-oriented models creatable on SQLite.
+    Drops the '::date' server defaults (tests always set scanned_on) and maps
+    BIGINT surrogate keys to INTEGER so SQLite autoincrements them.
+    """
+    for table in metadata.tables.values():
+        for column in table.columns:
+            default = getattr(column.server_default, "arg", None)
+            if default is not None and "::" in str(default):
+                column.server_default = None
+            if column.primary_key and column.autoincrement is True:
+                column.type = Integer()
+
+
+@pytest.fixture(scope="session")
+def db_engine():
+    from app.core.db import Base, engine
+    import app.models  # noqa: F401  (registers every table)
+
+    _adapt_metadata_for_sqlite(Base.metadata)
+    return engine
+
+
+@pytest.fixture
+def db_session(db_engine):
+    """Fresh tables per test."""
+    from app.core.cache import clear_cache
+    from app.core.db import Base, SessionLocal
+
+    Base.metadata.drop_all(db_engine)
+    Base.metadata.create_all(db_engine)
+    clear_cache()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(db_session):
+    """TestClient without the lifespan (no backfill against the test database)."""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def employees(db_session):
+    """Buses A01 and B02 with riders 1001, 1002 (A01) and 1003 (B02)."""
+    from app.models import Bus, Employee
+
+    db_session.add_all([Bus(bus_id="A01", route="Route A"), Bus(bus_id="B02", route="Route B")])
+    db_session.add_all([
+        Employee(batch_id=1001, name="Ali", bus_id="A01"),
+        Employee(batch_id=1002, name="Siti", bus_id="A01"),
+        Employee(batch_id=1003, name="Kumar", bus_id="B02"),
+    ])
+    db_session.commit()
+
+
+@pytest.fixture
+def api_headers():
+    from app.core.config import get_api_keys_map
+
+    return {"X-API-KEY": next(iter(get_api_keys_map().values()))}
@@ -0,0 +1,223 @@
+"""
+Tests for the report cache backends (app.core.cache.TTLCache and SQLiteCache)
+and the ttl_cache decorator built on them.
+"""
+
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from app.core import cache as cache_module
+from app.core.cache import CacheScope, SQLiteCache, TTLCache, generate_cache_key, ttl_cache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(max_entries: int = 8, max_bytes: int = 0):
+        if request.param == "memory":
+            return TTLCache(max_entries=max_entries, max_bytes=max_bytes)
+        # touch_seconds=0 keeps the shared cache's LRU order exact for the assertions
+        return SQLiteCache(str(tmp_path / "cache.db"), max_entries=max_entries, max_bytes=max_bytes, touch_seconds=0)
+    return make
+
+
+@pytest.fixture
+def backend(make_cache):
+    return make_cache()
+
+
+@pytest.fixture
+def shared_cache(backend, monkeypatch):
+    """Route ttl_cache-decorated functions through the given backend."""
+    monkeypatch.setattr(cache_module, "_CACHE", backend)
+    return backend
+
+
+def _keys(cache, keys):
+    return [key for key in keys if cache.get(key)[0]]
+
+
+def _settle():
+    time.sleep(0.01)  # Distinct last_access timestamps for the SQLite backend
+
+
+def test_evicts_least_recently_used_beyond_max_entries(make_cache):
+    cache = make_cache(max_entries=3)
+    for key in ("a", "b", "c"):
+        cache.set(key, key, ttl_seconds=60)
+        _settle()
+    cache.get("a")
+    _settle()
+
+    cache.set("d", "d", ttl_seconds=60)
+
+    assert _keys(cache, "abcd") == ["a", "c", "d"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_least_recently_used_beyond_max_bytes(make_cache):
+    cache = make_cache(max_bytes=260)  # Room for two 100-character values on either backend
+    cache.set("a", "a" * 100, ttl_seconds=60)
+    _settle()
+    cache.set("b", "b" * 100, ttl_seconds=60)
+    _settle()
+    cache.get("a")
+    _settle()
+
+    cache.set("c", "c" * 100, ttl_seconds=60)
+
+    assert _keys(cache, "abc") == ["a", "c"]
+    assert cache.stats()["bytes"] <= 260
+
+
+def test_value_larger_than_the_byte_budget_is_not_cached(make_cache):
+    cache = make_cache(max_bytes=260)
+    cache.set("a", "a" * 100, ttl_seconds=60)
+
+    cache.set("huge", "h" * 1000, ttl_seconds=60)
+
+    assert _keys(cache, ["a", "huge"]) == ["a"]
+
+
+def test_invalidation_drops_only_overlapping_scopes(backend):
+    scopes = {
+        "day_a01": CacheScope(date(2026, 1, 5), date(2026, 1, 5), frozenset({"A01"})),
+        "range_all_buses": CacheScope(date(2026, 1, 1), date(2026, 1, 10), None),
+        "other_day_b02": CacheScope(date(2026, 1, 6), date(2026, 1, 6), frozenset({"B02"})),
+        "open_ended_b02": CacheScope(date(2026, 1, 7), None, frozenset({"B02"})),
+        "unscoped": None,
+    }
+
+    def reset():
+        for key, scope in scopes.items():
+            backend.set(key, key, ttl_seconds=60, scope=scope)
+
+    reset()
+    assert backend.invalidate(dates=[date(2026, 1, 5)]) == 3
+    assert _keys(backend, scopes) == ["other_day_b02", "open_ended_b02"]
+
+    reset()
+    assert backend.invalidate(bus_ids=["B02"]) == 4
+    assert _keys(backend, scopes) == ["day_a01"]
+
+    reset()
+    backend.invalidate(dates=[date(2026, 1, 5), date(2026, 2, 1)], bus_ids=["B02"])
+    assert _keys(backend, scopes) == ["day_a01", "other_day_b02"]
+
+
+def test_expired_entries_are_misses(backend):
+    backend.set("k", 1, ttl_seconds=0.05)
+    assert backend.get("k") == (True, 1)
+    time.sleep(0.1)
+    assert backend.get("k") == (False, None)
+    assert backend.stats()["expirations"] == 1
+
+
+def test_concurrent_misses_compute_once(shared_cache):
+    release = threading.Event()
+    calls = []
+
+    @ttl_cache(ttl_seconds=60)
+    def report(day: str):
+        calls.append(day)
+        release.wait(5)
+        return {"day": day}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(report(day="2026-01-05"))) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)  # Let every thread reach the cache miss
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == ["2026-01-05"]
+    assert results == [{"day": "2026-01-05"}] * 6
+
+
+def test_stale_hit_is_served_then_refreshed_in_the_background(shared_cache):
+    calls = []
+
+    @ttl_cache(ttl_seconds=0.2, stale_seconds=60)
+    def report(day: str):
+        calls.append(day)
+        return len(calls)
+
+    assert report(day="2026-01-05") == 1
+    time.sleep(0.3)
+    assert report(day="2026-01-05") == 1  # stale: served as-is, refresh scheduled
+
+    key = generate_cache_key("report", day="2026-01-05")
+    deadline = time.time() + 5
+    while shared_cache.get(key)[1][0] != 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert report(day="2026-01-05") == 2
+    assert len(calls) == 2
+
+
+def test_set_is_dropped_when_the_generation_moved(backend):
+    generation = backend.generation()
+    backend.invalidate()
+
+    backend.set("k", 1, ttl_seconds=60, generation=generation)
+    assert backend.get("k") == (False, None)
+
+    backend.set("k", 2, ttl_seconds=60, generation=backend.generation())
+    assert backend.get("k") == (True, 2)
+
+
+def test_result_computed_across_an_invalidation_is_not_cached(shared_cache):
+    computing = threading.Event()
+    invalidated = threading.Event()
+    calls = []
+    results = []
+
+    @ttl_cache(ttl_seconds=60)
+    def report(day: str):
+        calls.append(day)
+        if len(calls) == 1:
+            computing.set()
+            invalidated.wait(5)
+        return len(calls)
+
+    worker = threading.Thread(target=lambda: results.append(report(day="2026-01-05")))
+    worker.start()
+    assert computing.wait(5)
+    shared_cache.invalidate()
+    invalidated.set()
+    worker.join(5)
+
+    assert results == [1]
+    assert report(day="2026-01-05") == 2  # recomputed: the first result was never stored
+    assert report(day="2026-01-05") == 2
+
+
+def test_sqlite_hits_do_not_write_within_the_touch_interval(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), touch_seconds=60)
+    cache.set("k", {"v": 1}, ttl_seconds=60)
+    conn = cache._connection()
+    writes = conn.total_changes
+
+    for _ in range(5):
+        assert cache.get("k") == (True, {"v": 1})
+    assert cache.get("missing") == (False, None)
+
+    assert conn.total_changes == writes
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (5, 1)
+
+
+def test_sqlite_hit_touches_last_access_once_it_is_old(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), touch_seconds=60)
+    cache.set("k", 1, ttl_seconds=600)
+    conn = cache._connection()
+    conn.execute("UPDATE cache_entries SET last_access = last_access - 120")
+    (before,) = conn.execute("SELECT last_access FROM cache_entries").fetchone()
+
+    cache.get("k")
+
+    (after,) = conn.execute("SELECT last_access FROM cache_entries").fetchone()
+    assert after > before + 100
@@ -0,0 +1,106 @@
+"""
+Tests for canonical report cache keys (app.core.cache.generate_cache_key and
+the per-endpoint normalizers in app.api.report).
+"""
+
+from datetime import date
+
+from app.api.report import (
+    _HEADCOUNT_CACHE_PARAMS,
+    _OCCUPANCY_CACHE_PARAMS,
+    _SUMMARY_CACHE_PARAMS,
+    _report_cache_scope,
+)
+from app.core.cache import MAX_RAW_KEY_LENGTH, CacheScope, generate_cache_key
+
+
+def _key(normalize, name="occupancy", **params):
+    """Key the ttl_cache wrapper builds for a request with these query params."""
+    return generate_cache_key(name, **normalize(params))
+
+
+def test_reordered_comma_separated_filters_share_a_key():
+    a = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", bus_id="A01,B02", shift="night,morning", plant="P1,BK")
+    b = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", bus_id="B02,A01", shift="morning,night", plant="BK,P1")
+    assert a == b
+
+
+def test_duplicate_and_empty_filter_entries_are_dropped():
+    a = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", bus_id="A01,,A01")
+    b = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", bus_id="A01")
+    assert a == b
+
+
+def test_single_date_matches_equal_date_range():
+    single = _key(_HEADCOUNT_CACHE_PARAMS, "headcount", date="2026-01-05", bus_id="A01")
+    ranged = _key(_HEADCOUNT_CACHE_PARAMS, "headcount", date_from="2026-01-05", date_to="2026-01-05", bus_id="A01")
+    assert single == ranged
+
+
+def test_unset_and_empty_params_share_a_key():
+    a = _key(_SUMMARY_CACHE_PARAMS, "get_summary", date_from="2026-01-01", route=None, direction="in")
+    b = _key(_SUMMARY_CACHE_PARAMS, "get_summary", date_from="2026-01-01", route="")
+    assert a == b
+
+
+def test_plant_ids_fold_case_and_whitespace():
+    a = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", plant=" p1 , bk")
+    b = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", plant="BK,P1")
+    assert a == b
+
+
+def test_bus_ids_fold_whitespace_but_keep_case():
+    # Bus ids are matched exactly by the report queries, so "a01" is a different request
+    spaced = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", bus_id=" A01 , B02 ")
+    plain = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", bus_id="A01,B02")
+    lower = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", bus_id="a01,b02")
+    assert spaced == plain
+    assert lower != plain
+
+
+def test_routes_fold_case():
+    a = _key(_HEADCOUNT_CACHE_PARAMS, "headcount", date="2026-01-05", route=" Route-A ")
+    b = _key(_HEADCOUNT_CACHE_PARAMS, "headcount", date="2026-01-05", route="route-a")
+    assert a == b
+
+
+def test_different_filters_get_different_keys():
+    a = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", bus_id="A01")
+    b = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-06", bus_id="A01")
+    c = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", bus_id="A01,B02")
+    assert len({a, b, c}) == 3
+
+
+def test_values_containing_separators_do_not_collide():
+    a = generate_cache_key("f", route="a|b")
+    b = generate_cache_key("f", route="a", shift="b")
+    assert a != b
+
+
+def test_short_keys_stay_readable():
+    key = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", bus_id="A01")
+    assert len(key) <= MAX_RAW_KEY_LENGTH
+    assert "A01" in key and "2026-01-05" in key
+
+
+def test_long_keys_are_hashed():
+    bus_ids = ",".join(f"B{i:03d}" for i in range(100))
+    key = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", bus_id=bus_ids)
+    other = _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-06", bus_id=bus_ids)
+    assert key.startswith("occupancy:")
+    assert len(key) <= MAX_RAW_KEY_LENGTH
+    assert key != other
+    assert key == _key(_OCCUPANCY_CACHE_PARAMS, date="2026-01-05", bus_id=",".join(reversed(bus_ids.split(","))))
+
+
+def test_report_scope_uses_date_range_and_bus_ids():
+    scope = _report_cache_scope({"date": "2026-01-05", "bus_id": "A01, B02"})
+    assert scope == CacheScope(date(2026, 1, 5), date(2026, 1, 5), frozenset({"A01", "B02"}))
+    assert scope.matches(frozenset({date(2026, 1, 5)}), frozenset({"B02"}))
+    assert not scope.matches(frozenset({date(2026, 1, 6)}), None)
+
+
+def test_report_scope_widens_for_previous_period():
+    scope = _report_cache_scope({"date_from": "2026-01-08", "date_to": "2026-01-14", "include_previous": True})
+    assert scope.date_from == date(2026, 1, 1)
+    assert scope.date_to == date(2026, 1, 14)
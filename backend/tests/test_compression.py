@@ -0,0 +1,51 @@
+"""
+Tests for gzip request bodies (app.core.compression).
+"""
+
+import gzip
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.compression import decompress_gzip
+
+BODY = json.dumps({"scans": [{"id": 1, "batch_id": 1001, "scan_time": "2025-03-04T07:30:00"}]}).encode()
+
+
+def _status(body: bytes, **kwargs) -> int:
+    with pytest.raises(HTTPException) as excinfo:
+        decompress_gzip(body, **kwargs)
+    return excinfo.value.status_code
+
+
+def test_round_trip():
+    assert decompress_gzip(gzip.compress(BODY)) == BODY
+
+
+def test_truncated_stream_is_rejected():
+    compressed = gzip.compress(BODY)
+    assert _status(compressed[:-4]) == 400  # Missing the trailing size field
+    assert _status(compressed[: len(compressed) // 2]) == 400
+
+
+def test_trailing_bytes_are_rejected():
+    assert _status(gzip.compress(BODY) + b"garbage") == 400
+
+
+def test_corrupt_stream_is_rejected():
+    assert _status(b"not gzip at all") == 400
+
+
+def test_oversized_body_is_rejected():
+    assert _status(gzip.compress(BODY), max_size=16) == 413
+
+
+def test_gzip_upload_round_trip(client, api_headers, employees):
+    headers = {**api_headers, "Content-Encoding": "gzip", "Content-Type": "application/json"}
+    compressed = gzip.compress(BODY)
+
+    assert client.post("/api/bus/upload-scans", content=compressed, headers=headers).json() == {"success_ids": [1]}
+    truncated = client.post("/api/bus/upload-scans", content=compressed[:-4], headers=headers)
+    assert truncated.status_code == 400
+    assert truncated.json()["detail"] == "Invalid gzip request body"
@@ -0,0 +1,393 @@
+"""
+Tests for the spreadsheet upload helpers in app.core.excel.
+"""
+
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from io import BytesIO
+from itertools import count
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from app.core import excel
+from app.core.excel import (
+    DATE_FORMATS,
+    HEADER_SCAN_ROWS,
+    TIME_FORMATS,
+    DateCoercer,
+    RowView,
+    TimeCoercer,
+    _count_valid_sample_rows,
+    _find_header_row,
+    _header_index,
+    _SheetScanner,
+    _sniff_delimiter,
+    iter_chunks,
+    read_table_from_best_sheet,
+    stream_table_from_best_sheet,
+    upload_format,
+)
+from tests.workbooks import ATTENDANCE_SHEET_OPTIONS, CORPUS, offset_header_workbook
+
+
+@pytest.mark.parametrize(
+    "total, size, expected_sizes",
+    [
+        (0, 3, []),
+        (1, 3, [1]),
+        (3, 3, [3]),
+        (6, 3, [3, 3]),
+        (7, 3, [3, 3, 1]),
+        (5, 1, [1, 1, 1, 1, 1]),
+        (2, 10, [2]),
+    ],
+)
+def test_iter_chunks_boundaries(total, size, expected_sizes):
+    chunks = list(iter_chunks(range(total), size))
+    assert [len(chunk) for chunk in chunks] == expected_sizes
+    assert [item for chunk in chunks for item in chunk] == list(range(total))
+
+
+def test_iter_chunks_is_lazy():
+    chunks = iter_chunks(count(), 4)
+    assert next(chunks) == [0, 1, 2, 3]
+    assert next(chunks) == [4, 5, 6, 7]
+
+
+def test_streamed_rows_match_chunked_rows():
+    data = offset_header_workbook()
+    expected = read_table_from_best_sheet(data, **ATTENDANCE_SHEET_OPTIONS).rows
+    stream = stream_table_from_best_sheet(data, **ATTENDANCE_SHEET_OPTIONS)
+    chunks = list(iter_chunks(stream.rows, 2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    chunked = [row for chunk in chunks for row in chunk]
+    assert [row.row_number for row in chunked] == [row.row_number for row in expected] == [5, 6, 8]
+    assert [dict(row.values) for row in chunked] == [dict(row.values) for row in expected]
+
+
+def test_row_view_maps_headers_onto_row():
+    index = {"personid": 0, "name": 1, "route": 3}
+    view = RowView((1001, "Aina", None), index)
+    assert view["personid"] == 1001
+    assert view["route"] is None  # Short rows read as empty cells
+    assert view.get("missing") is None
+    assert "name" in view and "missing" not in view
+    assert dict(view) == {"personid": 1001, "name": "Aina", "route": None}
+
+
+def test_sheet_scanner_serves_each_row_once():
+    rows = [(i,) for i in range(1, 11)]
+    scanner = _SheetScanner(iter(rows))
+    assert scanner.leading_rows(4) == rows[:4]
+    assert scanner.leading_rows(2) == rows[:2]
+    assert list(scanner.rows_from(3)) == list(enumerate(rows, start=1))[2:]
+
+
+def test_sheet_scanner_sheet_shorter_than_scan_window():
+    rows = [(i,) for i in range(1, 4)]
+    scanner = _SheetScanner(iter(rows))
+    assert scanner.leading_rows(HEADER_SCAN_ROWS) == rows
+    assert list(scanner.rows_from(2)) == [(2, (2,)), (3, (3,))]
+    assert list(_SheetScanner(iter(rows)).rows_from(5)) == []
+
+
+def test_sheet_scanner_starts_past_buffered_rows():
+    rows = [(i,) for i in range(1, 8)]
+    scanner = _SheetScanner(iter(rows))
+    scanner.leading_rows(2)
+    assert list(scanner.rows_from(5)) == [(5, (5,)), (6, (6,)), (7, (7,))]
+
+
+def _baseline_best_sheet(data: bytes, options: dict):
+    """Sheet selection as before single-pass scanning: each sheet is re-read for header and sample rows."""
+    wb = load_workbook(filename=BytesIO(data), read_only=True, data_only=True)
+    try:
+        best = None
+        for ws in wb.worksheets:
+            title = ws.title.strip().lower()
+            if any(title.startswith(prefix) for prefix in options["sheet_name_exclude_prefixes"]):
+                continue
+            header = _find_header_row(
+                list(ws.iter_rows(min_row=1, max_row=HEADER_SCAN_ROWS, values_only=True)),
+                must_include=options["must_include"],
+                prefer_include=options["prefer_include"],
+                min_prefer_matches=options["min_prefer_matches"],
+            )
+            if header is None:
+                continue
+            header_row_idx, headers, score = header
+            sample = list(ws.iter_rows(
+                min_row=header_row_idx + 1,
+                max_row=header_row_idx + options["sample_size"],
+                values_only=True,
+            ))
+            sample_valid = _count_valid_sample_rows(sample, headers, options["required_non_empty_in_sample"])
+            if sample_valid < options["min_valid_sample_rows"]:
+                continue
+            score += sample_valid * 100
+            if best is None or score > best[2]:
+                index = _header_index(headers)
+                rows = [
+                    (row_idx, dict(RowView(row, index)))
+                    for row_idx, row in enumerate(ws.iter_rows(min_row=header_row_idx + 1, values_only=True), start=header_row_idx + 1)
+                    if row and not all(v is None or str(v).strip() == "" for v in row)
+                ]
+                best = (ws.title, header_row_idx, score, rows)
+        return best
+    finally:
+        wb.close()
+
+
+def _random_workbook(seed: int) -> bytes:
+    rng = random.Random(seed)
+    headers = ["PersonId", "Date", "Time In", "Shift", "Route", "DayType", "Name"]
+    wb = Workbook()
+    wb.remove(wb.active)
+    for sheet_number in range(rng.randint(1, 4)):
+        ws = wb.create_sheet(rng.choice(["Sheet", "Notes", "Data", "Export"]) + str(sheet_number))
+        header_row = rng.randint(1, HEADER_SCAN_ROWS + 5)
+        for row_number in range(1, header_row):
+            if rng.random() < 0.3:
+                ws.cell(row=row_number, column=1, value=rng.choice(["Report", "PersonId", None]))
+        columns = rng.sample(headers, rng.randint(1, len(headers)))
+        for col, header in enumerate(columns, start=1):
+            ws.cell(row=header_row, column=col, value=header)
+        for row_number in range(header_row + 1, header_row + rng.randint(0, 40)):
+            for col, header in enumerate(columns, start=1):
+                if rng.random() < 0.15:
+                    continue
+                value = rng.randint(1, 5000) if header == "PersonId" else f"{header}-{rng.randint(1, 9)}"
+                ws.cell(row=row_number, column=col, value=value)
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("data", [CORPUS[name]() for name in sorted(CORPUS)] + [_random_workbook(seed) for seed in range(30)])
+def test_single_pass_selects_baseline_sheet(data, monkeypatch):
+    from app.core.config import get_settings
+
+    monkeypatch.setattr(get_settings(), "excel_reader", "openpyxl")
+    expected = _baseline_best_sheet(data, ATTENDANCE_SHEET_OPTIONS)
+    stream = stream_table_from_best_sheet(data, **ATTENDANCE_SHEET_OPTIONS)
+    if expected is None:
+        assert stream is None
+        return
+    sheet_name, header_row_number, _score, rows = expected
+    assert (stream.sheet_name, stream.header_row_number) == (sheet_name, header_row_number)
+    assert [(row.row_number, dict(row.values)) for row in stream.rows] == rows
+
+
+CSV_ROWS = [
+    ["PersonId", "Name", "Date", "Time In", "Route"],
+    ["1001", "Aina", "05/01/2026", "07:30 AM", "Route-A13"],
+    ["1002", "Ren\u00e9e", "05/01/2026", "", "Route-B02, via Gate 2"],
+]
+
+
+def _delimited(delimiter: str, encoding: str = "utf-8", bom: bool = False) -> bytes:
+    def field(value: str) -> str:
+        return f'"{value}"' if delimiter in value or "," in value else value
+
+    text = "\r\n".join(delimiter.join(field(value) for value in row) for row in CSV_ROWS) + "\r\n"
+    return (b"\xef\xbb\xbf" if bom else b"") + text.encode(encoding)
+
+
+def _read_csv(data: bytes, file_format: str = "csv"):
+    stream = stream_table_from_best_sheet(data, file_format=file_format, **ATTENDANCE_SHEET_OPTIONS)
+    assert stream is not None
+    return stream, [dict(row.values) for row in stream.rows]
+
+
+@pytest.mark.parametrize("delimiter", [",", ";", "\t"])
+def test_sniff_delimiter(delimiter):
+    assert _sniff_delimiter(_delimited(delimiter)) == delimiter
+
+
+def test_sniff_delimiter_ignores_truncated_last_line():
+    data = _delimited(";")
+    assert _sniff_delimiter(data[: len(data) - 8]) == ";"
+
+
+def test_sniff_delimiter_defaults_to_comma():
+    assert _sniff_delimiter(b"PersonId\r\n1001\r\n") == ","
+
+
+@pytest.mark.parametrize("delimiter", [",", ";", "\t"])
+def test_csv_upload_reads_any_delimiter(delimiter):
+    stream, rows = _read_csv(_delimited(delimiter))
+    assert stream.sheet_name == "CSV"
+    assert stream.header_row_number == 1
+    assert rows[0] == {"personid": "1001", "name": "Aina", "date": "05/01/2026", "timein": "07:30 AM", "route": "Route-A13"}
+    assert rows[1]["timein"] is None  # Empty fields read as empty cells
+    assert rows[1]["route"] == "Route-B02, via Gate 2"
+
+
+def test_tsv_upload_always_splits_on_tabs():
+    stream, rows = _read_csv(_delimited("\t"), file_format="tsv")
+    assert stream.sheet_name == "TSV"
+    assert rows[0]["personid"] == "1001"
+
+
+def test_csv_upload_strips_utf8_bom():
+    stream, rows = _read_csv(_delimited(",", bom=True))
+    assert stream.headers[0] == "personid"
+    assert rows[1]["name"] == "Ren\u00e9e"
+
+
+def test_csv_upload_falls_back_to_cp1252():
+    data = _delimited(";", encoding="cp1252")
+    with pytest.raises(UnicodeDecodeError):
+        data.decode("utf-8")
+    _stream, rows = _read_csv(data)
+    assert rows[1]["name"] == "Ren\u00e9e"
+
+
+def test_csv_encoding_is_sniffed_from_a_prefix(monkeypatch):
+    assert not excel._is_utf8(_delimited(",", encoding="cp1252"))
+    data = _delimited(",")
+    split_at = data.index("\u00e9".encode("utf-8")) + 1  # Inside the two-byte "é"
+    monkeypatch.setattr(excel, "CSV_SNIFF_BYTES", split_at)
+    assert excel._is_utf8(data)
+    assert not excel._is_utf8(data[:split_at])  # Whole file truncated mid-character
+    # Only the prefix decides; later bytes that are not UTF-8 are replaced, not rejected
+    assert excel._is_utf8(data[:split_at - 1] + b"\xe9 trailing cp1252")
+
+
+@pytest.mark.parametrize(
+    "filename, expected",
+    [("list.xlsx", "xlsx"), ("LIST.CSV", "csv"), ("scans.tsv", "tsv"), ("old.xls", None), ("", None), (None, None)],
+)
+def test_upload_format(filename, expected):
+    assert upload_format(filename) == expected
+
+
+def _reference_coerce_date(value):
+    """Uncached coercion trying every format in priority order, as before format learning."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    if not text:
+        return None
+    text = re.sub(r"\s*\(.*\)\s*$", "", text)
+    text = re.sub(r"^[A-Za-z]{3,9}-", "", text).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _reference_coerce_time(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.time()
+    if isinstance(value, time):
+        return value
+    text = str(value).strip()
+    if not text or text == ".":
+        return None
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(text.upper(), fmt).time()
+        except ValueError:
+            continue
+    return None
+
+
+def test_learned_date_format_falls_back_to_full_list():
+    coerce = DateCoercer()
+    assert coerce("2026-01-05") == date(2026, 1, 5)
+    assert coerce("2026-01-06") == date(2026, 1, 6)
+    # Neither matches the learned %Y-%m-%d; later formats are still tried
+    assert coerce("31/12/2026") == date(2026, 12, 31)
+    assert coerce("12/31/2026") == date(2026, 12, 31)
+    assert coerce("2026/02/03") == date(2026, 2, 3)
+    assert coerce("not a date") is None
+
+
+def test_learned_month_first_keeps_day_first_priority():
+    coerce = DateCoercer()
+    assert coerce("12/31/2026") == date(2026, 12, 31)  # Only %m/%d/%Y matches
+    # Ambiguous text still resolves day-first, as %d/%m/%Y ranks higher
+    assert coerce("01/02/2026") == date(2026, 2, 1)
+
+
+def test_learned_time_format_falls_back_to_full_list():
+    coerce = TimeCoercer()
+    assert coerce("07:30 AM") == time(7, 30)
+    assert coerce("19:05") == time(19, 5)
+    assert coerce("07:30:15pm") == time(19, 30, 15)
+    assert coerce(".") is None
+    assert coerce("25:00") is None
+
+
+def test_repeated_values_are_parsed_once(monkeypatch):
+    coerce = DateCoercer()
+    calls = []
+    original = coerce._learner._prepare
+    monkeypatch.setattr(coerce._learner, "_prepare", lambda text: calls.append(text) or original(text))
+    for _ in range(3):
+        assert coerce("Tue-24/12/2024") == date(2024, 12, 24)
+    assert calls == ["Tue-24/12/2024"]
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(excel, "COERCE_CACHE_SIZE", 8)
+    coerce = DateCoercer()
+    for day in range(1, 29):
+        assert coerce(f"2026-02-{day:02d}") == date(2026, 2, day)
+    assert len(coerce._learner._cache) <= 8
+
+
+def _random_date_value(rng: random.Random):
+    day = date(2020, 1, 1) + timedelta(days=rng.randint(0, 2500))
+    fmt = rng.choice(["%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y", "%Y/%m/%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%d.%m.%Y", "%b %d %Y"])
+    text = day.strftime(fmt)
+    roll = rng.random()
+    if roll < 0.1:
+        text += f" ({day.strftime('%a')})"
+    elif roll < 0.2:
+        text = f"{day.strftime('%a')}-{text}"
+    elif roll < 0.25:
+        text = f"  {text} "
+    return rng.choice([text, text, text, None, "", "n/a", day, datetime(2024, 1, 2, 3, 4), 45000, 3.5])
+
+
+def _random_time_value(rng: random.Random):
+    value = time(rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59))
+    text = value.strftime(rng.choice(["%I:%M %p", "%I:%M%p", "%I:%M:%S %p", "%I:%M:%S%p", "%H:%M", "%H:%M:%S", "%H.%M"]))
+    return rng.choice([text, text.lower(), text, ".", "", None, value, datetime(2024, 1, 1, 7, 30), "25:00"])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_coercers_match_uncached_reference(seed):
+    rng = random.Random(seed)
+    coerce_date, coerce_time = DateCoercer(), TimeCoercer()
+    # Columns dominated by one format with stray values mixed in, repeated to exercise the cache
+    values = [(_random_date_value(rng), _random_time_value(rng)) for _ in range(150)]
+    for date_value, time_value in values + rng.sample(values, 50):
+        assert coerce_date(date_value) == _reference_coerce_date(date_value), date_value
+        assert coerce_time(time_value) == _reference_coerce_time(time_value), time_value
+        assert excel.coerce_date(date_value) == _reference_coerce_date(date_value), date_value
+        assert excel.coerce_time(time_value) == _reference_coerce_time(time_value), time_value
+
+
+def test_module_level_coercion_is_safe_across_threads():
+    rng = random.Random(7)
+    dates = [_random_date_value(rng) for _ in range(400)]
+    times = [_random_time_value(rng) for _ in range(400)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        coerced_dates = list(pool.map(excel.coerce_date, dates))
+        coerced_times = list(pool.map(excel.coerce_time, times))
+    assert coerced_dates == [_reference_coerce_date(value) for value in dates]
+    assert coerced_times == [_reference_coerce_time(value) for value in times]
@@ -0,0 +1,98 @@
+"""
+Parity tests for the openpyxl and python-calamine workbook readers: both must
+select the same sheet and header row and yield values that coerce identically.
+"""
+
+from datetime import date, time
+
+import pytest
+
+from app.core import excel
+from app.core.config import get_settings
+from app.core.excel import DateCoercer, TimeCoercer, coerce_int, stream_table_from_best_sheet
+from tests.workbooks import ATTENDANCE_SHEET_OPTIONS, CORPUS
+
+requires_calamine = pytest.mark.skipif(excel.CalamineWorkbook is None, reason="python-calamine is not installed")
+
+READERS = ["openpyxl", pytest.param("calamine", marks=requires_calamine)]
+
+
+@pytest.fixture(params=READERS)
+def excel_reader(request, monkeypatch):
+    monkeypatch.setattr(get_settings(), "excel_reader", request.param)
+    return request.param
+
+
+def _read(data: bytes) -> dict:
+    stream = stream_table_from_best_sheet(data, **ATTENDANCE_SHEET_OPTIONS)
+    assert stream is not None
+    coerce_scan_date = DateCoercer()
+    coerce_time_in = TimeCoercer()
+    rows = [
+        (
+            row.row_number,
+            coerce_int(row.values.get("personid")),
+            coerce_scan_date(row.values.get("date")),
+            coerce_time_in(row.values.get("timein")),
+            row.values.get("route"),
+        )
+        for row in stream.rows
+    ]
+    return {
+        "sheet_name": stream.sheet_name,
+        "header_row_number": stream.header_row_number,
+        "headers": [header for header in stream.headers if header],
+        "rows": rows,
+    }
+
+
+def test_reader_setting_selects_backend(excel_reader):
+    reader = excel._open_workbook(CORPUS["offset_header"]())
+    try:
+        assert reader.name == excel_reader
+    finally:
+        reader.close()
+
+
+def test_offset_header(excel_reader):
+    table = _read(CORPUS["offset_header"]())
+    assert table["sheet_name"] == "Attendance"
+    assert table["header_row_number"] == 4
+    assert table["headers"] == ["personid", "name", "date", "timein", "route"]
+    assert table["rows"] == [
+        (5, 1001, date(2026, 1, 5), time(7, 30), "Route-A13"),
+        (6, 1002, date(2026, 1, 5), time(19, 5), "Route-B02"),
+        (8, 1003, date(2026, 1, 5), None, "Route-A13"),
+    ]
+
+
+def test_multi_sheet_selection(excel_reader):
+    table = _read(CORPUS["multi_sheet"]())
+    # Notes is excluded by name, Summary lacks PersonId, Old format matches fewer
+    # preferred headers and Blank ids has no PersonId values in its sample
+    assert table["sheet_name"] == "Attendance"
+    assert table["header_row_number"] == 1
+    assert [row[1] for row in table["rows"]] == [1001, 1002]
+
+
+def test_date_and_time_cells(excel_reader):
+    table = _read(CORPUS["date_cells"]())
+    assert table["rows"] == [
+        (2, 1001, date(2026, 1, 5), time(7, 30), None),
+        (3, 1002, date(2026, 1, 6), time(19, 5), None),
+        (4, 1003, date(2026, 1, 7), time(7, 30), None),
+        (5, 1004, None, time(7, 45), None),
+        (6, 1005, date(2026, 1, 7), time(18, 20), None),
+        (7, 1006, date(2026, 1, 9), time(0, 0), None),
+    ]
+
+
+@requires_calamine
+@pytest.mark.parametrize("workbook", sorted(CORPUS))
+def test_readers_agree(workbook, monkeypatch):
+    data = CORPUS[workbook]()
+    results = {}
+    for reader in ("openpyxl", "calamine"):
+        monkeypatch.setattr(get_settings(), "excel_reader", reader)
+        results[reader] = _read(data)
+    assert results["openpyxl"] == results["calamine"]
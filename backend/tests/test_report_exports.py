@@ -0,0 +1,191 @@
+"""
+Endpoint tests for the streamed report exports (CSV, Parquet, Arrow) and the
+keyset-paginated /api/report/unknown-attendances listing, against SQLite.
+"""
+
+import base64
+import csv
+import io
+from datetime import date, datetime
+
+import pytest
+
+from app.api import report as report_api
+from app.models import UnknownAttendance
+
+DAYS = [date(2025, 3, 4), date(2025, 3, 5)]
+
+
+@pytest.fixture
+def scans(client, api_headers, employees, monkeypatch):
+    """Twelve attendance rows over two days and both shifts; exports stream them in several chunks."""
+    monkeypatch.setattr(report_api, "EXPORT_CHUNK_ROWS", 5)
+    monkeypatch.setattr(report_api, "EXPORT_COLUMNAR_BATCH_ROWS", 5)
+    payload = []
+    for day in DAYS:
+        for hour in (7, 18):
+            for minute, batch_id in enumerate((1001, 1002, 1003)):
+                payload.append({
+                    "id": len(payload) + 1,
+                    "batch_id": batch_id,
+                    "scan_time": f"{day.isoformat()}T{hour:02d}:{minute:02d}:00",
+                })
+    response = client.post("/api/bus/upload-scans", json={"scans": payload}, headers=api_headers)
+    assert len(response.json()["success_ids"]) == 12
+
+
+def _csv_rows(response) -> list[dict]:
+    assert response.status_code == 200
+    return list(csv.DictReader(io.StringIO(response.text)))
+
+
+def _text(value) -> str:
+    """Render a JSON/Arrow value the way the CSV export writes it."""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None).isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def test_attendance_csv_export_matches_json(client, scans):
+    for day in DAYS:
+        records = client.get("/api/report/attendance", params={"date": day.isoformat()}).json()
+        exported = _csv_rows(client.get("/api/report/attendance/export", params={"date": day.isoformat()}))
+
+        assert len(exported) == 6
+        assert exported == [
+            {
+                "scanned_at": record["scanned_at"],
+                "batch_id": _text(record["batch_id"]),
+                "employee_name": _text(record["employee_name"]),
+                "bus_id": _text(record["bus_id"]),
+                "van_id": _text(record["van_id"]),
+                "shift": record["shift"],
+                "status": record["status"],
+                "source": _text(record["source"]),
+            }
+            for record in records
+        ]
+
+
+def test_headcount_csv_export_matches_json(client, scans):
+    params = {"date_from": DAYS[0].isoformat(), "date_to": DAYS[-1].isoformat()}
+    rows = client.get("/api/report/headcount", params=params).json()["rows"]
+    exported = _csv_rows(client.get("/api/report/headcount/export", params=params))
+
+    assert len(exported) == 8
+    assert exported == [{key: _text(value) for key, value in row.items()} for row in rows]
+
+
+@pytest.mark.parametrize("export_format", ["parquet", "arrow"])
+def test_columnar_range_export_matches_csv(client, scans, export_format):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    params = {"date_from": DAYS[0].isoformat(), "date_to": DAYS[-1].isoformat()}
+    csv_rows = _csv_rows(client.get("/api/report/attendance/export/range", params=params))
+    response = client.get("/api/report/attendance/export/range", params={**params, "format": export_format})
+
+    assert response.status_code == 200
+    if export_format == "parquet":
+        table = pq.read_table(io.BytesIO(response.content))
+    else:
+        table = pa.ipc.open_stream(io.BytesIO(response.content)).read_all()
+    assert table.column_names == list(csv_rows[0])
+    assert [{key: _text(value) for key, value in row.items()} for row in table.to_pylist()] == csv_rows
+
+
+def test_range_csv_export_covers_every_day_once(client, scans):
+    params = {"date_from": DAYS[0].isoformat(), "date_to": DAYS[-1].isoformat()}
+    exported = _csv_rows(client.get("/api/report/attendance/export/range", params=params))
+
+    expected = sorted(
+        (day.isoformat(), record["scanned_at"], _text(record["batch_id"]))
+        for day in DAYS
+        for record in client.get("/api/report/attendance", params={"date": day.isoformat()}).json()
+    )
+    assert [(row["scanned_on"], row["scanned_at"], row["batch_id"]) for row in exported] == expected
+
+
+@pytest.fixture
+def unknown_attendances(db_session):
+    rows = [
+        UnknownAttendance(
+            scanned_batch_id=batch_id,
+            route_raw=f"Route X{batch_id % 3}",
+            shift="morning" if batch_id % 2 else "night",
+            scanned_at=datetime(day.year, day.month, day.day, 7, 0),
+            scanned_on=day,
+            source="upload.xlsx",
+        )
+        for day in DAYS
+        for batch_id in (9001, 9002, 9003, 9004)
+    ]
+    db_session.add_all(rows)
+    db_session.commit()
+    return rows
+
+
+def _unknown_page(client, **params) -> dict:
+    response = client.get("/api/report/unknown-attendances", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_unknown_attendance_cursor_pages_cover_every_row_once(client, db_session, unknown_attendances):
+    expected = [record["id"] for record in _unknown_page(client, limit=1000)["records"]]
+
+    page = _unknown_page(client, limit=3)
+    seen = [record["id"] for record in page["records"]]
+    # A row sorting before the cursor arrives between pages; keyset pages neither repeat nor skip
+    db_session.add(UnknownAttendance(
+        scanned_batch_id=9000, shift="morning", scanned_at=datetime(2025, 3, 6, 7, 0), scanned_on=date(2025, 3, 6),
+    ))
+    db_session.commit()
+    while page["next_cursor"]:
+        page = _unknown_page(client, limit=3, cursor=page["next_cursor"])
+        seen.extend(record["id"] for record in page["records"])
+
+    assert len(expected) == 8
+    assert seen == expected
+
+
+def test_unknown_attendance_cursor_matches_offset_pages(client, unknown_attendances):
+    first = _unknown_page(client, limit=3)
+    by_cursor = _unknown_page(client, limit=3, cursor=first["next_cursor"])
+    by_offset = _unknown_page(client, limit=3, offset=3)
+
+    assert by_cursor["records"] == by_offset["records"]
+    assert by_cursor["offset"] == 0
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    base64.urlsafe_b64encode(b'["2025-03-04"]').decode(),
+    base64.urlsafe_b64encode(b'[1, 2, 3]').decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_invalid_cursor_is_rejected(client, unknown_attendances, cursor):
+    response = client.get("/api/report/unknown-attendances", params={"cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_count_modes(client, unknown_attendances):
+    exact = _unknown_page(client, limit=2, count="exact")
+    assert (exact["count_mode"], exact["total_count"]) == ("exact", 8)
+
+    # No planner estimate outside Postgres; falls back to an exact count
+    estimate = _unknown_page(client, limit=2, count="estimate", date_from=DAYS[1].isoformat())
+    assert (estimate["count_mode"], estimate["total_count"]) == ("exact", 4)
+
+    none = _unknown_page(client, limit=2, count="none")
+    assert (none["count_mode"], none["total_count"]) == ("none", None)
+    assert len(none["records"]) == 2 and none["next_cursor"]
+
+    response = client.get("/api/report/unknown-attendances", params={"count": "approximate"})
+    assert response.status_code == 400
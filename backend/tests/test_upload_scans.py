@@ -0,0 +1,134 @@
+"""
+Tests for /api/bus/upload-scans against a SQLite database: acknowledgement of
+stored scans and the daily_occupancy rollup they feed.
+"""
+
+from datetime import date, timedelta
+
+from app.api import bus as bus_api
+from app.core.db import SessionLocal
+from app.core.rollups import refresh_daily_occupancy
+from app.models import Attendance, DailyOccupancy, Employee, Van
+from app.schemas.bus import UploadScansRequest
+
+UPLOAD_URL = "/api/bus/upload-scans"
+SCAN_DAY = date(2025, 3, 4)
+
+
+def _scan(scan_id: int, batch_id: int, clock: str = "07:30:00", day: date = SCAN_DAY) -> dict:
+    return {"id": scan_id, "batch_id": batch_id, "scan_time": f"{day.isoformat()}T{clock}"}
+
+
+def _occupancy(db) -> dict:
+    db.rollback()
+    return {
+        (row.scanned_on, row.shift, row.bus_id): (row.bus_present, row.van_present, row.total_present, row.total_scans)
+        for row in db.query(DailyOccupancy).all()
+    }
+
+
+def _recomputed_occupancy(db, dates) -> dict:
+    refresh_daily_occupancy(db, dates)
+    db.commit()
+    return _occupancy(db)
+
+
+def test_concurrently_stored_scan_is_acknowledged_but_counted_once(client, api_headers, db_session, employees, monkeypatch):
+    # Another upload of the same scan commits between this upload's dedupe lookup and its insert
+    original_insert = bus_api._insert_attendance_rows
+    raced = []
+
+    def insert_after_concurrent_upload(db, rows_by_key):
+        if not raced:
+            raced.append(True)
+            other = SessionLocal()
+            try:
+                bus_api.upload_scans(UploadScansRequest(scans=[_scan(99, 1001)]), "ENTRY_GATE", db=other)
+            finally:
+                other.close()
+        return original_insert(db, rows_by_key)
+
+    monkeypatch.setattr(bus_api, "_insert_attendance_rows", insert_after_concurrent_upload)
+
+    response = client.post(UPLOAD_URL, json={"scans": [_scan(1, 1001), _scan(2, 1002)]}, headers=api_headers)
+
+    assert response.status_code == 200
+    assert response.json()["success_ids"] == [1, 2]
+    assert db_session.query(Attendance).count() == 2
+    occupancy = _occupancy(db_session)
+    assert occupancy[(SCAN_DAY, "morning", "A01")][2] == 2
+    assert occupancy == _recomputed_occupancy(db_session, [SCAN_DAY])
+
+
+def test_duplicate_scans_in_one_batch_store_one_row(client, api_headers, db_session, employees):
+    scans = [_scan(1, 1001, "07:30:00"), _scan(2, 1001, "07:31:00"), _scan(3, 1001, "17:00:00")]
+
+    response = client.post(UPLOAD_URL, json={"scans": scans}, headers=api_headers)
+
+    assert response.json()["success_ids"] == [1, 2, 3]
+    stored = db_session.query(Attendance.shift, Attendance.scanned_at).order_by(Attendance.shift).all()
+    assert [(shift, scanned_at.minute) for shift, scanned_at in stored] == [("morning", 30), ("night", 0)]
+
+
+def test_rows_stored_by_an_earlier_request_are_acknowledged_not_duplicated(client, api_headers, db_session, employees):
+    client.post(UPLOAD_URL, json={"scans": [_scan(1, 1001)]}, headers=api_headers)
+
+    response = client.post(UPLOAD_URL, json={"scans": [_scan(2, 1001, "08:00:00"), _scan(3, 1002)]}, headers=api_headers)
+
+    assert response.json()["success_ids"] == [2, 3]
+    assert db_session.query(Attendance).count() == 2
+    assert _occupancy(db_session)[(SCAN_DAY, "morning", "A01")][2] == 2
+
+
+def test_unknown_batch_ids_are_acknowledged_without_a_row(client, api_headers, db_session, employees):
+    response = client.post(UPLOAD_URL, json={"scans": [_scan(1, 4242), _scan(2, 1001)]}, headers=api_headers)
+
+    assert response.json()["success_ids"] == [1, 2]
+    assert db_session.query(Attendance).count() == 1
+
+
+def test_bulk_failure_falls_back_to_row_by_row_and_withholds_only_the_bad_row(client, api_headers, db_session, employees, monkeypatch):
+    original_insert = bus_api._insert_attendance_rows
+
+    def insert_with_one_unstorable_row(db, rows_by_key):
+        for key, row in rows_by_key.items():
+            if key[0] == 1002:
+                row["status"] = None  # NOT NULL violation that is not a duplicate
+        return original_insert(db, rows_by_key)
+
+    monkeypatch.setattr(bus_api, "_insert_attendance_rows", insert_with_one_unstorable_row)
+
+    scans = [_scan(1, 1001), _scan(2, 1002), _scan(3, 1003), _scan(4, 1002, "07:45:00")]
+    response = client.post(UPLOAD_URL, json={"scans": scans}, headers=api_headers)
+
+    assert response.status_code == 200
+    assert response.json()["success_ids"] == [1, 3]
+    assert sorted(batch_id for (batch_id,) in db_session.query(Attendance.scanned_batch_id)) == [1001, 1003]
+    assert _occupancy(db_session) == _recomputed_occupancy(db_session, [SCAN_DAY])
+
+
+def test_rollup_matches_recompute_after_upload_and_delete_by_date(client, api_headers, db_session, employees):
+    van = Van(van_code="V01", bus_id="B02")
+    db_session.add(van)
+    db_session.flush()
+    db_session.add(Employee(batch_id=1004, name="Mei", bus_id="B02", van_id=van.id))
+    db_session.commit()
+    next_day = SCAN_DAY + timedelta(days=1)
+    scans = [
+        _scan(1, 1001), _scan(2, 1002, "17:30:00"), _scan(3, 1003, "12:00:00"), _scan(4, 1004),
+        _scan(5, 1001, day=next_day), _scan(6, 1004, "18:00:00", day=next_day),
+    ]
+
+    client.post(UPLOAD_URL, json={"scans": scans[:3]}, headers=api_headers)
+    client.post(UPLOAD_URL, json={"scans": scans}, headers=api_headers)
+
+    after_upload = _occupancy(db_session)
+    assert after_upload[(SCAN_DAY, "morning", "B02")][:3] == (0, 1, 1)
+    assert after_upload == _recomputed_occupancy(db_session, [SCAN_DAY, next_day])
+
+    response = client.delete("/api/bus/attendance/delete-by-date", params={"date_from": SCAN_DAY.isoformat()})
+
+    assert response.json()["deleted_count"] == 4
+    after_delete = _occupancy(db_session)
+    assert {key[0] for key in after_delete} == {next_day}
+    assert after_delete == _recomputed_occupancy(db_session, [SCAN_DAY, next_day])
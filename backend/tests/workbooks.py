@@ -0,0 +1,105 @@
+"""
+Workbook corpus shared by the spreadsheet upload tests.
+Each builder returns XLSX bytes written with openpyxl.
+"""
+
+from datetime import date, datetime, time
+from io import BytesIO
+
+from openpyxl import Workbook
+from openpyxl.chart import BarChart, Reference
+
+# Keyword arguments the attendance upload passes to stream_table_from_best_sheet
+ATTENDANCE_SHEET_OPTIONS = {
+    "must_include": {"personid"},
+    "prefer_include": {"date", "timein", "timeout", "shift", "daytype", "route"},
+    "sheet_name_exclude_prefixes": ("note", "read", "instruction", "template"),
+    "min_prefer_matches": 1,
+    "required_non_empty_in_sample": {"personid"},
+    "min_valid_sample_rows": 1,
+    "sample_size": 20,
+}
+
+
+def _to_bytes(wb: Workbook) -> bytes:
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def offset_header_workbook() -> bytes:
+    """Title and blank rows above a header that starts in column C."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Attendance"
+    ws["A1"] = "Daily attendance export"
+    ws["A2"] = "Generated 2026-01-05"
+    for col, header in enumerate(["PersonId", "Name", "Date", "Time In", "Route"], start=3):
+        ws.cell(row=4, column=col, value=header)
+    rows = [
+        (1001, "Aina", datetime(2026, 1, 5), time(7, 30), "Route-A13"),
+        (1002, "Badrul", datetime(2026, 1, 5), time(19, 5), "Route-B02"),
+        (None, None, None, None, None),
+        (1003, "Chong", datetime(2026, 1, 5), None, "Route-A13"),
+    ]
+    for row_number, values in enumerate(rows, start=5):
+        for col, value in enumerate(values, start=3):
+            ws.cell(row=row_number, column=col, value=value)
+    return _to_bytes(wb)
+
+
+def multi_sheet_workbook() -> bytes:
+    """Notes, summary and older sheets around the attendance sheet, plus a chart sheet."""
+    wb = Workbook()
+    notes = wb.active
+    notes.title = "Notes"
+    notes.append(["PersonId", "Date", "Time In", "Shift", "Route", "DayType"])
+    notes.append([1, "2026-01-01", "07:00", "morning", "Route-A01", "Workday"])
+
+    summary = wb.create_sheet("Summary")
+    summary.append(["Route", "Total"])
+    summary.append(["Route-A13", 2])
+
+    older = wb.create_sheet("Old format")
+    older.append(["PersonId", "Date"])
+    older.append([2001, datetime(2026, 1, 4)])
+
+    attendance = wb.create_sheet("Attendance")
+    attendance.append(["PersonId", "Date", "Time In", "Route", "DayType"])
+    attendance.append([1001, datetime(2026, 1, 5), time(7, 30), "Route-A13", "Workday"])
+    attendance.append([1002, datetime(2026, 1, 5), time(19, 5), "Route-B02", "Workday"])
+
+    empty_ids = wb.create_sheet("Blank ids")
+    empty_ids.append(["PersonId", "Date", "Time In", "Route", "DayType", "Shift"])
+    empty_ids.append([None, datetime(2026, 1, 5), time(7, 0), "Route-A13", "Workday", "morning"])
+
+    chart = BarChart()
+    chart.add_data(Reference(summary, min_col=2, min_row=1, max_row=2), titles_from_data=True)
+    wb.create_chartsheet("Chart").add_chart(chart)
+    return _to_bytes(wb)
+
+
+def date_cells_workbook() -> bytes:
+    """Date and time columns mixing datetime cells, date-formatted serials, raw serials and text."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Attendance"
+    ws.append(["PersonId", "Date", "Time In"])
+    ws.append([1001, datetime(2026, 1, 5), time(7, 30)])
+    ws.append([1002, date(2026, 1, 6), datetime(2026, 1, 6, 19, 5)])
+    ws.append([1003, 46029, 0.3125])  # Serial numbers, formatted below
+    ws.append([1004, 46030, "07:45 AM"])  # Serial without a date format stays a number
+    ws.append([1005, "07/01/2026 (Wed)", "18:20"])
+    ws.append([1006, 46031.75, time(0, 0)])
+    ws.cell(row=4, column=2).number_format = "yyyy-mm-dd"
+    ws.cell(row=4, column=3).number_format = "hh:mm"
+    ws.cell(row=7, column=2).number_format = "yyyy-mm-dd hh:mm"
+    ws.cell(row=2, column=3).number_format = "hh:mm"
+    return _to_bytes(wb)
+
+
+CORPUS = {
+    "offset_header": offset_header_workbook,
+    "multi_sheet": multi_sheet_workbook,
+    "date_cells": date_cells_workbook,
+}
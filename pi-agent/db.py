@@ -5,26 +5,64 @@ Handles local SQLite storage for offline scan records.
 
 import sqlite3
 import logging
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 
 logger = logging.getLogger(__name__)
 
 DB_FILE = "bus_log.db"
 
+# How long to wait (milliseconds) for a lock held by another thread/process
+BUSY_TIMEOUT_MS = 5000
 
-def get_connection() -> sqlite3.Connection:
-    """Get a connection to the local SQLite database."""
-    conn = sqlite3.connect(DB_FILE)
+# One persistent connection per thread (reader, upload worker, web server threads)
+_local = threading.local()
+
+
+def _open_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT_MS / 1000)
     conn.row_factory = sqlite3.Row
+    # WAL lets readers (uploader, web UI) run alongside the scan writer;
+    # NORMAL sync is safe in WAL mode and avoids an fsync per commit on SD cards.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Get this thread's connection to the local SQLite database.
+    The connection is opened on first use and kept for the life of the thread.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _open_connection()
+        _local.conn = conn
     return conn
 
 
+def close_connection() -> None:
+    """Close this thread's connection, if one is open."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
 def init_db() -> None:
     """Initialize the database and create tables if they don't exist."""
     conn = get_connection()
     cursor = conn.cursor()
     
+    # Incremental auto-vacuum lets the retention job hand freed pages back to
+    # the filesystem. Switching an existing file needs a one-time full VACUUM.
+    if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("VACUUM")
+        logger.info("Enabled incremental auto-vacuum")
+    
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS scans (
             id           INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -48,11 +86,13 @@ def init_db() -> None:
     except sqlite3.OperationalError:
         pass  # Column already exists
     
-    # Create index for faster queries
+    # Partial index covering only the pending backlog the uploader walks;
+    # replaces the old full index on the low-cardinality uploaded flag
     cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_scans_uploaded 
-        ON scans(uploaded)
+        CREATE INDEX IF NOT EXISTS idx_scans_pending 
+        ON scans(id) WHERE uploaded = 0
     """)
+    cursor.execute("DROP INDEX IF EXISTS idx_scans_uploaded")
     
     # Create unique index for deduplication by batch_id per day
     # This prevents the same employee from being recorded multiple times on the same day
@@ -68,17 +108,124 @@ def init_db() -> None:
         pass
     
     conn.commit()
-    conn.close()
+    _init_counters(conn)
     logger.info("Database initialized successfully")
+    
+    # Warm the in-memory dedupe index with today's scans
+    _today_index.warm(datetime.now().strftime('%Y-%m-%d'))
 
 
-def check_duplicate_today(batch_id: int) -> Optional[Dict]:
-    """
-    Check if a batch_id has already been scanned today.
-    Returns the existing scan record if found, None otherwise.
+def _init_counters(conn: sqlite3.Connection) -> None:
     """
-    today = datetime.now().strftime('%Y-%m-%d')
+    Create the status counter tables and the triggers that maintain them.
     
+    scan_totals holds a single row of pending/uploaded counts and
+    scan_daily_counts one row per scan_date, so the status endpoints never
+    have to count the scans table. Counters are backfilled the first time
+    they are created, inside the same write transaction as the triggers.
+    """
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scan_totals (
+                id           INTEGER PRIMARY KEY CHECK (id = 1),
+                pending      INTEGER NOT NULL DEFAULT 0,
+                uploaded     INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scan_daily_counts (
+                scan_date    TEXT PRIMARY KEY,
+                pending      INTEGER NOT NULL DEFAULT 0,
+                uploaded     INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_scans_count_insert
+            AFTER INSERT ON scans
+            BEGIN
+                INSERT OR IGNORE INTO scan_daily_counts (scan_date) VALUES (NEW.scan_date);
+                UPDATE scan_daily_counts
+                SET pending = pending + (COALESCE(NEW.uploaded, 0) = 0),
+                    uploaded = uploaded + (COALESCE(NEW.uploaded, 0) != 0)
+                WHERE scan_date = NEW.scan_date;
+                UPDATE scan_totals
+                SET pending = pending + (COALESCE(NEW.uploaded, 0) = 0),
+                    uploaded = uploaded + (COALESCE(NEW.uploaded, 0) != 0);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_scans_count_delete
+            AFTER DELETE ON scans
+            BEGIN
+                UPDATE scan_daily_counts
+                SET pending = pending - (COALESCE(OLD.uploaded, 0) = 0),
+                    uploaded = uploaded - (COALESCE(OLD.uploaded, 0) != 0)
+                WHERE scan_date = OLD.scan_date;
+                UPDATE scan_totals
+                SET pending = pending - (COALESCE(OLD.uploaded, 0) = 0),
+                    uploaded = uploaded - (COALESCE(OLD.uploaded, 0) != 0);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_scans_count_update
+            AFTER UPDATE OF uploaded, scan_date ON scans
+            BEGIN
+                UPDATE scan_daily_counts
+                SET pending = pending - (COALESCE(OLD.uploaded, 0) = 0),
+                    uploaded = uploaded - (COALESCE(OLD.uploaded, 0) != 0)
+                WHERE scan_date = OLD.scan_date;
+                INSERT OR IGNORE INTO scan_daily_counts (scan_date) VALUES (NEW.scan_date);
+                UPDATE scan_daily_counts
+                SET pending = pending + (COALESCE(NEW.uploaded, 0) = 0),
+                    uploaded = uploaded + (COALESCE(NEW.uploaded, 0) != 0)
+                WHERE scan_date = NEW.scan_date;
+                UPDATE scan_totals
+                SET pending = pending - (COALESCE(OLD.uploaded, 0) = 0) + (COALESCE(NEW.uploaded, 0) = 0),
+                    uploaded = uploaded - (COALESCE(OLD.uploaded, 0) != 0) + (COALESCE(NEW.uploaded, 0) != 0);
+            END
+        """)
+        
+        # Backfill counters for databases created before they existed
+        if cursor.execute("SELECT COUNT(*) FROM scan_totals").fetchone()[0] == 0:
+            cursor.execute("""
+                INSERT INTO scan_totals (id, pending, uploaded)
+                SELECT 1,
+                       COALESCE(SUM(COALESCE(uploaded, 0) = 0), 0),
+                       COALESCE(SUM(COALESCE(uploaded, 0) != 0), 0)
+                FROM scans
+            """)
+            cursor.execute("DELETE FROM scan_daily_counts")
+            cursor.execute("""
+                INSERT INTO scan_daily_counts (scan_date, pending, uploaded)
+                SELECT scan_date,
+                       SUM(COALESCE(uploaded, 0) = 0),
+                       SUM(COALESCE(uploaded, 0) != 0)
+                FROM scans
+                GROUP BY scan_date
+            """)
+            logger.info("Backfilled scan counters")
+        
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _row_to_scan(row: sqlite3.Row) -> Dict:
+    return {
+        "id": row["id"],
+        "batch_id": row["batch_id"],
+        "card_uid": row["card_uid"],
+        "scan_time": row["scan_time"],
+        "uploaded": bool(row["uploaded"])
+    }
+
+
+def _find_scan(batch_id: int, scan_date: str) -> Optional[Dict]:
+    """Look up the scan for a batch_id on a given scan_date on disk."""
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -86,20 +233,86 @@ def check_duplicate_today(batch_id: int) -> Optional[Dict]:
         SELECT id, batch_id, card_uid, scan_time, uploaded
         FROM scans
         WHERE batch_id = ? AND scan_date = ?
-    """, (batch_id, today))
+    """, (batch_id, scan_date))
     
     row = cursor.fetchone()
-    conn.close()
+    return _row_to_scan(row) if row else None
+
+
+class _TodayIndex:
+    """
+    In-memory index of the scans already recorded for the current scan_date.
+
+    Answers the common duplicate tap without touching disk. It is warmed from
+    SQLite at startup and reloaded when the first scan of a new day arrives.
+    Scans written by another process (e.g. the web UI) are still caught by
+    the unique index on insert and then added here.
+    """
     
-    if row:
-        return {
-            "id": row["id"],
-            "batch_id": row["batch_id"],
-            "card_uid": row["card_uid"],
-            "scan_time": row["scan_time"],
-            "uploaded": bool(row["uploaded"])
-        }
-    return None
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scan_date: Optional[str] = None
+        self._by_batch: Dict[int, Dict] = {}
+        self._batch_by_id: Dict[int, int] = {}
+    
+    def warm(self, scan_date: str) -> None:
+        """Load every scan recorded on scan_date, replacing the current index."""
+        cursor = get_connection().cursor()
+        cursor.execute("""
+            SELECT id, batch_id, card_uid, scan_time, uploaded
+            FROM scans
+            WHERE scan_date = ?
+        """, (scan_date,))
+        by_batch = {row["batch_id"]: _row_to_scan(row) for row in cursor.fetchall()}
+        
+        with self._lock:
+            self._scan_date = scan_date
+            self._by_batch = by_batch
+            self._batch_by_id = {scan["id"]: batch_id for batch_id, scan in by_batch.items()}
+        logger.info(f"Dedupe index warmed with {len(by_batch)} scans for {scan_date}")
+    
+    def covers(self, scan_date: str) -> bool:
+        """Whether scan_date is indexed, rolling the index over to a newer day."""
+        with self._lock:
+            current = self._scan_date
+        if current == scan_date:
+            return True
+        if current is None or scan_date > current:
+            self.warm(scan_date)
+            return True
+        # Older day (e.g. clock correction): fall back to disk
+        return False
+    
+    def get(self, batch_id: int) -> Optional[Dict]:
+        with self._lock:
+            scan = self._by_batch.get(batch_id)
+            return dict(scan) if scan else None
+    
+    def add(self, scan_date: str, scan: Dict) -> None:
+        with self._lock:
+            if self._scan_date != scan_date:
+                return
+            self._by_batch[scan["batch_id"]] = dict(scan)
+            self._batch_by_id[scan["id"]] = scan["batch_id"]
+    
+    def mark_uploaded(self, ids: List[int]) -> None:
+        with self._lock:
+            for scan_id in ids:
+                batch_id = self._batch_by_id.get(scan_id)
+                if batch_id is not None:
+                    self._by_batch[batch_id]["uploaded"] = True
+
+
+_today_index = _TodayIndex()
+
+
+def check_duplicate_today(batch_id: int) -> Optional[Dict]:
+    """
+    Check if a batch_id has already been scanned today.
+    Returns the existing scan record if found, None otherwise.
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    return _find_scan(batch_id, today)
 
 
 def insert_scan(
@@ -112,11 +325,15 @@ def insert_scan(
     Returns a dict with:
         - inserted: True if newly inserted, False if duplicate
         - existing_scan: The existing scan record if duplicate
+    
+    Duplicates for the current day are answered from the in-memory index;
+    new scans go straight to an INSERT OR IGNORE against the unique index.
     """
     scan_date = scan_time[:10]  # Extract YYYY-MM-DD from ISO datetime
     
     # First check if duplicate exists
-    existing = check_duplicate_today(batch_id)
+    indexed = _today_index.covers(scan_date)
+    existing = _today_index.get(batch_id) if indexed else _find_scan(batch_id, scan_date)
     if existing:
         logger.debug(f"Duplicate scan detected: batch_id={batch_id} already scanned at {existing['scan_time']}")
         return {"inserted": False, "existing_scan": existing}
@@ -124,21 +341,29 @@ def insert_scan(
     conn = get_connection()
     cursor = conn.cursor()
     
-    try:
-        cursor.execute("""
-            INSERT INTO scans (batch_id, card_uid, scan_time, scan_date, uploaded)
-            VALUES (?, ?, ?, ?, 0)
-        """, (batch_id, card_uid, scan_time, scan_date))
-        conn.commit()
+    cursor.execute("""
+        INSERT OR IGNORE INTO scans (batch_id, card_uid, scan_time, scan_date, uploaded)
+        VALUES (?, ?, ?, ?, 0)
+    """, (batch_id, card_uid, scan_time, scan_date))
+    conn.commit()
+    
+    if cursor.rowcount == 1:
         logger.info(f"Scan inserted: batch_id={batch_id}")
+        _today_index.add(scan_date, {
+            "id": cursor.lastrowid,
+            "batch_id": batch_id,
+            "card_uid": card_uid,
+            "scan_time": scan_time,
+            "uploaded": False
+        })
         return {"inserted": True, "existing_scan": None}
-    except sqlite3.IntegrityError:
-        # Duplicate scan - race condition, another process inserted first
-        logger.debug(f"Duplicate scan ignored (race condition): batch_id={batch_id}")
-        existing = check_duplicate_today(batch_id)
-        return {"inserted": False, "existing_scan": existing}
-    finally:
-        conn.close()
+    
+    # Duplicate scan - race condition, another process inserted first
+    logger.debug(f"Duplicate scan ignored (race condition): batch_id={batch_id}")
+    existing = _find_scan(batch_id, scan_date)
+    if existing:
+        _today_index.add(scan_date, existing)
+    return {"inserted": False, "existing_scan": existing}
 
 
 def get_unuploaded_scans(limit: int = 200) -> List[Dict]:
@@ -158,7 +383,6 @@ def get_unuploaded_scans(limit: int = 200) -> List[Dict]:
     """, (limit,))
     
     rows = cursor.fetchall()
-    conn.close()
     
     result = []
     for row in rows:
@@ -188,46 +412,116 @@ def mark_uploaded(ids: List[int]) -> None:
     """, ids)
     
     conn.commit()
-    conn.close()
+    _today_index.mark_uploaded(ids)
     logger.info(f"Marked {len(ids)} scans as uploaded")
 
 
-def get_scan_count() -> Dict[str, int]:
-    """Get count of uploaded and pending scans."""
+def _file_size_bytes(cursor: sqlite3.Cursor) -> int:
+    page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+    page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size
+
+
+def purge_uploaded_scans(retention_days: int, archive_file: Optional[str] = None) -> Dict[str, int]:
+    """
+    Delete uploaded scans older than 'retention_days' days and compact the file.
+    
+    Pending scans and today's scans are never touched, so the per-day dedupe
+    index (idx_scans_batch_date) stays correct for the current day. When
+    'archive_file' is given, purged rows are first copied into a 'scans'
+    table in that SQLite file.
+    
+    Returns a dict with deleted, archived and reclaimed_bytes counts.
+    """
+    retention_days = max(1, retention_days)
+    cutoff = (datetime.now() - timedelta(days=retention_days)).strftime('%Y-%m-%d')
+    
     conn = get_connection()
     cursor = conn.cursor()
+    size_before = _file_size_bytes(cursor)
     
-    cursor.execute("SELECT COUNT(*) FROM scans WHERE uploaded = 0")
-    pending = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM scans WHERE uploaded = 1")
-    uploaded = cursor.fetchone()[0]
+    archived = 0
+    if archive_file:
+        cursor.execute("ATTACH DATABASE ? AS archive", (archive_file,))
+    try:
+        if archive_file:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS archive.scans (
+                    id           INTEGER PRIMARY KEY,
+                    batch_id     INTEGER NOT NULL,
+                    card_uid     TEXT,
+                    scan_time    TEXT NOT NULL,
+                    scan_date    TEXT NOT NULL,
+                    uploaded     INTEGER DEFAULT 0
+                )
+            """)
+            cursor.execute("""
+                INSERT OR IGNORE INTO archive.scans (id, batch_id, card_uid, scan_time, scan_date, uploaded)
+                SELECT id, batch_id, card_uid, scan_time, scan_date, uploaded
+                FROM scans
+                WHERE uploaded = 1 AND scan_date < ?
+            """, (cutoff,))
+            archived = cursor.rowcount
+        
+        cursor.execute("""
+            DELETE FROM scans
+            WHERE uploaded = 1 AND scan_date < ?
+        """, (cutoff,))
+        deleted = cursor.rowcount
+        # Drop counter rows for days that no longer hold any scans
+        cursor.execute("""
+            DELETE FROM scan_daily_counts
+            WHERE scan_date < ? AND pending = 0 AND uploaded = 0
+        """, (cutoff,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if archive_file:
+            cursor.execute("DETACH DATABASE archive")
+    
+    # Return freed pages to the filesystem and shrink the WAL file.
+    # executescript steps the pragma to completion (execute frees one page).
+    conn.executescript("PRAGMA incremental_vacuum;")
+    cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    reclaimed = max(0, size_before - _file_size_bytes(cursor))
+    
+    logger.info(
+        f"Retention: deleted {deleted} uploaded scans before {cutoff} "
+        f"({archived} archived), reclaimed {reclaimed} bytes"
+    )
+    return {"deleted": deleted, "archived": archived, "reclaimed_bytes": reclaimed}
+
+
+def get_scan_count() -> Dict[str, int]:
+    """Get count of uploaded and pending scans (from the trigger-maintained totals)."""
+    conn = get_connection()
+    cursor = conn.cursor()
     
-    conn.close()
+    cursor.execute("SELECT pending, uploaded FROM scan_totals WHERE id = 1")
+    row = cursor.fetchone()
+    if row is None:
+        return {"pending": 0, "uploaded": 0}
     
-    return {"pending": pending, "uploaded": uploaded}
+    return {"pending": row["pending"], "uploaded": row["uploaded"]}
 
 
 def get_today_scan_count() -> Dict[str, int]:
-    """Get count of today's uploaded and pending scans."""
+    """Get count of today's uploaded and pending scans (from the per-day counters)."""
     today = datetime.now().strftime('%Y-%m-%d')
     
     conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
-        SELECT COUNT(*) FROM scans 
-        WHERE uploaded = 0 AND scan_time LIKE ?
-    """, (f"{today}%",))
-    pending = cursor.fetchone()[0]
-    
-    cursor.execute("""
-        SELECT COUNT(*) FROM scans 
-        WHERE uploaded = 1 AND scan_time LIKE ?
-    """, (f"{today}%",))
-    uploaded = cursor.fetchone()[0]
+        SELECT pending, uploaded FROM scan_daily_counts 
+        WHERE scan_date = ?
+    """, (today,))
+    row = cursor.fetchone()
+    pending = row["pending"] if row else 0
+    uploaded = row["uploaded"] if row else 0
     
-    conn.close()
     return {"pending": pending, "uploaded": uploaded, "total": pending + uploaded}
 
 
@@ -247,7 +541,6 @@ def get_recent_scans(limit: int = 50) -> List[Dict]:
     """, (limit,))
     
     rows = cursor.fetchall()
-    conn.close()
     
     result = []
     for row in rows:
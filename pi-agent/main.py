@@ -38,8 +38,15 @@ import threading
 from datetime import datetime, date
 from typing import Dict, Optional
 
-from db import init_db, insert_scan, get_unuploaded_scans, mark_uploaded, get_scan_count
-from uploader import upload_scans
+from db import init_db, insert_scan, get_unuploaded_scans, mark_uploaded, get_scan_count, purge_uploaded_scans
+from uploader import (
+    AdaptiveBatchSizer,
+    CircuitBreaker,
+    ExponentialBackoff,
+    UploadError,
+    check_connectivity,
+    upload_scans,
+)
 from reader import get_reader
 
 # Configure logging
@@ -117,39 +124,118 @@ def handle_card_scan(config: Dict, card_uid: str) -> None:
 
 def upload_worker(config: Dict) -> None:
     """
-    Background worker that periodically uploads pending scans to the backend.
+    Background worker that uploads pending scans to the backend.
+
+    While a backlog exists, batches are uploaded back-to-back with a batch size
+    adapted to server latency; the worker only sleeps for the upload interval
+    once the queue is empty.
+
+    Transient failures (timeouts, connection errors, 5xx) are retried with
+    exponential backoff and full jitter; repeated ones open a circuit breaker
+    that waits for a cheap connectivity probe before sending scans again.
+    Permanent failures (e.g. 401/422) wait for the regular interval.
     """
     api_base_url = config["api_base_url"]
     api_key = config["api_key"]
+    compress = config.get("compress_uploads", True)
     
     upload_interval = config.get("upload_interval_seconds", 60)
-    logger.info(f"Upload worker started (interval: {upload_interval}s)")
+    batch_sizer = AdaptiveBatchSizer(
+        initial=config.get("upload_batch_size", 200),
+        minimum=config.get("upload_batch_min", 25),
+        maximum=config.get("upload_batch_max", 1000),
+        target_latency=config.get("upload_target_latency_seconds", 2.0),
+    )
+    backoff = ExponentialBackoff(
+        base=config.get("retry_base_seconds", 5),
+        cap=config.get("retry_max_seconds", 300),
+    )
+    breaker = CircuitBreaker(
+        failure_threshold=config.get("circuit_failure_threshold", 5),
+        reset_timeout=config.get("circuit_reset_seconds", 60),
+        max_reset_timeout=config.get("circuit_max_reset_seconds", 600),
+    )
+    logger.info(f"Upload worker started (interval: {upload_interval}s, batch size: {batch_sizer.size})")
     
     while True:
+        delay = upload_interval
         try:
-            # Get unuploaded scans
-            scans = get_unuploaded_scans(limit=200)
-            
-            if scans:
-                logger.info(f"Found {len(scans)} scans to upload")
-                
-                # Try to upload
-                success_ids = upload_scans(api_base_url, api_key, scans)
-                
-                if success_ids is not None and len(success_ids) > 0:
-                    # Mark successful uploads only
-                    mark_uploaded(success_ids)
-                elif success_ids is not None and len(success_ids) == 0:
-                    # Backend returned 200 but no IDs accepted; keep scans for retry
-                    logger.warning("Upload returned no success IDs; retaining scans for retry")
+            state = breaker.state
+            if state == CircuitBreaker.OPEN:
+                delay = breaker.seconds_until_probe()
+            elif state == CircuitBreaker.HALF_OPEN and not check_connectivity(api_base_url):
+                # Cheap probe failed; keep the breaker open without sending scans
+                breaker.record_failure()
+                delay = breaker.seconds_until_probe()
             else:
-                logger.debug("No pending scans to upload")
+                # Get unuploaded scans
+                limit = batch_sizer.size
+                scans = get_unuploaded_scans(limit=limit)
+                
+                if scans:
+                    logger.info(f"Found {len(scans)} scans to upload")
+                    
+                    # Try to upload
+                    started = time.monotonic()
+                    try:
+                        success_ids = upload_scans(api_base_url, api_key, scans, compress=compress)
+                    except UploadError as e:
+                        if e.retryable:
+                            batch_sizer.record_failure()
+                            breaker.record_failure()
+                            delay = backoff.next_delay()
+                            logger.info(f"Retrying upload in {delay:.1f}s")
+                        else:
+                            logger.error(f"Upload rejected permanently ({e}); retrying in {upload_interval}s")
+                    else:
+                        elapsed = time.monotonic() - started
+                        breaker.record_success()
+                        backoff.reset()
+                        
+                        if len(success_ids) > 0:
+                            # Mark successful uploads only
+                            mark_uploaded(success_ids)
+                            batch_sizer.record_success(elapsed, len(scans))
+                            if len(scans) >= limit:
+                                # Full batch: more scans are likely waiting, keep draining
+                                continue
+                        else:
+                            # Backend returned 200 but no IDs accepted; keep scans for retry
+                            logger.warning("Upload returned no success IDs; retaining scans for retry")
+                else:
+                    logger.debug("No pending scans to upload")
                 
         except Exception as e:
             logger.error(f"Upload worker error: {e}")
         
         # Wait before next upload cycle
-        time.sleep(upload_interval)
+        time.sleep(delay)
+
+
+def maintenance_worker(config: Dict) -> None:
+    """
+    Background worker that purges old uploaded scans once a day.
+    
+    Runs during the low-traffic 'maintenance_hour' (local time), deleting
+    uploaded scans older than 'retention_days' (optionally archiving them to
+    'archive_file') and compacting the SQLite file.
+    """
+    retention_days = config.get("retention_days", 30)
+    maintenance_hour = config.get("maintenance_hour", 3)
+    archive_file = config.get("archive_file")
+    logger.info(f"Maintenance worker started (retention: {retention_days} days, hour: {maintenance_hour:02d}:00)")
+    
+    last_run: Optional[date] = None
+    while True:
+        now = datetime.now()
+        if now.hour == maintenance_hour and last_run != now.date():
+            try:
+                purge_uploaded_scans(retention_days, archive_file=archive_file)
+            except Exception as e:
+                logger.error(f"Maintenance worker error: {e}")
+            last_run = now.date()
+        
+        time.sleep(300)
 
 
 def main():
@@ -172,6 +258,14 @@ def main():
     )
     upload_thread.start()
     
+    # Start retention/compaction worker in background thread
+    maintenance_thread = threading.Thread(
+        target=maintenance_worker,
+        args=(config,),
+        daemon=True
+    )
+    maintenance_thread.start()
+    
     # Create card reader
     reader_type = config.get("reader_type", "fake")
     reader = get_reader(reader_type)
@@ -3,21 +3,83 @@ Uploader module for Pi Agent.
 Handles uploading scan records to the central backend.
 """
 
+import gzip
+import json
 import logging
+import random
+import threading
+import time
 from typing import List, Dict, Optional
 import requests
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
-# Timeout for HTTP requests (seconds)
-REQUEST_TIMEOUT = 30
+# Timeouts for HTTP requests (seconds): fail fast on connect, allow slow responses
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+REQUEST_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# HTTP statuses worth retrying; any other non-200 response is a permanent failure
+RETRYABLE_STATUS_CODES = {408, 413, 425, 429}
+
+# Shared HTTP session so uploads reuse keep-alive connections (and TLS sessions)
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Get the process-wide HTTP session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Accept-Encoding": "gzip", "Connection": "keep-alive"})
+            _session = session
+        return _session
+
+
+def close_session() -> None:
+    """Close the shared HTTP session and its pooled connections."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def _encode_payload(payload: Dict, compress: bool) -> bytes:
+    """Serialize a JSON payload, gzip-compressing it when requested."""
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    if compress:
+        body = gzip.compress(body, compresslevel=6)
+    return body
+
+
+class UploadError(Exception):
+    """
+    Raised when an upload fails.
+
+    `retryable` is True for transient failures (timeouts, connection errors,
+    5xx, 429) and False for permanent ones (e.g. 401 invalid API key,
+    422 validation error) that retrying will not fix.
+    """
+
+    def __init__(self, message: str, retryable: bool, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status_code = status_code
 
 
 def upload_scans(
     api_base_url: str,
     api_key: str,
-    scans: List[Dict]
-) -> Optional[List[int]]:
+    scans: List[Dict],
+    compress: bool = True
+) -> List[int]:
     """
     Upload scan records to the backend API.
     
@@ -25,9 +87,13 @@ def upload_scans(
         api_base_url: Base URL for the bus API (e.g., http://localhost:8000/api/bus)
         api_key: API key for authentication
         scans: List of scan dictionaries to upload
+        compress: Send the JSON body gzip-compressed (Content-Encoding: gzip)
     
     Returns:
-        List of successfully uploaded scan IDs, or None if upload failed.
+        List of successfully uploaded scan IDs.
+    
+    Raises:
+        UploadError: If the upload failed; check `retryable` before retrying.
     """
     if not scans:
         logger.debug("No scans to upload")
@@ -38,41 +104,187 @@ def upload_scans(
         "Content-Type": "application/json",
         "X-API-KEY": api_key
     }
-    payload = {"scans": scans}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    body = _encode_payload({"scans": scans}, compress)
     
     try:
-        logger.info(f"Uploading {len(scans)} scans to {url}")
-        response = requests.post(
+        logger.info(f"Uploading {len(scans)} scans to {url} ({len(body)} bytes)")
+        response = get_session().post(
             url,
-            json=payload,
+            data=body,
             headers=headers,
             timeout=REQUEST_TIMEOUT
         )
-        
-        if response.status_code == 200:
-            result = response.json()
-            success_ids = result.get("success_ids", [])
-            logger.info(f"Upload successful: {len(success_ids)} scans accepted")
-            return success_ids
-        elif response.status_code == 401:
-            logger.error("Upload failed: Invalid API key")
-            return None
-        elif response.status_code == 422:
-            logger.error(f"Upload failed: Validation error - {response.text}")
-            return None
-        else:
-            logger.error(f"Upload failed: HTTP {response.status_code} - {response.text}")
-            return None
-            
     except requests.exceptions.Timeout:
         logger.error("Upload failed: Request timed out")
-        return None
+        raise UploadError("Request timed out", retryable=True)
     except requests.exceptions.ConnectionError:
         logger.warning("Upload failed: Cannot connect to server (will retry later)")
-        return None
+        raise UploadError("Cannot connect to server", retryable=True)
     except requests.exceptions.RequestException as e:
         logger.error(f"Upload failed: {e}")
-        return None
+        raise UploadError(str(e), retryable=True)
+    
+    if response.status_code == 200:
+        # A proxy or captive portal page, or a truncated body, must go through backoff like any failure
+        try:
+            success_ids = response.json()["success_ids"]
+        except (ValueError, KeyError, TypeError):
+            success_ids = None
+        if not isinstance(success_ids, list) or not all(isinstance(scan_id, int) for scan_id in success_ids):
+            logger.error(f"Upload failed: Malformed response body - {response.text[:200]!r}")
+            raise UploadError("Malformed response body", retryable=True, status_code=response.status_code)
+        logger.info(f"Upload successful: {len(success_ids)} scans accepted")
+        return success_ids
+    
+    retryable = response.status_code >= 500 or response.status_code in RETRYABLE_STATUS_CODES
+    if response.status_code == 401:
+        logger.error("Upload failed: Invalid API key")
+    elif response.status_code == 422:
+        logger.error(f"Upload failed: Validation error - {response.text}")
+    else:
+        logger.error(f"Upload failed: HTTP {response.status_code} - {response.text}")
+    raise UploadError(f"HTTP {response.status_code}", retryable=retryable, status_code=response.status_code)
+
+
+class AdaptiveBatchSizer:
+    """
+    Adapts the upload batch size to observed server latency.
+
+    Batches grow (doubling) while full batches upload faster than the target
+    latency and shrink (halving) when uploads are slow or fail, e.g. when a
+    batch exceeds a proxy's payload limit.
+    """
+
+    def __init__(
+        self,
+        initial: int = 200,
+        minimum: int = 25,
+        maximum: int = 1000,
+        target_latency: float = 2.0
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.target_latency = target_latency
+        self._size = min(max(initial, self.minimum), self.maximum)
+
+    @property
+    def size(self) -> int:
+        """Current number of scans to send per upload."""
+        return self._size
+
+    def record_success(self, elapsed: float, batch_len: int) -> None:
+        """Adjust the batch size after a successful upload that took `elapsed` seconds."""
+        if elapsed > self.target_latency * 1.5:
+            self._resize(self._size // 2)
+        elif elapsed < self.target_latency and batch_len >= self._size:
+            self._resize(self._size * 2)
+
+    def record_failure(self) -> None:
+        """Shrink the batch size after a failed upload."""
+        self._resize(self._size // 2)
+
+    def _resize(self, new_size: int) -> None:
+        new_size = min(max(new_size, self.minimum), self.maximum)
+        if new_size != self._size:
+            logger.info(f"Upload batch size {self._size} -> {new_size}")
+            self._size = new_size
+
+
+class ExponentialBackoff:
+    """
+    Exponential backoff with full jitter.
+
+    Each delay is drawn uniformly from [0, min(cap, base * 2**attempt)], which
+    spreads retries from a fleet of agents instead of synchronizing them.
+    """
+
+    def __init__(self, base: float = 5.0, cap: float = 300.0):
+        self.base = base
+        self.cap = cap
+        self._attempt = 0
+
+    def next_delay(self) -> float:
+        """Return the delay before the next retry and advance the attempt counter."""
+        ceiling = min(self.cap, self.base * (2 ** self._attempt))
+        self._attempt = min(self._attempt + 1, 32)
+        return random.uniform(0, ceiling)
+
+    def reset(self) -> None:
+        """Reset after a successful upload."""
+        self._attempt = 0
+
+
+class CircuitBreaker:
+    """
+    Stops uploads after repeated transient failures.
+
+    CLOSED: uploads flow normally. After `failure_threshold` consecutive
+    failures the breaker goes OPEN and no uploads are attempted until a
+    jittered cooldown elapses. It then reports HALF_OPEN, where the caller
+    sends a cheap probe (see `check_connectivity`) before risking a batch.
+    A failure while HALF_OPEN reopens the breaker with a doubled cooldown
+    (up to `max_reset_timeout`); a success closes it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 60.0,
+        max_reset_timeout: float = 600.0
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+        self._failures = 0
+        self._opened = False
+        self._cooldown = reset_timeout
+        self._retry_at = 0.0
+
+    @property
+    def state(self) -> str:
+        """Current breaker state."""
+        if not self._opened:
+            return self.CLOSED
+        if time.monotonic() >= self._retry_at:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def seconds_until_probe(self) -> float:
+        """Seconds left before the breaker allows a half-open probe."""
+        if not self._opened:
+            return 0.0
+        return max(0.0, self._retry_at - time.monotonic())
+
+    def record_success(self) -> None:
+        """Close the breaker after a successful upload."""
+        if self._opened:
+            logger.info("Circuit breaker closed: backend reachable again")
+        self._failures = 0
+        self._opened = False
+        self._cooldown = self.reset_timeout
+
+    def record_failure(self) -> None:
+        """Count a transient failure, opening (or reopening) the breaker when needed."""
+        self._failures += 1
+        if self._opened:
+            # Half-open probe failed: back off harder before the next probe
+            self._cooldown = min(self._cooldown * 2, self.max_reset_timeout)
+            self._open()
+        elif self._failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        # Equal jitter keeps a recovering fleet from probing all at once
+        delay = random.uniform(self._cooldown / 2, self._cooldown)
+        self._opened = True
+        self._retry_at = time.monotonic() + delay
+        logger.warning(f"Circuit breaker open after {self._failures} failures; next probe in {delay:.0f}s")
 
 
 def check_connectivity(api_base_url: str) -> bool:
@@ -88,7 +300,7 @@ def check_connectivity(api_base_url: str) -> bool:
     try:
         # Try to reach the health endpoint or base URL
         url = api_base_url.replace("/api/bus", "/health")
-        response = requests.get(url, timeout=5)
+        response = get_session().get(url, timeout=5)
         return response.status_code == 200
     except requests.exceptions.RequestException:
         return False
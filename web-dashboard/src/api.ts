@@ -19,9 +19,7 @@ import {
   OccupancyResponse,
   BusDetailResponse,
   TrendAnalysisData,
-  TrendDataPoint,
 } from './types';
-import { format, parseISO, differenceInDays, eachDayOfInterval, subDays } from 'date-fns';
 
 const API_BASE = '/api';
 
@@ -334,7 +332,7 @@ export async function fetchBusDetail(
 
 /**
  * Fetch trend analysis data for a date range with optional comparison to previous period.
- * Fetches occupancy data for each day and aggregates for trend visualization.
+ * The backend aggregates all days (and the previous period) in a single request.
  */
 export async function fetchTrendData(params: {
   date_from: string;
@@ -345,89 +343,32 @@ export async function fetchTrendData(params: {
   routes?: string[];
   includePrevious?: boolean; // Fetch previous period for comparison
 }): Promise<TrendAnalysisData> {
-  // 1. Validate date range (max 90 days)
-  const startDate = parseISO(params.date_from);
-  const endDate = parseISO(params.date_to);
-  const daysDiff = differenceInDays(endDate, startDate);
+  const searchParams = new URLSearchParams();
+  searchParams.append('date_from', params.date_from);
+  searchParams.append('date_to', params.date_to);
 
-  if (daysDiff < 0) {
-    throw new Error('End date must be after start date');
+  if (params.shifts && params.shifts.length > 0) {
+    searchParams.append('shift', params.shifts.join(','));
   }
-
-  if (daysDiff > 90) {
-    throw new Error('Trend analysis limited to 90 days');
+  if (params.bus_ids && params.bus_ids.length > 0) {
+    searchParams.append('bus_id', params.bus_ids.join(','));
   }
-
-  // 2. Generate date arrays for current and previous periods
-  const currentDates = eachDayOfInterval({ start: startDate, end: endDate }).map(d => format(d, 'yyyy-MM-dd'));
-
-  let previousDates: string[] = [];
-  if (params.includePrevious) {
-    // For a 7-day period (e.g., Jan 7-13), previous period should be 7 days before
-    // prevStart = Jan 7 - 7 = Dec 31, prevEnd = Jan 6
-    const periodLength = daysDiff + 1; // +1 because both dates are inclusive
-    const prevEnd = subDays(startDate, 1); // Day before current period starts
-    const prevStart = subDays(prevEnd, periodLength - 1); // Go back by period length
-    previousDates = eachDayOfInterval({ start: prevStart, end: prevEnd }).map(d => format(d, 'yyyy-MM-dd'));
+  if (params.routes && params.routes.length > 0) {
+    searchParams.append('route', params.routes.join(','));
   }
+  if (params.plants && params.plants.length > 0) {
+    searchParams.append('plant', params.plants.join(','));
+  }
+  if (params.includePrevious) searchParams.append('include_previous', 'true');
+
+  const url = `${API_BASE}/report/trend?${searchParams.toString()}`;
+  const response = await fetch(url);
 
-  // 3. Fetch occupancy for each day in parallel
-  const fetchForDates = async (dates: string[]): Promise<TrendDataPoint[]> => {
-    const dailyPromises = dates.map(date =>
-      fetchOccupancy({
-        date_from: date,
-        date_to: date,
-        plants: params.plants || [],
-        shifts: params.shifts || [],
-        bus_ids: params.bus_ids || [],
-        routes: params.routes || [],
-      })
-    );
-
-    const dailyResults = await Promise.all(dailyPromises);
-
-    return dailyResults.map((dayData, index) => ({
-      date: dates[index],
-      roster: dayData.total_roster,
-      present: dayData.total_present,
-      attendance_rate: dayData.total_roster > 0
-        ? (dayData.total_present / dayData.total_roster) * 100
-        : 0,
-    }));
-  };
-
-  const [currentDaily, previousDaily] = await Promise.all([
-    fetchForDates(currentDates),
-    params.includePrevious ? fetchForDates(previousDates) : Promise.resolve([]),
-  ]);
-
-  // 4. Calculate summary statistics
-  const totalRoster = currentDaily.reduce((sum, d) => sum + d.roster, 0);
-  const totalPresent = currentDaily.reduce((sum, d) => sum + d.present, 0);
-  const avgAttendanceRate = totalRoster > 0 ? (totalPresent / totalRoster) * 100 : 0;
-
-  let prevAvgAttendanceRate: number | undefined;
-  let attendanceRateChange: number | undefined;
-
-  if (previousDaily.length > 0) {
-    const prevTotalRoster = previousDaily.reduce((sum, d) => sum + d.roster, 0);
-    const prevTotalPresent = previousDaily.reduce((sum, d) => sum + d.present, 0);
-    prevAvgAttendanceRate = prevTotalRoster > 0 ? (prevTotalPresent / prevTotalRoster) * 100 : 0;
-    attendanceRateChange = avgAttendanceRate - prevAvgAttendanceRate;
+  if (!response.ok) {
+    const detail = await response.text();
+    throw new Error(`Failed to fetch trend data: ${response.status} ${detail}`.trim());
   }
 
-  return {
-    daily: currentDaily,
-    previous: previousDaily.length > 0 ? previousDaily : undefined,
-    summary: {
-      avg_attendance_rate: avgAttendanceRate,
-      total_roster: totalRoster,
-      total_present: totalPresent,
-      date_from: params.date_from,
-      date_to: params.date_to,
-      prev_avg_attendance_rate: prevAvgAttendanceRate,
-      attendance_rate_change: attendanceRateChange,
-    },
-  };
+  return response.json();
 }
 
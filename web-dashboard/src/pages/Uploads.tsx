@@ -37,7 +37,7 @@ export default function Uploads() {
     setMasterResult(null);
 
     if (!masterFile) {
-      setError('Please select a master list .xlsx file first.');
+      setError('Please select a master list .xlsx, .csv or .tsv file first.');
       return;
     }
 
@@ -62,7 +62,7 @@ export default function Uploads() {
     setAttendanceResult(null);
 
     if (!attendanceFile) {
-      setError('Please select an attendance .xlsx file first.');
+      setError('Please select an attendance .xlsx, .csv or .tsv file first.');
       return;
     }
 
@@ -120,7 +120,7 @@ export default function Uploads() {
     <div className="space-y-6">
       <PageHeader
         title="Uploads"
-        subtitle="Upload the employee master list and manual attendance Excel files."
+        subtitle="Upload the employee master list and manual attendance files (Excel, CSV or TSV)."
         badge="Admin"
       />
 
@@ -150,7 +150,7 @@ export default function Uploads() {
           <div className="mt-4 space-y-3">
             <input
               type="file"
-              accept=".xlsx"
+              accept=".xlsx,.csv,.tsv"
               onChange={(e) => setMasterFile(e.target.files?.[0] ?? null)}
               className="block w-full text-sm text-gray-700 file:mr-4 file:py-2 file:px-4 file:rounded-xl file:border-0 file:text-sm file:font-semibold file:bg-emerald-50 file:text-emerald-700 hover:file:bg-emerald-100"
             />
@@ -223,7 +223,7 @@ export default function Uploads() {
           <div className="mt-4 space-y-3">
             <input
               type="file"
-              accept=".xlsx"
+              accept=".xlsx,.csv,.tsv"
               onChange={(e) => setAttendanceFile(e.target.files?.[0] ?? null)}
               className="block w-full text-sm text-gray-700 file:mr-4 file:py-2 file:px-4 file:rounded-xl file:border-0 file:text-sm file:font-semibold file:bg-teal-50 file:text-teal-700 hover:file:bg-teal-100"
             />